@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 import boto3
 import logging
+import http_metrics
 from botocore.exceptions import ClientError
 
 # Initialize logging
@@ -16,7 +17,7 @@ def modify_security_group(security_group_name, region, cidr_blocks):
         cidr_blocks (list): List of CIDR blocks for which to revoke inbound HTTP access.
     """
 
-    ec2 = boto3.client('ec2', region_name=region)
+    ec2 = http_metrics.instrument_boto3(boto3.client('ec2', region_name=region))
 
     try:
         # Fetch the security groups by their name
@@ -0,0 +1,177 @@
+"""
+Contention-aware admission control
+
+Replaces the unconditional startup jitter the lifecycle scripts used to
+sleep before their first broker/CSP call. Requests are sent immediately;
+only when the server signals contention (429, 5xx, and for the broker the
+WAF's 403) does the caller back off, honouring Retry-After when present and
+otherwise sleeping a full-jitter exponential delay.
+
+Every attempt and every contention signal is counted per gate name in
+memory and merged at exit into a small JSON file shared by all scripts in
+the sandbox (like http_metrics.json), so we can see how often students
+actually collide instead of guessing, without a file lock per attempt.
+
+Usage:
+  gate = Admission("broker.allocate", contention_statuses=BROKER_CONTENTION)
+  for attempt in range(max_retries):
+      resp = session.post(...)
+      gate.observe(resp.status_code)
+      if gate.is_contention(resp.status_code):
+          gate.backoff(attempt, resp)
+          continue
+      ...
+
+Environment Variables:
+  ADMISSION_STATS_FILE - Contention counters (default: admission_stats.json)
+"""
+
+import os
+import json
+import time
+import atexit
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from atomic_file import atomic_write, locked
+
+STATS_FILE = os.environ.get("ADMISSION_STATS_FILE", "admission_stats.json")
+
+CSP_CONTENTION = frozenset({429, 500, 502, 503, 504})
+# The broker sits behind a WAF that answers bursts with 403
+BROKER_CONTENTION = CSP_CONTENTION | {403}
+
+_lock = threading.Lock()
+# stats file (absolute path) -> gate name -> counters not yet merged into it
+_pending: Dict[str, Dict[str, dict]] = {}
+_exporter_registered = False
+
+
+def _new_entry() -> dict:
+    return {"attempts": 0, "contended": 0, "statuses": {}}
+
+
+def _merge(stats: dict, gates: Dict[str, dict]) -> dict:
+    for name, counts in gates.items():
+        entry = stats.setdefault(name, _new_entry())
+        entry["attempts"] += counts["attempts"]
+        entry["contended"] += counts["contended"]
+        for status, n in counts["statuses"].items():
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + n
+    return stats
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def export():
+    """Merge this process's counters into their stats files."""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    for path, gates in pending.items():
+        try:
+            with locked(path):
+                atomic_write(path, json.dumps(_merge(_read(path), gates), indent=2, sort_keys=True))
+        except OSError as e:
+            print(f"⚠️ Could not update {path}: {e}", flush=True)
+
+
+def _register_exporter():
+    global _exporter_registered
+    if not _exporter_registered:
+        atexit.register(export)
+        _exporter_registered = True
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Admission:
+    def __init__(self, name: str, contention_statuses=CSP_CONTENTION,
+                 base: float = 1.0, cap: float = 30.0, stats_path: str = STATS_FILE):
+        self.name = name
+        self.contention_statuses = frozenset(contention_statuses)
+        self.base = base
+        self.cap = cap
+        self.stats_path = stats_path
+        self.attempts = 0
+        self.contended = 0
+        self.waited = 0.0
+
+    def is_contention(self, status) -> bool:
+        return status in self.contention_statuses
+
+    def observe(self, status):
+        """Count one attempt; status may be an int or a label like "timeout"."""
+        self.attempts += 1
+        contended = self.is_contention(status) or isinstance(status, str)
+        if contended:
+            self.contended += 1
+        self._record(status, contended)
+
+    def delay(self, attempt: int, response=None) -> float:
+        retry_after = None
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.cap)
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def backoff(self, attempt: int, response=None, reason: Optional[str] = None,
+                max_delay: Optional[float] = None) -> float:
+        """Sleep after a contention signal; returns the seconds slept."""
+        delay = self.delay(attempt, response)
+        if max_delay is not None:
+            delay = max(0.0, min(delay, max_delay))
+        if reason is None and response is not None:
+            reason = f"HTTP {response.status_code}"
+        source = "Retry-After" if response is not None and "Retry-After" in response.headers else "jitter"
+        print(f"⚠️ Contention on {self.name} ({reason}), backing off {delay:.1f}s ({source})", flush=True)
+        time.sleep(delay)
+        self.waited += delay
+        return delay
+
+    # ---------- stats ----------
+    def _record(self, status, contended: bool):
+        # Resolve the path now: scripts may chdir before exiting
+        path = os.path.abspath(self.stats_path)
+        with _lock:
+            entry = _pending.setdefault(path, {}).setdefault(self.name, _new_entry())
+            entry["attempts"] += 1
+            if contended:
+                entry["contended"] += 1
+                entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+            _register_exporter()
+
+    def summary(self) -> str:
+        line = f"📊 {self.name}: {self.attempts} attempt(s), {self.contended} contended"
+        if self.waited:
+            line += f", {self.waited:.1f}s backing off"
+        path = os.path.abspath(self.stats_path)
+        with _lock:
+            counts = _pending.get(path, {}).get(self.name)
+            pending = {self.name: dict(counts, statuses=dict(counts["statuses"]))} if counts else {}
+        entry = _merge({self.name: dict(_read(path).get(self.name) or _new_entry())}, pending).get(self.name)
+        if entry and entry.get("attempts"):
+            rate = 100.0 * entry["contended"] / entry["attempts"]
+            line += f" (all runs: {entry['contended']}/{entry['attempts']} = {rate:.1f}%)"
+        return line
@@ -3,7 +3,8 @@
 Instruqt Sandbox Allocation via Broker API
 
 Allocates a pre-created CSP sandbox from the Broker and saves all
-IDs to text files for use by subsequent lifecycle scripts.
+IDs to lab_state.json (and the legacy text files) for use by subsequent
+lifecycle scripts.
 
 Usage in Instruqt (setup-sandbox script):
   export BROKER_API_TOKEN="<token>"
@@ -17,19 +18,25 @@ Environment Variables (Instruqt provides most automatically):
   SANDBOX_NAME_PREFIX     - Filter sandboxes by name prefix (default: "lab")
 
 Output Files:
+  lab_state.json        - All values below in one document (see lab_state.py)
   subtenant_id.txt      - CSP ID (e.g., 2026838)
   external_id.txt       - Account UUID (e.g., 588424ea-ac7c-4fb3-...)
   sandbox_id.txt        - Same as external_id (for backward compat)
   sandbox_name.txt      - Human name (e.g., lab-adventure-0086)
   sfdc_account_id.txt   - Salesforce ID (e.g., 001SAND15956299f9d)
   sandbox_env.sh        - Source-able env vars for bash scripts
+  trace_id.txt          - Trace ID later scripts join (see tracing.py)
 """
 
 import os
 import sys
 import time
-import random
 import requests
+import tracing
+from csp_client import get_session
+from lab_state import LabState
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
 
 # ----------------------------------
 # Configuration
@@ -43,9 +50,6 @@ INSTRUQT_SANDBOX_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
 INSTRUQT_TRACK_ID = os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab")
 SANDBOX_NAME_PREFIX = os.environ.get("SANDBOX_NAME_PREFIX", "lab")
 
-# Startup jitter
-time.sleep(random.uniform(1, 5))
-
 # ----------------------------------
 # Validation
 # ----------------------------------
@@ -74,44 +78,38 @@ headers = {
 if SANDBOX_NAME_PREFIX:
     headers["X-Sandbox-Name-Prefix"] = SANDBOX_NAME_PREFIX
 
-max_retries = 5
-allocation_response = None
-
-for attempt in range(max_retries):
-    try:
-        print(f"🔄 Allocation attempt {attempt + 1}/{max_retries}...", flush=True)
-        resp = requests.post(
-            f"{BROKER_API_URL}/allocate",
-            headers=headers,
-            timeout=(5, 30),
-        )
-
-        if resp.status_code in (200, 201):
-            allocation_response = resp.json()
-            emoji = "✅" if resp.status_code == 201 else "🔄"
-            print(f"{emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
-            break
-        elif resp.status_code == 409:
-            print("❌ Pool exhausted: No sandboxes available", flush=True)
-            sys.exit(1)
-        elif resp.status_code == 403:
-            print("⚠️ Rate limited, waiting...", flush=True)
-            time.sleep(10)
-        elif resp.status_code in {500, 502, 503, 504}:
-            print(f"⚠️ Server error {resp.status_code}, retrying...", flush=True)
-            time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
-        else:
-            print(f"❌ HTTP {resp.status_code}: {resp.text}", flush=True)
-            sys.exit(1)
-
-    except requests.exceptions.Timeout:
-        print("⚠️ Timeout, retrying...", flush=True)
-        time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
-    except Exception as e:
-        print(f"⚠️ Error: {e}", flush=True)
-        time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
+# No startup jitter: send immediately, back off only on contention
+# (403 WAF, 429, 5xx, timeouts) as classified by the broker.allocate policy
+tracing.start_trace()
+retry = policy("broker.allocate")
+print(f"🔄 Requesting sandbox (up to {retry.max_attempts} attempts)...", flush=True)
+try:
+    resp = retry.call(lambda: get_session().post(
+        f"{BROKER_API_URL}/allocate",
+        headers=headers,
+        timeout=(5, 30),
+    ))
+except CircuitOpenError as e:
+    print(f"⛔ Allocation skipped: {e}", flush=True)
+    sys.exit(1)
+except requests.RequestException as e:
+    print(retry.summary(), flush=True)
+    print(f"❌ Allocation failed after {retry.attempts} attempt(s): {e}", flush=True)
+    sys.exit(1)
+print(retry.summary(), flush=True)
+
+if resp.status_code in (200, 201):
+    allocation_response = resp.json()
+    emoji = "✅" if resp.status_code == 201 else "🔄"
+    print(f"{emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
+elif resp.status_code == 409:
+    print("❌ Pool exhausted: No sandboxes available", flush=True)
+    sys.exit(1)
+elif retry.is_retryable(resp.status_code):
+    print(f"❌ Allocation failed after {retry.attempts} attempt(s) (last HTTP {resp.status_code})", flush=True)
+    sys.exit(1)
 else:
-    print("❌ Allocation failed after all retries", flush=True)
+    print(f"❌ HTTP {resp.status_code}: {resp.text}", flush=True)
     sys.exit(1)
 
 # ----------------------------------
@@ -132,31 +130,24 @@ if "/" in external_id:
     external_id = external_id.split("/")[-1]
 
 # ----------------------------------
-# Save to Files
+# Save to State Store (+ legacy files)
 # ----------------------------------
-files = {
-    "subtenant_id.txt": sandbox_id,
-    "external_id.txt": external_id,
-    "sandbox_id.txt": external_id,
-    "sandbox_name.txt": sandbox_name,
-    "sfdc_account_id.txt": sfdc_account_id,
+state = LabState()
+values = {
+    "subtenant_id": sandbox_id,
+    "external_id": external_id,
+    "sandbox_id": external_id,
+    "sandbox_name": sandbox_name,
+    "sfdc_account_id": sfdc_account_id,
 }
-
-for filename, value in files.items():
-    with open(filename, "w") as f:
-        f.write(value)
-    print(f"✅ {filename}: {value}", flush=True)
+state.update(**values)
+for key, value in values.items():
+    print(f"✅ {key}: {value}", flush=True)
 
 # ----------------------------------
 # Export Environment Variables
 # ----------------------------------
-with open("sandbox_env.sh", "w") as f:
-    f.write("#!/bin/bash\n")
-    f.write("# Auto-generated by allocation_broker_subtenant.py\n")
-    f.write(f"export STUDENT_TENANT={sandbox_name}\n")
-    f.write(f"export CSP_ACCOUNT_ID={external_id}\n")
-    f.write(f"export BROKER_SANDBOX_ID={sandbox_id}\n")
-    f.write(f"export SFDC_ACCOUNT_ID={sfdc_account_id}\n")
+state.export_sandbox_env("allocation_broker_subtenant.py")
 
 print(f"\n💡 Instruqt: set-var STUDENT_TENANT {sandbox_name}", flush=True)
 print(f"   set-var CSP_ACCOUNT_ID {external_id}", flush=True)
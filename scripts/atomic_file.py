@@ -0,0 +1,38 @@
+"""
+Small file helpers shared by the on-disk stores (token_cache, lab_state).
+
+- locked(path): flock on a sidecar "<path>.lock" file, shared or exclusive
+- atomic_write(path, text): temp file in the same directory + fsync +
+  os.replace, so readers never observe a partially written file
+"""
+
+import os
+import fcntl
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def locked(path: str, exclusive: bool = True):
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def atomic_write(path: str, text: str, mode: int = 0o644):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
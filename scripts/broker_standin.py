@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Local sandbox-broker stand-in
+
+Implements the broker routes the allocation/cleanup scripts call, so they
+can be load-tested without touching production:
+
+  POST /v1/allocate                          201 new allocation, 200 when the
+                                             participant already holds one,
+                                             409 when the pool is exhausted
+  POST /v1/sandboxes/{id}/mark-for-deletion  200, or 404 for unknown IDs
+
+A fixed pool of sandboxes is handed out one per X-Instruqt-Sandbox-ID;
+marked sandboxes return to the pool after --recycle-delay seconds. The WAF
+is modelled as a token bucket (--waf-rate/--waf-burst) answered with 403,
+plus random 5xx and a latency distribution (see standin.py).
+
+Usage:
+  python broker_standin.py --pool 150 --waf-rate 20 --p-5xx 0.02 --latency lognormal:300,0.6
+  export BROKER_API_URL=http://127.0.0.1:8081/v1 BROKER_API_TOKEN=standin
+"""
+
+import time
+import uuid
+import argparse
+import threading
+from collections import OrderedDict
+from standin import App, add_fault_arguments, serve
+
+
+class BrokerStandin:
+    def __init__(self, pool: int = 100, token: str = "standin", recycle_delay: float = 0.0,
+                 ttl: int = 4 * 3600, prefix: str = "lab", **app_options):
+        self.token = token
+        self.recycle_delay = recycle_delay
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.free = [self._new_sandbox(prefix, i) for i in range(pool)]
+        self.by_participant: "OrderedDict[str, dict]" = OrderedDict()
+        self.by_id = {}
+        self.exhausted = 0
+        self.app = App(limit_status=403, **app_options)
+        self.app.route("POST", r"/v1/allocate", self.allocate)
+        self.app.route("POST", r"/v1/sandboxes/(?P<id>[^/]+)/mark-for-deletion", self.mark_for_deletion)
+
+    @staticmethod
+    def _new_sandbox(prefix: str, i: int) -> dict:
+        return {
+            "sandbox_id": str(uuid.uuid4()),
+            "external_id": f"identity/accounts/{uuid.uuid4()}",
+            "name": f"{prefix}-{i:04d}",
+            "sfdc_account_id": f"SFDC{i:06d}",
+        }
+
+    def _authorized(self, req) -> bool:
+        return not self.token or req.headers.get("Authorization") == f"Bearer {self.token}"
+
+    def allocate(self, req):
+        if not self._authorized(req):
+            return 401, {"detail": {"message": "invalid token"}}
+        participant = req.headers.get("X-Instruqt-Sandbox-ID")
+        if not participant:
+            return 400, {"detail": {"message": "X-Instruqt-Sandbox-ID header required"}}
+        with self._lock:
+            held = self.by_participant.get(participant)
+            if held:
+                return 200, held
+            if not self.free:
+                self.exhausted += 1
+                return 409, {"detail": {"message": "No sandboxes available"}}
+            sandbox = dict(self.free.pop(0), expires_at=int(time.time()) + self.ttl,
+                           allocated_to=participant, status="allocated")
+            self.by_participant[participant] = sandbox
+            self.by_id[sandbox["sandbox_id"]] = participant
+        return 201, sandbox
+
+    def mark_for_deletion(self, req):
+        if not self._authorized(req):
+            return 403, {"detail": {"message": "invalid token"}}
+        sandbox_id = req.match.group("id")
+        with self._lock:
+            participant = self.by_id.pop(sandbox_id, None)
+            if participant is None:
+                return 404, {"detail": {"message": "sandbox not found"}}
+            sandbox = self.by_participant.pop(participant)
+        recycled = {k: sandbox[k] for k in ("sandbox_id", "external_id", "name", "sfdc_account_id")}
+        threading.Timer(self.recycle_delay, self._recycle, args=(recycled,)).start()
+        return 200, {"sandbox_id": sandbox_id, "status": "pending_deletion"}
+
+    def _recycle(self, sandbox: dict):
+        with self._lock:
+            self.free.append(sandbox)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"free": len(self.free), "allocated": len(self.by_participant),
+                    "exhausted_409": self.exhausted, "routes": dict(self.app.stats)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local sandbox-broker stand-in.")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--pool", type=int, default=100, help="Sandboxes available for allocation.")
+    ap.add_argument("--token", default="standin", help="Expected BROKER_API_TOKEN ('' = any).")
+    ap.add_argument("--recycle-delay", type=float, default=0.0,
+                    help="Seconds before a marked sandbox is allocatable again.")
+    ap.add_argument("--waf-rate", type=float, default=0, help="Requests/s before the WAF answers 403 (0 = off).")
+    ap.add_argument("--waf-burst", type=float, default=None, help="WAF bucket size (default: rate).")
+    add_fault_arguments(ap)
+    args = ap.parse_args()
+
+    broker = BrokerStandin(pool=args.pool, token=args.token, recycle_delay=args.recycle_delay,
+                           latency=args.latency, p_5xx=args.p_5xx, rate=args.waf_rate, burst=args.waf_burst,
+                           retry_after=args.retry_after, seed=args.seed)
+    server, url = serve(broker.app, "127.0.0.1", args.port)
+    print(f"🧪 Broker stand-in on {url}/v1 (pool {args.pool}); Ctrl-C to stop", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n📊 {broker.stats()}", flush=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Bulk deleter with AIMD concurrency
+
+Teardown used to DELETE one object at a time. BulkDeleter runs the deletes
+on a bounded worker pool whose effective concurrency adapts like TCP:
+it grows by one after a full window of clean responses (additive increase)
+and halves as soon as CSP answers 429/5xx or a request fails (multiplicative
+decrease). Throttled items are retried after Retry-After / jittered
+backoff, so a busy account is torn down as fast as CSP lets us, without
+hammering it.
+
+Every item gets a DeleteResult (status, message, attempts, seconds) and
+print_report() prints the per-item lines plus a summary; the same data can
+be written as JSON for the cleanup logs.
+
+Usage:
+  deleter = BulkDeleter("dns view", lambda vid: session.delete(url_for(vid), headers=headers))
+  results = deleter.run(view_ids)
+  deleter.print_report(results)
+
+Environment Variables:
+  BULK_DELETE_MAX_WORKERS  - Upper bound on concurrent deletes (default: 16)
+  BULK_DELETE_INITIAL      - Starting concurrency (default: 4)
+"""
+
+import os
+import json
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from admission import Admission, CSP_CONTENTION
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("BULK_DELETE_MAX_WORKERS", "16"))
+DEFAULT_INITIAL = int(os.environ.get("BULK_DELETE_INITIAL", "4"))
+
+
+class DeleteResult:
+    def __init__(self, item: str, status, ok: bool, message: str, attempts: int, seconds: float):
+        self.item = item
+        self.status = status
+        self.ok = ok
+        self.message = message
+        self.attempts = attempts
+        self.seconds = seconds
+        self.done_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return dict(item=self.item, status=self.status, ok=self.ok, message=self.message,
+                    attempts=self.attempts, seconds=round(self.seconds, 3))
+
+
+class AIMDLimiter:
+    """Counting semaphore whose limit moves between 1 and maximum (AIMD)."""
+
+    def __init__(self, initial: int, maximum: int, cooldown: float = 1.0):
+        self.limit = max(1, min(initial, maximum))
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.peak = self.limit
+        self._in_flight = 0
+        self._clean = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, congested: bool):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if congested:
+                self._clean = 0
+                # One burst of 429s from in-flight requests should halve once, not N times
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(1, self.limit // 2)
+                    self._last_decrease = now
+            else:
+                self._clean += 1
+                if self._clean >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.peak = max(self.peak, self.limit)
+                    self._clean = 0
+            self._cond.notify_all()
+
+
+class BulkDeleter:
+    def __init__(self, kind: str, delete_fn: Callable[[str], requests.Response],
+                 max_workers: int = DEFAULT_MAX_WORKERS, initial: int = DEFAULT_INITIAL,
+                 ok_statuses=(200, 202, 204), gone_statuses=(404,),
+                 retry_statuses=CSP_CONTENTION, max_attempts: int = 5,
+                 label: Optional[Callable[[str], str]] = None):
+        self.kind = kind
+        self.delete_fn = delete_fn
+        self.max_workers = max_workers
+        self.initial = initial
+        self.ok_statuses = set(ok_statuses)
+        self.gone_statuses = set(gone_statuses)
+        self.retry_statuses = set(retry_statuses)
+        self.max_attempts = max_attempts
+        self.label = label or (lambda item: item)
+        self.gate = Admission(f"bulk_delete.{kind.replace(' ', '_')}", contention_statuses=self.retry_statuses)
+        self.limiter = None
+        self.elapsed = 0.0
+
+    def _delete_one(self, item: str) -> DeleteResult:
+        start = time.monotonic()
+        status, message = None, ""
+        for attempt in range(self.max_attempts):
+            self.limiter.acquire()
+            resp = None
+            try:
+                resp = self.delete_fn(item)
+                status = resp.status_code
+            except requests.RequestException as e:
+                status, message = "error", str(e)
+            congested = status == "error" or status in self.retry_statuses
+            self.limiter.release(congested)
+            self.gate.observe(status)
+
+            if status in self.ok_statuses:
+                # 202: CSP accepted the delete and finishes it in the background
+                message = "Accepted (deleting asynchronously)" if status == 202 else "Deleted"
+                return DeleteResult(item, status, True, message, attempt + 1, time.monotonic() - start)
+            if status in self.gone_statuses:
+                return DeleteResult(item, status, True, "Not found (already deleted?)", attempt + 1,
+                                    time.monotonic() - start)
+            if not congested:
+                return DeleteResult(item, status, False, f"Failed: {resp.text[:200]}", attempt + 1,
+                                    time.monotonic() - start)
+            if attempt + 1 < self.max_attempts:
+                self.gate.backoff(attempt, resp, reason=f"{self.label(item)}: {status}")
+        if status != "error":
+            message = f"Gave up after {self.max_attempts} attempts (HTTP {status})"
+        return DeleteResult(item, status, False, message, self.max_attempts, time.monotonic() - start)
+
+    def run(self, items: Iterable[str]) -> List[DeleteResult]:
+        """Delete all items; results come back in input order."""
+        items = list(items)
+        self.limiter = AIMDLimiter(self.initial, self.max_workers)
+        start = time.monotonic()
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            results = list(pool.map(self._delete_one, items))
+        self.elapsed = time.monotonic() - start
+        return results
+
+    def summary(self, results: List[DeleteResult]) -> Dict[str, object]:
+        deleted = sum(1 for r in results if r.ok and r.status in self.ok_statuses and r.status != 202)
+        accepted = sum(1 for r in results if r.ok and r.status == 202)
+        gone = sum(1 for r in results if r.ok and r.status in self.gone_statuses)
+        failed = sum(1 for r in results if not r.ok)
+        return dict(
+            kind=self.kind, total=len(results), deleted=deleted, accepted=accepted, already_gone=gone, failed=failed,
+            seconds=round(self.elapsed, 2),
+            per_second=round(len(results) / self.elapsed, 1) if self.elapsed else 0.0,
+            retries=sum(r.attempts - 1 for r in results),
+            peak_concurrency=self.limiter.peak if self.limiter else 0,
+        )
+
+    def print_report(self, results: List[DeleteResult], json_path: Optional[str] = None):
+        for r in results:
+            icon = "✅" if r.ok else "❌"
+            print(f"{icon} {self.label(r.item)} -> {r.message} (HTTP {r.status}, "
+                  f"{r.attempts} attempt(s), {r.seconds:.1f}s)", flush=True)
+        s = self.summary(results)
+        print(f"\n🧾 {s['kind']}: {s['deleted']} deleted, {s['accepted']} accepted, "
+              f"{s['already_gone']} already gone, "
+              f"{s['failed']} failed of {s['total']} in {s['seconds']}s "
+              f"({s['per_second']}/s, {s['retries']} retries, peak concurrency {s['peak_concurrency']})",
+              flush=True)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump({"summary": s, "items": [r.as_dict() for r in results]}, f, indent=2)
+            print(f"📄 Report written to {json_path}", flush=True)
@@ -0,0 +1,250 @@
+"""
+Local CIDR planner for federated blocks
+
+Checks an IPAM layout before any API call and carves child subnets out of
+the federated blocks, so a bad config.yaml fails in milliseconds with every
+problem listed instead of one failed POST at a time.
+
+Ranges are kept in an IntervalIndex: non-overlapping [first, last] address
+intervals sorted by start, so inserting or checking a range is a bisect
+plus a look at its two neighbours (O(log n)).
+
+Checks:
+  - every address/cidr is a valid network address (10.30.0.0/16, not 10.30.0.1/16)
+  - top-level blocks neither overlap nor contain one another
+  - child subnets sit inside exactly one block and do not overlap siblings
+  - a nested block (an imported address_block) gets its own child index:
+    rows inside it are checked only against their siblings under their
+    innermost enclosing block, so a block must come before its subnets
+
+Usage:
+  python cidr_planner.py --config config.yaml                      # validate only
+  python cidr_planner.py --config config.yaml --carve GCP --students 300 \\
+      --per-student 1 --prefix 24 --out subnets.csv                  # plan /24s
+
+  plan = CIDRPlanner(config["blocks"])
+  rows = plan.carve("GCP", prefix=24, count=2, owner="student-007")
+
+The carved rows (name, address, cidr, parent, owner) are written as CSV or
+YAML and are the input format of deploy_ipam.py --import.
+"""
+
+import csv
+import sys
+import bisect
+import argparse
+import ipaddress
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class PlanError(ValueError):
+    """The layout is invalid; .problems lists every issue found."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def network(address: str, cidr) -> ipaddress.IPv4Network:
+    """Strict network parse: host bits set is an error, not silently masked."""
+    return ipaddress.ip_network(f"{address}/{int(cidr)}", strict=True)
+
+
+class IntervalIndex:
+    """Sorted, non-overlapping address intervals with O(log n) conflict checks."""
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._entries: List[Tuple[int, int, str]] = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def conflict(self, net: ipaddress.IPv4Network) -> Optional[Tuple[str, str]]:
+        """(relation, name) of an existing interval that collides with net, else None."""
+        first, last = int(net.network_address), int(net.broadcast_address)
+        i = bisect.bisect_right(self._starts, first)
+        # Only the neighbours can collide, since stored intervals never overlap
+        for j in (i - 1, i):
+            if 0 <= j < len(self._entries):
+                s, e, name = self._entries[j]
+                if s <= last and first <= e:
+                    if s <= first and last <= e:
+                        return "inside", name
+                    if first <= s and e <= last:
+                        return "contains", name
+                    return "overlaps", name
+        return None
+
+    def add(self, net: ipaddress.IPv4Network, name: str):
+        clash = self.conflict(net)
+        if clash:
+            raise PlanError([f"{name} ({net}) {clash[0]} {clash[1]}"])
+        first = int(net.network_address)
+        i = bisect.bisect_left(self._starts, first)
+        self._starts.insert(i, first)
+        self._entries.insert(i, (first, int(net.broadcast_address), name))
+
+    def find(self, net: ipaddress.IPv4Network) -> Optional[str]:
+        """Name of the stored interval that fully contains net, if any."""
+        first, last = int(net.network_address), int(net.broadcast_address)
+        i = bisect.bisect_right(self._starts, first) - 1
+        if i >= 0:
+            s, e, name = self._entries[i]
+            if s <= first and last <= e:
+                return name
+        return None
+
+
+class CIDRPlanner:
+    def __init__(self, blocks: Iterable[dict], children: Iterable[dict] = ()):
+        """
+        blocks: config.yaml style dicts (name, address, cidr).
+        children: already planned subnets (name, address, cidr[, parent]).
+        Raises PlanError listing every problem.
+        """
+        self.blocks: Dict[str, ipaddress.IPv4Network] = {}
+        self.top = IntervalIndex()
+        self.children: Dict[str, IntervalIndex] = {}
+        # Address blocks nested inside a federated block (name -> network)
+        self.nested: Dict[str, ipaddress.IPv4Network] = {}
+        # (block, prefix) -> first address worth trying next, so carving N
+        # students does not rescan the subnets handed out before
+        self._cursor: Dict[Tuple[str, int], int] = {}
+        problems = []
+
+        for block in blocks:
+            try:
+                net = network(block["address"], block["cidr"])
+                self.top.add(net, block["name"])
+            except (ValueError, KeyError) as e:
+                problems.extend(getattr(e, "problems", [f"block {block.get('name')}: {e}"]))
+                continue
+            self.blocks[block["name"]] = net
+            self.children[block["name"]] = IntervalIndex()
+
+        for child in children:
+            try:
+                self.add_child(child["name"], network(child["address"], child["cidr"]), child.get("parent"),
+                               nested=child.get("type") == "address_block")
+            except (ValueError, KeyError) as e:
+                problems.extend(getattr(e, "problems", [f"subnet {child.get('name')}: {e}"]))
+
+        if problems:
+            raise PlanError(problems)
+
+    def add_child(self, name: str, net: ipaddress.IPv4Network, parent: Optional[str] = None,
+                  nested: bool = False) -> str:
+        """
+        Place net under its innermost enclosing block and return that block's name.
+        parent (if given) must be one of the enclosing blocks; nested=True makes net
+        itself a block later children are placed inside.
+        """
+        found = self.top.find(net)
+        if found is None:
+            raise PlanError([f"{name} ({net}) is not inside any federated block"])
+        if net == self.blocks[found]:
+            raise PlanError([f"{name} ({net}) is the whole of block {found}"])
+        chain = [found]
+        while True:
+            inner = self.children[chain[-1]].find(net)
+            if inner is None or inner not in self.nested:
+                break
+            if net == self.nested[inner]:
+                raise PlanError([f"{name} ({net}) is the whole of block {inner}"])
+            chain.append(inner)
+        if parent and parent not in chain:
+            raise PlanError([f"{name} ({net}) is inside {chain[-1]}, not {parent}"])
+        if nested and name in self.children:
+            raise PlanError([f"{name} ({net}): a block named {name} already exists"])
+        self.children[chain[-1]].add(net, name)
+        if nested:
+            self.nested[name] = net
+            self.children[name] = IntervalIndex()
+        return chain[-1]
+
+    def carve(self, parent: str, prefix: int, count: int, owner: str = "",
+              name_format: str = "{parent}-{owner}-{n}") -> List[dict]:
+        """Take the first `count` free /prefix subnets of block `parent`."""
+        if parent not in self.blocks:
+            raise PlanError([f"unknown block {parent}"])
+        block = self.blocks[parent]
+        if prefix < block.prefixlen:
+            raise PlanError([f"/{prefix} is larger than block {parent} ({block})"])
+        rows = []
+        index = self.children[parent]
+        size = 2 ** (block.max_prefixlen - prefix)
+        addr = self._cursor.get((parent, prefix), int(block.network_address))
+        end = int(block.broadcast_address)
+        while len(rows) < count and addr + size - 1 <= end:
+            net = ipaddress.ip_network((addr, prefix))
+            addr += size
+            if index.conflict(net):
+                continue
+            name = name_format.format(parent=parent, owner=owner, n=len(rows) + 1)
+            index.add(net, name)
+            rows.append({"name": name, "address": str(net.network_address), "cidr": prefix,
+                         "parent": parent, "owner": owner})
+        self._cursor[(parent, prefix)] = addr
+        if len(rows) < count:
+            raise PlanError([f"block {parent} ({block}) has room for only {len(rows)} more /{prefix}, "
+                             f"{count} requested"])
+        return rows
+
+    def carve_students(self, parent: str, students: int, per_student: int = 1, prefix: int = 24,
+                       owner_format: str = "student-{:03d}") -> List[dict]:
+        rows = []
+        for i in range(1, students + 1):
+            rows.extend(self.carve(parent, prefix, per_student, owner=owner_format.format(i)))
+        return rows
+
+
+def write_rows(rows: List[dict], path: str):
+    """CSV unless path ends in .yaml/.yml; '-' writes CSV to stdout."""
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        with open(path, "w") as f:
+            yaml.safe_dump({"subnets": rows}, f, sort_keys=False)
+        return
+    fields = ["name", "address", "cidr", "parent", "owner"]
+    f = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def main():
+    import time
+    from deploy_ipam import load_config_with_env
+
+    ap = argparse.ArgumentParser(description="Validate federated blocks and carve per-student subnets locally.")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--carve", metavar="BLOCK", help="Block to carve subnets from (e.g. GCP).")
+    ap.add_argument("--students", type=int, default=0)
+    ap.add_argument("--per-student", type=int, default=1)
+    ap.add_argument("--prefix", type=int, default=24)
+    ap.add_argument("--out", default="-", help="CSV or .yaml output (default: stdout).")
+    args = ap.parse_args()
+
+    config = load_config_with_env(args.config)
+    start = time.perf_counter()
+    try:
+        plan = CIDRPlanner(config["blocks"], config.get("subnets", []))
+        rows = plan.carve_students(args.carve, args.students, args.per_student, args.prefix) if args.carve else []
+    except PlanError as e:
+        for problem in e.problems:
+            print(f"❌ {problem}", file=sys.stderr)
+        sys.exit(1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"✅ {len(plan.blocks)} block(s) valid; planned {len(rows)} subnet(s) in {elapsed_ms:.1f} ms",
+          file=sys.stderr)
+    if rows:
+        write_rows(rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Circuit breaker for the broker and CSP
+
+When a backend is browning out, every student's scripts running their full
+retry sequence only add load. A breaker counts consecutive failures
+(retryable statuses, timeouts, connection errors) per backend; after
+CIRCUIT_FAILURE_THRESHOLD of them it opens and calls fail fast with
+CircuitOpenError instead of hitting the backend. After
+CIRCUIT_RESET_TIMEOUT seconds it goes half-open and lets a single probe
+request through: success closes it again, failure re-opens it.
+
+State lives in one JSON file shared by every process on the host (flock +
+atomic replace, see atomic_file.py), so concurrent scripts see the same
+breaker.
+
+Usage (normally via retry_policy, which does this per attempt):
+  breaker = CircuitBreaker("broker")
+  breaker.before_call()            # raises CircuitOpenError when open
+  ... make the request ...
+  breaker.record_success() / breaker.record_failure()
+
+Environment Variables:
+  CIRCUIT_BREAKER_FILE      - Shared state file
+                              (default: <tmpdir>/instruqt_circuit_breakers.json)
+  CIRCUIT_FAILURE_THRESHOLD - Consecutive failures that open a breaker (default: 5)
+  CIRCUIT_RESET_TIMEOUT     - Seconds before an open breaker allows a probe (default: 60)
+"""
+
+import os
+import json
+import time
+import tempfile
+from atomic_file import atomic_write, locked
+
+STATE_FILE = os.environ.get(
+    "CIRCUIT_BREAKER_FILE",
+    os.path.join(tempfile.gettempdir(), "instruqt_circuit_breakers.json"),
+)
+DEFAULT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+DEFAULT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "60"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open."""
+
+    def __init__(self, name: str, failures: int, retry_in: float):
+        super().__init__(
+            f"{name} circuit open after {failures} consecutive failures; "
+            f"not calling it for another {retry_in:.0f}s"
+        )
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT, path: str = STATE_FILE):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.path = path
+
+    # ---------- storage ----------
+    def _read_all(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _update(self, fn):
+        """Apply fn(entry) to this breaker's entry under the lock; returns fn's result."""
+        with locked(self.path):
+            states = self._read_all()
+            entry = states.setdefault(self.name, {"state": CLOSED, "failures": 0})
+            before = dict(entry)
+            result = fn(entry)
+            if entry != before:
+                atomic_write(self.path, json.dumps(states, indent=2, sort_keys=True))
+            return result
+
+    def state(self) -> str:
+        with locked(self.path, exclusive=False):
+            return self._read_all().get(self.name, {}).get("state", CLOSED)
+
+    # ---------- transitions ----------
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through right now."""
+        def check(entry):
+            now = time.time()
+            if entry["state"] == CLOSED:
+                return None
+            if entry["state"] == OPEN:
+                waited = now - entry.get("opened_at", 0)
+                if waited < self.reset_timeout:
+                    return self.reset_timeout - waited
+                entry["state"] = HALF_OPEN
+                entry["probe_started"] = now
+                print(f"🔌 {self.name} circuit half-open, sending a probe request", flush=True)
+                return None
+            # HALF_OPEN: one probe at a time; a probe whose process died frees up after reset_timeout
+            if now - entry.get("probe_started", 0) < self.reset_timeout:
+                return self.reset_timeout - (now - entry["probe_started"])
+            entry["probe_started"] = now
+            return None
+
+        retry_in = self._update(check)
+        if retry_in is not None:
+            failures = self._read_all().get(self.name, {}).get("failures", self.failure_threshold)
+            raise CircuitOpenError(self.name, failures, retry_in)
+
+    def record_success(self):
+        def close(entry):
+            if entry["state"] != CLOSED:
+                print(f"🔌 {self.name} circuit closed again", flush=True)
+            entry.clear()
+            entry.update(state=CLOSED, failures=0)
+        self._update(close)
+
+    def record_failure(self):
+        def fail(entry):
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry["state"] == HALF_OPEN or (
+                    entry["state"] == CLOSED and entry["failures"] >= self.failure_threshold):
+                entry["state"] = OPEN
+                entry["opened_at"] = time.time()
+                entry.pop("probe_started", None)
+                print(f"⛔ {self.name} circuit opened after {entry['failures']} consecutive failures", flush=True)
+        self._update(fail)
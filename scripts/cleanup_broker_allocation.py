@@ -19,6 +19,12 @@ Usage in Instruqt:
 import os
 import sys
 import requests
+import tracing
+from csp_client import get_session
+from lab_state import LabState
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
+from step_journal import StepJournal
 
 # ----------------------------------
 # Configuration
@@ -44,17 +50,11 @@ if not INSTRUQT_SANDBOX_ID:
     print("❌ INSTRUQT_PARTICIPANT_ID not found", flush=True)
     sys.exit(1)
 
-# Read subtenant_id (actual Broker sandbox ID)
-try:
-    with open(SUBTENANT_ID_FILE, "r") as f:
-        subtenant_id = f.read().strip()
-except FileNotFoundError:
-    print(f"⚠️ {SUBTENANT_ID_FILE} not found, nothing to clean up", flush=True)
-    sys.exit(0)  # Not an error - sandbox may not have been allocated
-
+# Read subtenant_id (actual Broker sandbox ID) from lab state / subtenant_id.txt
+subtenant_id = LabState().get_str("subtenant_id")
 if not subtenant_id:
-    print("⚠️ subtenant_id.txt is empty, nothing to clean up", flush=True)
-    sys.exit(0)
+    print(f"⚠️ No subtenant_id in lab state or {SUBTENANT_ID_FILE}, nothing to clean up", flush=True)
+    sys.exit(0)  # Not an error - sandbox may not have been allocated
 
 print(f"🧹 Marking sandbox (Broker subtenant ID: {subtenant_id}) for deletion...", flush=True)
 
@@ -69,11 +69,13 @@ headers = {
 }
 
 try:
-    resp = requests.post(
+    retry = policy("broker.mark_for_deletion")
+    resp = retry.call(lambda: get_session().post(
         delete_url,
         headers=headers,
         timeout=(5, 15),
-    )
+    ))
+    print(retry.summary(), flush=True)
 
     if resp.status_code == 200:
         result = resp.json()
@@ -97,6 +99,10 @@ try:
         print(f"   Response: {resp.text}", flush=True)
         sys.exit(1)
 
+except CircuitOpenError as e:
+    print(f"⛔ Cleanup skipped: {e}", flush=True)
+    sys.exit(1)
+
 except requests.exceptions.RequestException as e:
     print(f"❌ Network or request error: {e}", flush=True)
     sys.exit(1)
@@ -105,6 +111,11 @@ except Exception as e:
     print(f"❌ Unexpected error: {e}", flush=True)
     sys.exit(1)
 
+# The sandbox is gone, so a later setup run must start from scratch
+# (and a later allocation starts a new trace)
+StepJournal().reset()
+tracing.end_trace()
+
 print("=" * 60, flush=True)
 print("✅ Cleanup request successful", flush=True)
 print("=" * 60, flush=True)
@@ -1,14 +1,17 @@
 import os
 import json
 import sys
+import csp_client
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState
 
 # Configuration
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = f"{csp_client.base_url()}/v2"
 TOKEN = os.environ.get('Infoblox_Token')
 TEAM_ID = os.environ.get('INSTRUQT_PARTICIPANT_ID', 'default-team')
 SANDBOX_ID_FILE = "sandbox_id.txt"
 EXTERNAL_ID_FILE = "external_id.txt"
+state = LabState()
 
 # Request body for sandbox creation
 sandbox_request_body = {
@@ -45,8 +48,7 @@ if create_response["status"] == "success":
         sandbox_id = sandbox_id.split("/")[-1]
 
     if sandbox_id:
-        with open(SANDBOX_ID_FILE, "w") as f:
-            f.write(sandbox_id)
+        state.update(sandbox_id=sandbox_id)
         print(f"📁 Sandbox ID saved to {SANDBOX_ID_FILE}: {sandbox_id}")
     else:
         print("⚠️ Sandbox ID not found.")
@@ -57,8 +59,7 @@ if create_response["status"] == "success":
         external_id = admin_user["account_id"].split("/")[-1]
 
     if external_id:
-        with open(EXTERNAL_ID_FILE, "w") as f:
-            f.write(external_id)
+        state.update(external_id=external_id)
         print(f"🔐 External ID saved to {EXTERNAL_ID_FILE}: {external_id}")
     else:
         print("⚠️ External ID not found in admin_user.account_id.")
@@ -1,15 +1,19 @@
 import os
 import sys
-import time
-import random
+import requests
+import csp_client
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
 
 # Configuration
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = f"{csp_client.base_url()}/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 TEAM_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID", "default-team")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 EXTERNAL_ID_FILE = "external_id.txt"
+state = LabState()
 
 # Request body for sandbox creation
 sandbox_request_body = {
@@ -26,23 +30,32 @@ sandbox_request_body = {
 # API client initialization
 api = SandboxAccountAPI(base_url=BASE_URL, token=TOKEN)
 
-# Retry on transient errors (e.g. 504 Gateway Timeout)
-max_retries = 5
-for attempt in range(max_retries):
-    create_response = api.create_sandbox_account(sandbox_request_body)
-    if create_response.get("status") == "success":
-        break
-    print(
-        f"⚠️ Attempt {attempt+1} failed: {create_response.get('error')}",
-        flush=True,
-    )
-    time.sleep((2**attempt) + random.random())
-else:
-    print("❌ Sandbox creation failed after retries", flush=True)
+# Retry on transient errors (e.g. 504 Gateway Timeout); see retry_policy "csp.sandbox_create"
+retry = policy("csp.sandbox_create")
+try:
+    resp = retry.call(lambda: api.session.post(
+        f"{api.base_url}/sandbox/accounts",
+        json=sandbox_request_body,
+        headers=api._headers(),
+    ))
+except CircuitOpenError as e:
+    print(f"⛔ Sandbox creation skipped: {e}", flush=True)
+    sys.exit(1)
+except requests.RequestException as e:
+    print(retry.summary(), flush=True)
+    print(f"❌ Sandbox creation failed after retries: {e}", flush=True)
+    sys.exit(1)
+print(retry.summary(), flush=True)
+
+if resp.status_code not in (200, 201):
+    if retry.is_retryable(resp.status_code):
+        print(f"❌ Sandbox creation failed after retries (last HTTP {resp.status_code})", flush=True)
+    else:
+        print(f"❌ Non-retryable error {resp.status_code}: {resp.text}", flush=True)
     sys.exit(1)
 
 print("✅ Sandbox created successfully.", flush=True)
-sandbox_data = create_response["data"]
+sandbox_data = resp.json()
 
 # Extract sandbox_id
 sandbox_id = None
@@ -59,8 +72,7 @@ if not sandbox_id:
     print("❌ Sandbox ID not found. Aborting.", flush=True)
     sys.exit(1)
 
-with open(SANDBOX_ID_FILE, "w") as f:
-    f.write(sandbox_id)
+state.update(sandbox_id=sandbox_id)
 print(f"✅ Sandbox ID saved to {SANDBOX_ID_FILE}: {sandbox_id}", flush=True)
 
 # Extract external_id
@@ -73,6 +85,5 @@ if not external_id:
     print("❌ External ID not found in admin_user.account_id. Aborting.", flush=True)
     sys.exit(1)
 
-with open(EXTERNAL_ID_FILE, "w") as f:
-    f.write(external_id)
+state.update(external_id=external_id)
 print(f"✅ External ID saved to {EXTERNAL_ID_FILE}: {external_id}", flush=True)
@@ -1,22 +1,22 @@
 import os
 import sys
-import time
-import random
 import uuid
 import requests
+import csp_client
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState
 
 # ----------------------------------
 # Configuration
 # ----------------------------------
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = f"{csp_client.base_url()}/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 TEAM_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID", "default-team")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 EXTERNAL_ID_FILE = "external_id.txt"
-
-# Startup jitter (avoid host collisions)
-time.sleep(random.uniform(1, 15))
+state = LabState()
 
 # Request body for sandbox creation
 sandbox_request_body = {
@@ -36,41 +36,36 @@ sandbox_request_body = {
 api = SandboxAccountAPI(base_url=BASE_URL, token=TOKEN)
 
 # ----------------------------------
-# Retry logic
+# Retry logic (no startup jitter; see retry_policy "csp.sandbox_create")
 # ----------------------------------
-max_retries = 5
-retryable_statuses = {502, 503, 504}
+retry = policy("csp.sandbox_create")
 
 # Build headers with idempotency key
 headers = {**api._headers(), "X-Request-ID": str(uuid.uuid4())}
 
-create_response = None
-for attempt in range(max_retries):
-    try:
-        resp = requests.post(
-            f"{BASE_URL}/sandbox/accounts",
-            json=sandbox_request_body,
-            headers=headers,
-            timeout=(5, 20),  # connect=5s, read=20s
-        )
-
-        if resp.status_code in (200, 201):
-            create_response = resp.json()  # raw CSP JSON, not wrapped
-            break
-        elif resp.status_code in retryable_statuses:
-            raise requests.HTTPError(f"Retryable error {resp.status_code}")
-        else:
-            print(f"❌ Non-retryable error {resp.status_code}: {resp.text}", flush=True)
-            sys.exit(1)
-
-    except Exception as e:
-        print(f"⚠️ Attempt {attempt+1} failed: {e}", flush=True)
-        sleep_time = min(random.uniform(0, 2 ** attempt), 60)  # full jitter, capped
-        time.sleep(sleep_time)
+try:
+    resp = retry.call(lambda: api.session.post(
+        f"{BASE_URL}/sandbox/accounts",
+        json=sandbox_request_body,
+        headers=headers,
+        timeout=(5, 20),  # connect=5s, read=20s
+    ))
+except CircuitOpenError as e:
+    print(f"⛔ Sandbox creation skipped: {e}", flush=True)
+    sys.exit(1)
+except requests.RequestException as e:
+    print(retry.summary(), flush=True)
+    print(f"❌ Sandbox creation failed after retries: {e}", flush=True)
+    sys.exit(1)
+print(retry.summary(), flush=True)
 
-else:
-    print("❌ Sandbox creation failed after retries", flush=True)
+if resp.status_code not in (200, 201):
+    if retry.is_retryable(resp.status_code):
+        print(f"❌ Sandbox creation failed after retries (last HTTP {resp.status_code})", flush=True)
+    else:
+        print(f"❌ Non-retryable error {resp.status_code}: {resp.text}", flush=True)
     sys.exit(1)
+create_response = resp.json()  # raw CSP JSON, not wrapped
 
 print("✅ Sandbox created successfully.", flush=True)
 sandbox_data = create_response  # use raw response
@@ -92,8 +87,7 @@ if not sandbox_id:
     print("❌ Sandbox ID not found. Aborting.", flush=True)
     sys.exit(1)
 
-with open(SANDBOX_ID_FILE, "w") as f:
-    f.write(sandbox_id)
+state.update(sandbox_id=sandbox_id)
 print(f"✅ Sandbox ID saved to {SANDBOX_ID_FILE}: {sandbox_id}", flush=True)
 
 # ----------------------------------
@@ -108,6 +102,5 @@ if not external_id:
     print("❌ External ID not found in admin_user.account_id. Aborting.", flush=True)
     sys.exit(1)
 
-with open(EXTERNAL_ID_FILE, "w") as f:
-    f.write(external_id)
+state.update(external_id=external_id)
 print(f"✅ External ID saved to {EXTERNAL_ID_FILE}: {external_id}", flush=True)
@@ -2,45 +2,41 @@ import os
 import json
 import sys
 import requests
-import time
-import random
+import csp_client
+from csp_client import get_session
+from lab_state import LabState
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
 
 # === Required Environment Variables ===
-BASE_URL = "https://csp.infoblox.com"
+BASE_URL = csp_client.base_url()
 EMAIL = os.getenv("INFOBLOX_EMAIL")
 PASSWORD = os.getenv("INFOBLOX_PASSWORD")
 USER_EMAIL = os.getenv("INSTRUQT_EMAIL")
 USER_NAME = os.getenv("INSTRUQT_PARTICIPANT_ID")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 USER_ID_FILE = "user_id.txt"
+state = LabState()
+session = get_session()
 
 if not all([EMAIL, PASSWORD, USER_EMAIL, USER_NAME]):
     print("❌ Missing one of: INFOBLOX_EMAIL, INFOBLOX_PASSWORD, INSTRUQT_EMAIL, INSTRUQT_PARTICIPANT_ID", flush=True)
     sys.exit(1)
 
 # === Step 1: Authenticate ===
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
+jwt = csp_client.sign_in(BASE_URL, EMAIL, PASSWORD)
 headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
 print("✅ Logged in and obtained JWT", flush=True)
 
 # === Step 2: Switch Account ===
-with open(SANDBOX_ID_FILE, "r") as f:
-    sandbox_id = f.read().strip()
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_payload = {"id": f"identity/accounts/{sandbox_id}"}
-switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
+sandbox_id = state.require("sandbox_id")
+jwt = csp_client.switch_account(BASE_URL, jwt, sandbox_id, email=EMAIL, probe_path="/v2/groups")
 headers["Authorization"] = f"Bearer {jwt}"
 print(f"🔁 Switched to sandbox account {sandbox_id}", flush=True)
-time.sleep(3)
 
 # === Step 3: Get Groups ===
 group_url = f"{BASE_URL}/v2/groups"
-group_resp = requests.get(group_url, headers=headers)
+group_resp = session.get(group_url, headers=headers)
 group_resp.raise_for_status()
 groups = group_resp.json().get("results", [])
 
@@ -63,20 +59,28 @@ user_payload = {
 }
 user_url = f"{BASE_URL}/v2/users"
 
-max_retries = 5
-for attempt in range(max_retries):
-    try:
-        print(f"📤 Creating user '{USER_NAME}'... (attempt {attempt+1})", flush=True)
-        user_resp = requests.post(user_url, headers=headers, json=user_payload)
-        user_resp.raise_for_status()
-        user_data = user_resp.json()
-        break
-    except requests.RequestException as e:
-        print(f"⚠️ Attempt {attempt+1} failed: {e}", flush=True)
-        time.sleep((2**attempt) + random.random())
-else:
-    print("❌ User creation failed after retries", flush=True)
+# Only 429/5xx and connection errors are retried (retry_policy "csp.users.create");
+# a 400/409 is answered on the first attempt
+retry = policy("csp.users.create")
+print(f"📤 Creating user '{USER_NAME}'... (up to {retry.max_attempts} attempts)", flush=True)
+try:
+    user_resp = retry.call(lambda: session.post(user_url, headers=headers, json=user_payload))
+except CircuitOpenError as e:
+    print(f"⛔ User creation skipped: {e}", flush=True)
+    sys.exit(1)
+except requests.RequestException as e:
+    print(retry.summary(), flush=True)
+    print(f"❌ User creation failed after {retry.attempts} attempt(s): {e}", flush=True)
+    sys.exit(1)
+print(retry.summary(), flush=True)
+
+if user_resp.status_code >= 400:
+    if retry.is_retryable(user_resp.status_code):
+        print(f"❌ User creation failed after retries (last HTTP {user_resp.status_code})", flush=True)
+    else:
+        print(f"❌ Non-retryable error {user_resp.status_code}: {user_resp.text}", flush=True)
     sys.exit(1)
+user_data = user_resp.json()
 
 print("✅ User created successfully.", flush=True)
 print(json.dumps(user_data, indent=2), flush=True)
@@ -85,8 +89,7 @@ print(json.dumps(user_data, indent=2), flush=True)
 user_id = user_data.get("result", {}).get("id")
 if user_id and user_id.startswith("identity/users/"):
     user_id = user_id.split("/")[-1]
-    with open(USER_ID_FILE, "w") as f:
-        f.write(user_id)
+    state.update(user_id=user_id)
     print(f"✅ User ID saved to {USER_ID_FILE}: {user_id}", flush=True)
 else:
     print("❌ User ID not found or unexpected format. Aborting.", flush=True)
@@ -0,0 +1,206 @@
+"""
+Shared CSP HTTP client
+
+One pooled, keep-alive requests.Session per process so that every lifecycle
+script (and every class inside a script) reuses the same TLS connections to
+csp.infoblox.com instead of opening a new one per call.
+
+Usage:
+  from csp_client import get_session
+  session = get_session()
+  r = session.get(f"{base_url}/v2/groups", headers=headers)
+
+sign_in() and switch_account() go through token_cache, so a script that
+runs after another one in the same sandbox reuses its JWTs instead of
+logging in again; a cached JWT that CSP answers with 401 is dropped from
+the cache so the next script signs in afresh. After a fresh account
+switch, wait_until_ready() polls a cheap authorized GET until the new JWT
+is accepted, instead of sleeping a fixed number of seconds for
+permissions to propagate.
+
+base_url() is the one place that knows where CSP lives; point CSP_URL at
+the local stand-in (csp_standin.py) to run any script offline.
+
+Environment Variables:
+  CSP_URL              - CSP host or full base URL (default: csp.infoblox.com;
+                         e.g. http://127.0.0.1:8080 for the local stand-in)
+  CSP_POOL_CONNECTIONS - Number of host pools to cache (default: 4)
+  CSP_POOL_MAXSIZE     - Max keep-alive connections per host (default: 16)
+  CSP_CONNECT_TIMEOUT  - Connect timeout in seconds (default: 5)
+  CSP_READ_TIMEOUT     - Read timeout in seconds (default: 30)
+  CSP_READY_TIMEOUT    - Max seconds to wait for a switched JWT (default: 60)
+"""
+
+import os
+import time
+import threading
+import requests
+import http_metrics
+import tracing
+from requests.adapters import HTTPAdapter
+from typing import Optional
+from token_cache import default_cache
+
+DEFAULT_POOL_CONNECTIONS = int(os.environ.get("CSP_POOL_CONNECTIONS", "4"))
+DEFAULT_POOL_MAXSIZE = int(os.environ.get("CSP_POOL_MAXSIZE", "16"))
+DEFAULT_TIMEOUT = (
+    float(os.environ.get("CSP_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("CSP_READ_TIMEOUT", "30")),
+)
+DEFAULT_READY_TIMEOUT = float(os.environ.get("CSP_READY_TIMEOUT", "60"))
+DEFAULT_CSP_URL = "csp.infoblox.com"
+
+# Statuses that mean "the switched JWT is not honoured yet" rather than a
+# real answer from the endpoint.
+_NOT_READY_STATUSES = {401, 403, 429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class CSPSession(requests.Session):
+    """
+    requests.Session with a sized connection pool and a default timeout.
+
+    Callers may still pass timeout=... explicitly (e.g. the broker calls use
+    their own connect/read split); it is only filled in when omitted.
+    Every request is reported to http_metrics, and a bearer token answered
+    with 401 is dropped from the token cache.
+    """
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        began, started = time.monotonic(), time.time()
+        response = None
+        try:
+            response = super().request(method, url, **kwargs)
+            if response.status_code == 401:
+                _drop_rejected_token(kwargs.get("headers"))
+            return response
+        finally:
+            http_metrics.observe_requests(method, url, response, time.monotonic() - began, started,
+                                          streamed=bool(kwargs.get("stream")))
+
+
+def _drop_rejected_token(headers: Optional[dict]):
+    auth = (headers or {}).get("Authorization") or ""
+    if auth.startswith("Bearer "):
+        default_cache.discard(auth[len("Bearer "):])
+
+
+def get_session() -> CSPSession:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = CSPSession()
+    return _session
+
+
+def base_url() -> str:
+    """CSP base URL from CSP_URL: a bare host gets https://, a full URL is used as is."""
+    url = os.environ.get("CSP_URL", DEFAULT_CSP_URL).rstrip("/")
+    return url if "://" in url else f"https://{url}"
+
+
+def bearer_headers(jwt: str) -> dict:
+    """JWT headers as used by every /v2 and /api call after sign-in."""
+    return {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+
+
+def warm_up(base_url: str):
+    """
+    Open a pooled TLS connection to base_url ahead of the first real call
+    (e.g. while waiting on the broker). Errors are ignored.
+    """
+    try:
+        get_session().head(base_url, allow_redirects=False)
+    except requests.RequestException:
+        pass
+
+
+@tracing.traced("csp.sign_in")
+def sign_in(base_url: str, email: str, password: str, use_cache: bool = True) -> str:
+    """Return a home-account JWT for email, from the token cache if still valid."""
+    if use_cache:
+        jwt = default_cache.get(base_url, email, password=password)
+        if jwt:
+            print("♻️ Reusing cached CSP login", flush=True)
+            return jwt
+    r = get_session().post(
+        f"{base_url}/v2/session/users/sign_in",
+        json={"email": email, "password": password},
+    )
+    r.raise_for_status()
+    jwt = r.json().get("jwt")
+    if not jwt:
+        raise RuntimeError("Login succeeded but no JWT returned.")
+    default_cache.put(base_url, email, None, jwt, password=password)
+    return jwt
+
+
+def wait_until_ready(base_url: str, jwt: str, probe_path: str = "/v2/current_user",
+                     timeout: float = DEFAULT_READY_TIMEOUT) -> float:
+    """
+    Poll GET probe_path with jwt until it is accepted, backing off from 0.25s
+    up to 2s between attempts. Returns the seconds waited; raises
+    RuntimeError if the token is still rejected after timeout.
+    """
+    start = time.monotonic()
+    interval = 0.25
+    attempts = 0
+    status = None
+    while True:
+        attempts += 1
+        try:
+            status = get_session().get(f"{base_url}{probe_path}", headers=bearer_headers(jwt)).status_code
+        except requests.RequestException as e:
+            status = str(e)
+        elapsed = time.monotonic() - start
+        if status not in _NOT_READY_STATUSES and not isinstance(status, str):
+            print(f"⏱️ Account ready after {elapsed:.2f}s ({attempts} probe(s) of {probe_path})", flush=True)
+            return elapsed
+        if elapsed + interval > timeout:
+            raise RuntimeError(f"Switched JWT not accepted by {probe_path} after {elapsed:.1f}s (last: {status})")
+        time.sleep(interval)
+        interval = min(interval * 1.5, 2.0)
+
+
+@tracing.traced("csp.switch_account")
+def switch_account(base_url: str, jwt: str, account_id: str,
+                   email: Optional[str] = None, probe_path: Optional[str] = None) -> str:
+    """
+    Return a JWT scoped to account_id. When email is given the scoped token is
+    looked up in / stored to the token cache under (host, email, account_id).
+    With probe_path set, a fresh switch waits until the new JWT is accepted
+    there (see wait_until_ready); a cached token is assumed to be ready.
+    """
+    if email:
+        cached = default_cache.get(base_url, email, account_id)
+        if cached:
+            print(f"♻️ Reusing cached JWT for account {account_id}", flush=True)
+            return cached
+    r = get_session().post(
+        f"{base_url}/v2/session/account_switch",
+        headers=bearer_headers(jwt),
+        json={"id": f"identity/accounts/{account_id}"},
+    )
+    r.raise_for_status()
+    scoped = r.json().get("jwt")
+    if not scoped:
+        raise RuntimeError("Account switch succeeded but no JWT returned.")
+    if probe_path:
+        wait_until_ready(base_url, scoped, probe_path)
+    if email:
+        default_cache.put(base_url, email, account_id, scoped)
+    return scoped
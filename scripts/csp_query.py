@@ -0,0 +1,119 @@
+"""
+CSP list query builder
+
+Builds the `_filter`, `_fields`, `_limit` and `_offset` query parameters
+understood by CSP list endpoints (/v2/*, /api/iam, /api/ddi,
+/api/cloud_discovery), so lookups ask the server for just the matching rows
+and the columns they read instead of downloading the whole collection and
+filtering in Python.
+
+Usage:
+  q = Query().eq("credential_type", "Google Cloud Platform").fields("id").limit(1)
+  session.get(url, headers=headers, params=q.params())
+
+  q = Query().any(eq("name", "user"), eq("name", "act_admin")).fields("id", "name")
+
+Expressions are plain strings, so they compose with and/or:
+  Query().where(starts_with("name", "AWS_Demo")).where(ends_with("name", pid))
+
+Callers keep their Python-side check on the returned rows; the server
+filter only has to narrow the response, not be the single source of truth.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+
+def quote(value) -> str:
+    """Double-quoted CSP filter literal."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def eq(field: str, value) -> str:
+    return f"{field}=={quote(value)}"
+
+
+def ne(field: str, value) -> str:
+    return f"{field}!={quote(value)}"
+
+
+def _escape(text: str) -> str:
+    """Escape regex metacharacters only (re.escape also escapes '-', '#', ...)."""
+    return re.sub(r"([.^$*+?()\[\]{}|\\])", r"\\\1", str(text))
+
+
+def matches(field: str, pattern: str) -> str:
+    """Regular-expression match (CSP `~` operator)."""
+    return f"{field}~{quote(pattern)}"
+
+
+def contains(field: str, text: str, ignore_case: bool = False) -> str:
+    if ignore_case:
+        # Character classes rather than inline flags, which CSP may not accept
+        pattern = "".join(f"[{c.lower()}{c.upper()}]" if c.isalpha() else _escape(c) for c in text)
+        return matches(field, pattern)
+    return matches(field, _escape(text))
+
+
+def starts_with(field: str, prefix: str) -> str:
+    return matches(field, f"^{_escape(prefix)}")
+
+
+def ends_with(field: str, suffix: str) -> str:
+    return matches(field, f"{_escape(suffix)}$")
+
+
+def all_of(*exprs: str) -> str:
+    return " and ".join(f"({e})" if len(exprs) > 1 else e for e in exprs)
+
+
+def any_of(*exprs: str) -> str:
+    return " or ".join(f"({e})" if len(exprs) > 1 else e for e in exprs)
+
+
+class Query:
+    def __init__(self):
+        self._filters: List[str] = []
+        self._fields: Optional[List[str]] = None
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def where(self, expr: str) -> "Query":
+        """AND expr into the filter."""
+        self._filters.append(expr)
+        return self
+
+    def eq(self, field: str, value) -> "Query":
+        return self.where(eq(field, value))
+
+    def any(self, *exprs: str) -> "Query":
+        return self.where(any_of(*exprs))
+
+    def fields(self, *names: str) -> "Query":
+        self._fields = list(names)
+        return self
+
+    def limit(self, n: int) -> "Query":
+        self._limit = n
+        return self
+
+    def offset(self, n: int) -> "Query":
+        self._offset = n
+        return self
+
+    @property
+    def filter(self) -> Optional[str]:
+        return all_of(*self._filters) if self._filters else None
+
+    def params(self) -> Dict[str, str]:
+        params = {}
+        if self._filters:
+            params["_filter"] = self.filter
+        if self._fields:
+            params["_fields"] = ",".join(self._fields)
+        if self._limit is not None:
+            params["_limit"] = str(self._limit)
+        if self._offset is not None:
+            params["_offset"] = str(self._offset)
+        return params
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Local CSP API stand-in
+
+An in-memory CSP that answers every endpoint the lab scripts call, for
+offline performance and regression testing (see standin.py for the
+latency/429/5xx knobs):
+
+  /v2/session/users/sign_in, /v2/session/account_switch, /v2/current_user
+  /v2/groups, /v2/users[/{id}[/password]], /v2/current_api_keys
+  /v2/sandbox/accounts[/{id}]
+  /api/iam/v2/keys, /api/iam/v1/cloud_credential
+  /api/ddi/v1/dns/view[/{id}], /api/ddi/v1/dns/zone_child
+  /api/ddi/v1/federation/federated_realm|federated_block[/{id}]
+  /api/ddi/v1/ipam/ip_space|subnet|address_block
+  /api/cloud_discovery/v2/providers[/{id}]
+
+List endpoints understand the CSP query parameters the scripts send
+(_filter with ==, !=, ~, and/or, parentheses; _fields, _limit, _offset,
+_is_total_size_needed). Data is kept per account; a JWT from sign_in or
+account_switch selects the account, and any API key (Token ...) maps to a
+shared "apikey" account unless it was created through /v2/current_api_keys,
+in which case it acts on the account that created it.
+
+Eventual-consistency knobs model what students wait on in production:
+  --switch-lag S         a switched JWT is answered with 403 for S seconds
+  --credential-delay S   the GCP cloud credential appears S s after its key
+  --view-delay S         an account's default DNS view appears S s after first use
+  --delete-delay S       providers deleted with deletion_objects linger (202) S s
+
+Dataset knobs seed every account on first use: --providers, --views,
+--zones, --users, --accounts.
+
+Usage:
+  python csp_standin.py --port 8080 --latency lognormal:120,0.6 --p-429 0.02 \\
+      --credential-delay 20 --providers 500 --views 300
+  export CSP_URL=http://127.0.0.1:8080      # every script now talks to the stand-in
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import argparse
+import threading
+from typing import Dict, List, Optional
+from standin import App, add_fault_arguments, serve
+
+
+# ---------- CSP _filter evaluation ----------
+_TOKEN = re.compile(r'\s*(?:(?P<str>"(?:\\.|[^"\\])*")|(?P<op>==|!=|~|\(|\))|(?P<word>[A-Za-z_][\w.]*))')
+
+
+def _tokenize(text: str) -> List[tuple]:
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise ValueError(f"bad _filter near {text[pos:pos + 20]!r}")
+        pos = m.end()
+        if m.group("str"):
+            tokens.append(("str", re.sub(r"\\(.)", r"\1", m.group("str")[1:-1])))
+        elif m.group("op"):
+            tokens.append(("op", m.group("op")))
+        else:
+            tokens.append(("word", m.group("word")))
+    return tokens
+
+
+def _as_text(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else str(value)
+
+
+def compile_filter(text: Optional[str]):
+    """Return predicate(item) for a CSP _filter expression (None/'' matches all)."""
+    if not text:
+        return lambda item: True
+    tokens = _tokenize(text)
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else (None, None)
+
+    def take():
+        tok = peek()
+        pos[0] += 1
+        return tok
+
+    def primary():
+        kind, value = take()
+        if (kind, value) == ("op", "("):
+            pred = expr()
+            take()  # ")"
+            return pred
+        field = value
+        _, op = take()
+        _, literal = take()
+        if op == "==":
+            return lambda item: _as_text(item.get(field)) == literal
+        if op == "!=":
+            return lambda item: _as_text(item.get(field)) != literal
+        regex = re.compile(literal)
+        return lambda item: bool(regex.search(_as_text(item.get(field))))
+
+    def conjunction():
+        pred = primary()
+        while peek() == ("word", "and"):
+            take()
+            left, right = pred, primary()
+            pred = lambda item, l=left, r=right: l(item) and r(item)
+        return pred
+
+    def expr():
+        pred = conjunction()
+        while peek() == ("word", "or"):
+            take()
+            left, right = pred, conjunction()
+            pred = lambda item, l=left, r=right: l(item) or r(item)
+        return pred
+
+    return expr()
+
+
+# ---------- storage ----------
+class Collection:
+    def __init__(self, id_prefix: str = ""):
+        self.id_prefix = id_prefix
+        self.items: Dict[str, dict] = {}
+        self.hidden_until: Dict[str, float] = {}
+
+    def new_id(self) -> str:
+        return f"{self.id_prefix}{uuid.uuid4()}"
+
+    def add(self, item: dict, visible_after: float = 0.0) -> dict:
+        item.setdefault("id", self.new_id())
+        self.items[item["id"]] = item
+        if visible_after:
+            self.hidden_until[item["id"]] = time.monotonic() + visible_after
+        return item
+
+    def visible(self) -> List[dict]:
+        now = time.monotonic()
+        return [i for k, i in self.items.items() if self.hidden_until.get(k, 0) <= now]
+
+    def find(self, key: str) -> Optional[dict]:
+        """Look up by full ID or by its last path segment."""
+        if key in self.items:
+            return self.items[key]
+        return next((i for k, i in self.items.items() if k.split("/")[-1] == key), None)
+
+
+def list_response(items: List[dict], req) -> tuple:
+    """Apply _filter/_fields/_offset/_limit (+ total_size) the way CSP list endpoints do."""
+    try:
+        pred = compile_filter(req.arg("_filter"))
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    matched = [i for i in items if pred(i)]
+    offset = int(req.arg("_offset", 0))
+    limit = req.arg("_limit")
+    page = matched[offset:offset + int(limit)] if limit else matched[offset:]
+    fields = req.arg("_fields")
+    if fields:
+        keep = fields.split(",")
+        page = [{k: i[k] for k in keep if k in i} for i in page]
+    body = {"results": page}
+    if req.arg("_is_total_size_needed") == "true":
+        body["total_size"] = len(matched)
+    return 200, body
+
+
+class Account:
+    def __init__(self, account_id: str):
+        self.id = account_id
+        self.created = time.monotonic()
+        self.lock = threading.Lock()
+        self.c = {
+            "users": Collection("identity/users/"),
+            "groups": Collection("identity/groups/"),
+            "sandbox_accounts": Collection("identity/accounts/"),
+            "api_keys": Collection(),
+            "iam_keys": Collection(),
+            "cloud_credentials": Collection(),
+            "views": Collection("dns/view/"),
+            "zones": Collection("dns/auth_zone/"),
+            "realms": Collection("federation/federated_realm/"),
+            "blocks": Collection("federation/federated_block/"),
+            "ip_spaces": Collection("ipam/ip_space/"),
+            "subnets": Collection("ipam/subnet/"),
+            "address_blocks": Collection("ipam/address_block/"),
+            "providers": Collection(),
+        }
+
+
+class CSPStandin:
+    def __init__(self, switch_lag: float = 0.0, credential_delay: float = 0.0, view_delay: float = 0.0,
+                 delete_delay: float = 0.0, providers: int = 0, views: int = 0, zones: int = 0,
+                 users: int = 0, accounts: int = 0, slow: Optional[Dict[str, str]] = None, **app_options):
+        self.switch_lag = switch_lag
+        self.credential_delay = credential_delay
+        self.view_delay = view_delay
+        self.delete_delay = delete_delay
+        self.dataset = dict(providers=providers, views=views, zones=zones, users=users, accounts=accounts)
+        self.accounts: Dict[str, Account] = {}
+        self.switched_at: Dict[str, float] = {}
+        self.api_keys: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.app = App(**app_options)
+        self._routes(slow or {})
+
+    # ---------- auth ----------
+    @staticmethod
+    def make_jwt(account_id: str, email: str, ttl: int = 3600) -> str:
+        enc = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+        payload = {"account_id": account_id, "email": email, "exp": int(time.time()) + ttl,
+                   "jti": uuid.uuid4().hex}
+        return f"{enc({'alg': 'none'})}.{enc(payload)}.standin"
+
+    @staticmethod
+    def _jwt_payload(jwt: str) -> Optional[dict]:
+        try:
+            part = jwt.split(".")[1]
+            return json.loads(base64.urlsafe_b64decode(part + "=" * (-len(part) % 4)))
+        except (IndexError, ValueError):
+            return None
+
+    def account(self, account_id: str) -> Account:
+        with self._lock:
+            acct = self.accounts.get(account_id)
+            if acct is None:
+                acct = self.accounts[account_id] = Account(account_id)
+                self._seed(acct)
+            return acct
+
+    def _auth(self, req):
+        """(account, error_response) for the request's Authorization header."""
+        header = req.headers.get("Authorization") or ""
+        scheme, _, credential = header.partition(" ")
+        if scheme.lower() == "token" and credential:
+            return self.account(self.api_keys.get(credential, "apikey")), None
+        if scheme.lower() != "bearer" or not credential:
+            return None, (401, {"error": "missing credentials"})
+        payload = self._jwt_payload(credential)
+        if not payload or payload.get("exp", 0) < time.time():
+            return None, (401, {"error": "invalid or expired token"})
+        switched = self.switched_at.get(payload.get("jti"))
+        if switched and time.monotonic() - switched < self.switch_lag:
+            return None, (403, {"error": "permissions not propagated yet"})
+        return self.account(payload["account_id"]), None
+
+    def authed(self, fn):
+        def handler(req):
+            acct, error = self._auth(req)
+            if error:
+                return error
+            with acct.lock:
+                return fn(acct, req)
+        return handler
+
+    # ---------- seed data ----------
+    def _seed(self, acct: Account):
+        c = acct.c
+        for name in ("user", "act_admin", "act_viewer"):
+            c["groups"].add({"name": name})
+        c["views"].add({"name": "default", "type": "view"}, visible_after=self.view_delay)
+        c["ip_spaces"].add({"name": "default"})
+        n = self.dataset
+        for i in range(n["providers"]):
+            prefix = ("AWS_Demo", "Azure_Demo_Lab", "GCP_Lab")[i % 3]
+            c["providers"].add({"name": f"{prefix}_seed{i:05d}", "provider_type": prefix.split("_")[0]})
+        for i in range(n["views"]):
+            c["views"].add({"name": f"{('AWS_Demo_Lab', 'Azure_Demo_Lab')[i % 2]}_seed{i:05d}", "type": "view"})
+        for i in range(n["zones"]):
+            c["zones"].add({"name": f"zone{i:05d}.example.", "type": "zone", "flat": False})
+        for i in range(n["users"]):
+            c["users"].add({"name": f"seed user {i}", "email": f"seed{i:05d}@example.com"})
+        for i in range(n["accounts"]):
+            c["sandbox_accounts"].add({"name": f"seed-participant-{i:05d}",
+                                       "state": "active" if i % 4 else "deleted"})
+
+    # ---------- routes ----------
+    def _routes(self, slow: Dict[str, str]):
+        r = lambda method, pattern, fn, authed=True: self.app.route(
+            method, pattern, self.authed(fn) if authed else fn, latency=slow.get(pattern))
+        ID = r"(?P<id>[^/]+)"
+        r("HEAD", r"/", lambda req: (200, None), authed=False)
+        r("POST", r"/v2/session/users/sign_in", self.sign_in, authed=False)
+        r("POST", r"/v2/session/account_switch", self.account_switch, authed=False)
+        r("GET", r"/v2/current_user", lambda a, req: (200, {"result": {"account_id": f"identity/accounts/{a.id}"}}))
+        r("GET", r"/v2/groups", lambda a, req: list_response(a.c["groups"].visible(), req))
+        r("GET", r"/v2/users", lambda a, req: list_response(a.c["users"].visible(), req))
+        r("POST", r"/v2/users", self.create_user)
+        r("GET", rf"/v2/users/{ID}", self.getter("users"))
+        r("DELETE", rf"/v2/users/{ID}", self.deleter("users"))
+        r("POST", rf"/v2/users/{ID}/password", self.set_password)
+        r("POST", r"/v2/current_api_keys", self.create_api_key)
+        r("GET", r"/v2/sandbox/accounts", lambda a, req: list_response(a.c["sandbox_accounts"].visible(), req))
+        r("POST", r"/v2/sandbox/accounts", self.create_sandbox)
+        r("GET", rf"/v2/sandbox/accounts/{ID}", self.getter("sandbox_accounts"))
+        r("DELETE", rf"/v2/sandbox/accounts/{ID}", self.deleter("sandbox_accounts"))
+        r("POST", r"/api/iam/v2/keys", self.create_iam_key)
+        r("GET", r"/api/iam/v1/cloud_credential", lambda a, req: list_response(a.c["cloud_credentials"].visible(), req))
+        r("GET", r"/api/ddi/v1/dns/view", lambda a, req: list_response(a.c["views"].visible(), req))
+        r("DELETE", rf"/api/ddi/v1/dns/view/{ID}", self.deleter("views"))
+        r("GET", r"/api/ddi/v1/dns/zone_child",
+          lambda a, req: list_response(a.c["views"].visible() + a.c["zones"].visible(), req))
+        for kind, coll, unique in (("federation/federated_realm", "realms", ("name",)),
+                                   ("federation/federated_block", "blocks", ("address", "cidr", "federated_realm")),
+                                   ("ipam/ip_space", "ip_spaces", ("name",)),
+                                   ("ipam/subnet", "subnets", ("address", "cidr", "space")),
+                                   ("ipam/address_block", "address_blocks", ("address", "cidr", "space"))):
+            r("GET", rf"/api/ddi/v1/{kind}", lambda a, req, coll=coll: list_response(a.c[coll].visible(), req))
+            r("POST", rf"/api/ddi/v1/{kind}", self.creator(coll, unique))
+            r("GET", rf"/api/ddi/v1/{kind}/{ID}", self.getter(coll))
+            r("PATCH", rf"/api/ddi/v1/{kind}/{ID}", self.patcher(coll))
+        r("GET", r"/api/cloud_discovery/v2/providers", lambda a, req: list_response(a.c["providers"].visible(), req))
+        r("POST", r"/api/cloud_discovery/v2/providers", self.create_provider)
+        r("GET", rf"/api/cloud_discovery/v2/providers/{ID}", self.getter("providers"))
+        r("DELETE", rf"/api/cloud_discovery/v2/providers/{ID}", self.delete_provider)
+
+    # ---------- generic handlers ----------
+    @staticmethod
+    def getter(coll: str):
+        def get(acct, req):
+            item = acct.c[coll].find(req.match.group("id"))
+            return (200, {"result": item}) if item else (404, {"error": "not found"})
+        return get
+
+    @staticmethod
+    def deleter(coll: str):
+        def delete(acct, req):
+            item = acct.c[coll].find(req.match.group("id"))
+            if not item:
+                return 404, {"error": "not found"}
+            del acct.c[coll].items[item["id"]]
+            return 204, None
+        return delete
+
+    @staticmethod
+    def patcher(coll: str):
+        def patch(acct, req):
+            item = acct.c[coll].find(req.match.group("id"))
+            if not item:
+                return 404, {"error": "not found"}
+            item.update({k: v for k, v in (req.body or {}).items() if k != "id"})
+            return 200, {"result": item}
+        return patch
+
+    @staticmethod
+    def creator(coll: str, unique=("name",)):
+        def create(acct, req):
+            body = dict(req.body or {})
+            key = tuple(_as_text(body.get(f)) for f in unique)
+            if any(tuple(_as_text(i.get(f)) for f in unique) == key for i in acct.c[coll].items.values()):
+                return 409, {"error": f"{coll[:-1]} already exists"}
+            body.pop("id", None)
+            return 201, {"result": acct.c[coll].add(body)}
+        return create
+
+    # ---------- specific handlers ----------
+    def sign_in(self, req):
+        body = req.body or {}
+        if not body.get("email") or not body.get("password"):
+            return 401, {"error": "invalid credentials"}
+        return 200, {"jwt": self.make_jwt("home", body["email"])}
+
+    def account_switch(self, req):
+        acct, error = self._auth(req)
+        if error:
+            return error
+        target = ((req.body or {}).get("id") or "").split("/")[-1]
+        if not target:
+            return 400, {"error": "id required"}
+        email = self._jwt_payload(req.headers["Authorization"].split(" ", 1)[1]).get("email", "")
+        jwt = self.make_jwt(target, email)
+        self.switched_at[self._jwt_payload(jwt)["jti"]] = time.monotonic()
+        self.account(target)
+        return 200, {"jwt": jwt}
+
+    def create_user(self, acct, req):
+        body = dict(req.body or {})
+        if any(u.get("email") == body.get("email") for u in acct.c["users"].items.values()):
+            return 409, {"error": "user already exists"}
+        return 201, {"result": acct.c["users"].add(body)}
+
+    def set_password(self, acct, req):
+        if not acct.c["users"].find(req.match.group("id")):
+            return 404, {"error": "not found"}
+        return 200, {"result": {}}
+
+    def create_api_key(self, acct, req):
+        key = acct.c["api_keys"].add(dict(req.body or {}, key=uuid.uuid4().hex))
+        self.api_keys[key["key"]] = acct.id
+        return 201, {"result": key}
+
+    def create_sandbox(self, acct, req):
+        body = dict(req.body or {})
+        sandbox = acct.c["sandbox_accounts"].add(dict(body, state=body.get("state", "active")))
+        sandbox["admin_user"] = dict(body.get("admin_user") or {}, account_id=sandbox["id"])
+        self.account(sandbox["id"].split("/")[-1])
+        return 201, {"result": sandbox}
+
+    def create_iam_key(self, acct, req):
+        body = dict(req.body or {})
+        if any(k.get("name") == body.get("name") for k in acct.c["iam_keys"].items.values()):
+            return 409, {"error": "key already exists"}
+        key = acct.c["iam_keys"].add({k: v for k, v in body.items() if k != "key_data"})
+        if body.get("source_id") == "gcp":
+            acct.c["cloud_credentials"].add({"name": body.get("name"), "credential_type": "Google Cloud Platform",
+                                             "key_id": key["id"]}, visible_after=self.credential_delay)
+        return 200, {"result": key}
+
+    def create_provider(self, acct, req):
+        body = dict(req.body or {})
+        if any(p.get("name") == body.get("name") for p in acct.c["providers"].items.values()):
+            return 409, {"error": "provider already exists"}
+        return 201, {"result": acct.c["providers"].add(body)}
+
+    def delete_provider(self, acct, req):
+        coll = acct.c["providers"]
+        item = coll.find(req.match.group("id"))
+        if not item or item.get("deleting"):
+            return 404, {"error": "not found"}
+        if req.query.get("deletion_objects") and self.delete_delay:
+            item["deleting"] = True
+            threading.Timer(self.delete_delay, self._finish_delete, args=(acct, item["id"])).start()
+            return 202, {"result": {"id": item["id"], "status": "deleting"}}
+        del coll.items[item["id"]]
+        return 204, None
+
+    @staticmethod
+    def _finish_delete(acct: Account, item_id: str):
+        with acct.lock:
+            acct.c["providers"].items.pop(item_id, None)
+
+
+def add_csp_arguments(ap: argparse.ArgumentParser):
+    """Stand-in knobs, shared with the benchmark harness."""
+    ap.add_argument("--switch-lag", type=float, default=0.0)
+    ap.add_argument("--credential-delay", type=float, default=0.0)
+    ap.add_argument("--view-delay", type=float, default=0.0)
+    ap.add_argument("--delete-delay", type=float, default=0.0)
+    ap.add_argument("--providers", type=int, default=0, help="Seed providers per account.")
+    ap.add_argument("--views", type=int, default=0, help="Seed DNS views per account.")
+    ap.add_argument("--zones", type=int, default=0, help="Seed zones per account.")
+    ap.add_argument("--users", type=int, default=0, help="Seed users per account.")
+    ap.add_argument("--accounts", type=int, default=0, help="Seed sandbox accounts per account.")
+    ap.add_argument("--p-429", type=float, default=0.0, help="Probability of an injected 429.")
+    ap.add_argument("--rate", type=float, default=0, help="Requests/s before 429s (0 = off).")
+    ap.add_argument("--slow", action="append", default=[], metavar="ROUTE=SPEC",
+                    help=r"Per-route latency, e.g. '/api/iam/v2/keys=fixed:800' (repeatable).")
+
+
+def standin_from_args(args) -> CSPStandin:
+    return CSPStandin(switch_lag=args.switch_lag, credential_delay=args.credential_delay,
+                      view_delay=args.view_delay, delete_delay=args.delete_delay,
+                      providers=args.providers, views=args.views, zones=args.zones, users=args.users,
+                      accounts=args.accounts, slow=dict(s.split("=", 1) for s in args.slow),
+                      latency=args.latency, p_5xx=args.p_5xx, p_429=args.p_429, rate=args.rate,
+                      retry_after=args.retry_after, seed=args.seed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local in-memory CSP API stand-in.")
+    ap.add_argument("--port", type=int, default=8080)
+    add_fault_arguments(ap)
+    add_csp_arguments(ap)
+    args = ap.parse_args()
+
+    csp = standin_from_args(args)
+    server, url = serve(csp.app, "127.0.0.1", args.port)
+    print(f"🧪 CSP stand-in on {url}; export CSP_URL={url}  (Ctrl-C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n📊 {dict(csp.app.stats)}", flush=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
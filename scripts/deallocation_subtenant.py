@@ -18,13 +18,19 @@ Environment Variables:
   BROKER_API_TOKEN        - Required. API token for the Broker.
   INSTRUQT_PARTICIPANT_ID - Required. Same value used during allocation.
 
-Input Files (from allocation_broker_subtenant.py):
+Input (lab_state.json or legacy file, from allocation_broker_subtenant.py):
   subtenant_id.txt  - Broker sandbox ID (CSP ID)
 """
 
 import os
 import sys
 import requests
+import tracing
+from csp_client import get_session
+from lab_state import LabState
+from circuit_breaker import CircuitOpenError
+from retry_policy import policy
+from step_journal import StepJournal
 
 # === Config ===
 BROKER_API_URL = os.environ.get(
@@ -42,16 +48,10 @@ if not INSTRUQT_SANDBOX_ID:
     print("❌ INSTRUQT_PARTICIPANT_ID not set", flush=True)
     sys.exit(1)
 
-# === Read subtenant_id ===
-try:
-    with open("subtenant_id.txt", "r") as f:
-        subtenant_id = f.read().strip()
-except FileNotFoundError:
-    print("⚠️ subtenant_id.txt not found, nothing to deallocate", flush=True)
-    sys.exit(0)
-
+# === Read subtenant_id (lab state, falls back to subtenant_id.txt) ===
+subtenant_id = LabState().get_str("subtenant_id")
 if not subtenant_id:
-    print("⚠️ subtenant_id.txt is empty, nothing to deallocate", flush=True)
+    print("⚠️ No subtenant_id in lab state or subtenant_id.txt, nothing to deallocate", flush=True)
     sys.exit(0)
 
 print(f"🧹 Marking sandbox for deletion...", flush=True)
@@ -66,11 +66,13 @@ headers = {
 }
 
 try:
-    resp = requests.post(
+    retry = policy("broker.mark_for_deletion")
+    resp = retry.call(lambda: get_session().post(
         f"{BROKER_API_URL}/sandboxes/{subtenant_id}/mark-for-deletion",
         headers=headers,
         timeout=(5, 15),
-    )
+    ))
+    print(retry.summary(), flush=True)
 
     if resp.status_code == 200:
         result = resp.json()
@@ -96,10 +98,19 @@ try:
         print(f"   Response: {resp.text}", flush=True)
         sys.exit(1)
 
+except CircuitOpenError as e:
+    print(f"⛔ Deallocation skipped: {e}", flush=True)
+    sys.exit(1)
+
 except requests.exceptions.RequestException as e:
     print(f"❌ Network error: {e}", flush=True)
     sys.exit(1)
 
+# The sandbox is gone, so a later setup run must start from scratch
+# (and a later allocation starts a new trace)
+StepJournal().reset()
+tracing.end_trace()
+
 print(f"\n{'='*60}", flush=True)
 print("✅ Sandbox deallocation requested", flush=True)
 print(f"{'='*60}", flush=True)
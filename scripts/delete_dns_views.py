@@ -1,5 +1,7 @@
 import os
-import requests
+from bulk_delete import BulkDeleter
+from csp_client import base_url, get_session
+from lab_state import LabState
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
@@ -8,29 +10,29 @@ INPUT_FILE = "dns_view_ids.txt"
 # === Validation ===
 if not TOKEN:
     raise EnvironmentError("❌ 'Infoblox_Token' is not set.")
-if not os.path.exists(INPUT_FILE):
-    raise FileNotFoundError(f"❌ View ID file '{INPUT_FILE}' not found. Run extract script first.")
 
 headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
-# === Read view IDs from file
-with open(INPUT_FILE, "r") as f:
-    view_ids = [line.strip() for line in f if line.strip()]
+# === Read IDs from lab state (falls back to dns_view_ids.txt)
+state = LabState()
+if state.get("dns_view_ids") is None:
+    raise FileNotFoundError(f"❌ View ID file '{INPUT_FILE}' not found. Run extract script first.")
+view_ids = state.get_list("dns_view_ids")
 
 print(f"🧹 Deleting {len(view_ids)} DNS view(s)...")
 
-for view_id in view_ids:
+
+def delete_view(view_id):
     view_uuid = view_id.split("/")[-1]  # Extract only the UUID
-    url = f"https://csp.infoblox.com/api/ddi/v1/dns/view/{view_uuid}"
-    print(f"❌ Deleting DNS view: {view_id}")
-
-    response = requests.delete(url, headers=headers)
-    if response.status_code == 204:
-        print("✅ Deleted successfully.")
-    elif response.status_code == 404:
-        print("⚠️ Not found or already deleted.")
-    else:
-        print(f"❌ Failed: {response.status_code} - {response.text}")
+    url = f"{base_url()}/api/ddi/v1/dns/view/{view_uuid}"
+    return session.delete(url, headers=headers)
+
+
+# Concurrent, backs off on 429/5xx (see bulk_delete.py)
+deleter = BulkDeleter("dns view", delete_view)
+results = deleter.run(view_ids)
+deleter.print_report(results)
@@ -1,31 +1,35 @@
 import os
-import requests
+from bulk_delete import BulkDeleter
+from csp_client import base_url, get_session
+from lab_state import LabState
 
 TOKEN = os.environ.get("Infoblox_Token")
 INPUT_FILE = "provider_ids.txt"
 
 if not TOKEN:
     raise EnvironmentError("❌ 'Infoblox_Token' environment variable is not set.")
-if not os.path.exists(INPUT_FILE):
-    raise FileNotFoundError(f"❌ Input file '{INPUT_FILE}' not found.")
 
 headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
-with open(INPUT_FILE, "r") as f:
-    provider_ids = [line.strip() for line in f if line.strip()]
+# === Read IDs from lab state (falls back to provider_ids.txt)
+state = LabState()
+if state.get("provider_ids") is None:
+    raise FileNotFoundError(f"❌ Input file '{INPUT_FILE}' not found.")
+provider_ids = state.get_list("provider_ids")
 
 print(f"🧹 Deleting {len(provider_ids)} provider(s)...")
 
-for provider_id in provider_ids:
-    url = f"https://csp.infoblox.com/api/cloud_discovery/v2/providers/{provider_id}"
-    print(f"❌ Deleting provider: {provider_id}")
-    response = requests.delete(url, headers=headers)
-    if response.status_code == 204:
-        print("✅ Deleted successfully.")
-    elif response.status_code == 404:
-        print("⚠️ Not found.")
-    else:
-        print(f"❌ Failed: {response.status_code} - {response.text}")
+
+def delete_provider(provider_id):
+    url = f"{base_url()}/api/cloud_discovery/v2/providers/{provider_id}"
+    return session.delete(url, headers=headers)
+
+
+# Concurrent, backs off on 429/5xx (see bulk_delete.py)
+deleter = BulkDeleter("provider", delete_provider)
+results = deleter.run(provider_ids)
+deleter.print_report(results)
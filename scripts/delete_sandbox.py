@@ -1,30 +1,27 @@
 import os
-import requests
+import csp_client
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState, MissingStateError
 
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = f"{csp_client.base_url()}/v2"
 TOKEN = os.environ.get('Infoblox_Token')
 SANDBOX_ID_FILE = "sandbox_id.txt"
+state = LabState()
 
-# Read sandbox ID from file
+# Read sandbox ID from lab state (or sandbox_id.txt)
 try:
-    with open(SANDBOX_ID_FILE, "r") as f:
-        sandbox_id = f.read().strip()
-except FileNotFoundError:
+    sandbox_id = state.require("sandbox_id")
+except MissingStateError:
     print(f"❌ {SANDBOX_ID_FILE} not found. You must run create_sandbox.py first.")
     exit(1)
 
-if not sandbox_id:
-    print("⚠️ Empty sandbox ID. File is corrupted or empty.")
-    exit(1)
-
 
 # Updated deletion logic
 def delete_sandbox(api: SandboxAccountAPI, sandbox_id: str) -> bool:
     endpoint = f"{api.base_url}/sandbox/accounts/{sandbox_id}"
     try:
         print(f"🔗 Sending DELETE request to: {endpoint}")
-        response = requests.delete(endpoint, headers=api._headers())
+        response = api.session.delete(endpoint, headers=api._headers())
 
         if response.status_code in [200, 204]:
             print(f"🗑️ Sandbox {sandbox_id} deleted successfully.")
@@ -44,7 +41,7 @@ deleted = delete_sandbox(api, sandbox_id)
 
 if deleted:
     try:
-        os.remove(SANDBOX_ID_FILE)
+        state.delete("sandbox_id")
         print(f"📁 Removed file: {SANDBOX_ID_FILE}")
     except OSError as e:
         print(f"⚠️ Could not remove file: {e}")
@@ -1,33 +1,27 @@
 import os
 import json
-import requests
+import csp_client
+from csp_client import get_session
+from lab_state import LabState
 import time
 
 class InfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
+        self.base_url = csp_client.base_url()
         self.email = os.getenv("INFOBLOX_EMAIL")
         self.password = os.getenv("INFOBLOX_PASSWORD")
         self.jwt = None
-        self.session = requests.Session()
+        self.session = get_session()
+        self.state = LabState()
         self.headers = {"Content-Type": "application/json"}
 
     def login(self):
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(f"{self.base_url}/v2/session/users/sign_in", 
-                                     headers=self.headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = csp_client.sign_in(self.base_url, self.email, self.password)
         print("✅ Logged in and JWT acquired")
 
     def switch_account(self):
-        sandbox_id = self._read_file("sandbox_id.txt")
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        headers = self._auth_headers()
-        response = self.session.post(f"{self.base_url}/v2/session/account_switch", 
-                                     headers=headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        sandbox_id = self.state.require("sandbox_id")
+        self.jwt = csp_client.switch_account(self.base_url, self.jwt, sandbox_id, email=self.email)
         self._save_to_file("jwt.txt", self.jwt)
         print(f"✅ Switched to sandbox {sandbox_id} and updated JWT")
 
@@ -70,9 +64,6 @@ class InfobloxSession:
         with open(filename, "w") as f:
             f.write(content.strip())
 
-    def _read_file(self, filename):
-        with open(filename, "r") as f:
-            return f.read().strip()
     
 
 if __name__ == "__main__":
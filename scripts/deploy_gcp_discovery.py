@@ -1,32 +1,28 @@
 import os
 import json
-import requests
+import csp_client
+from csp_client import get_session
+from lab_state import LabState
 import time
 
 class GCPInfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
+        self.base_url = csp_client.base_url()
         self.email = os.getenv("INFOBLOX_EMAIL")
         self.password = os.getenv("INFOBLOX_PASSWORD")
         self.jwt = None
-        self.session = requests.Session()
+        self.session = get_session()
+        self.state = LabState()
         self.headers = {"Content-Type": "application/json"}
 
     def login(self):
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(f"{self.base_url}/v2/session/users/sign_in", headers=self.headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = csp_client.sign_in(self.base_url, self.email, self.password)
         self._save_to_file("gcp_jwt.txt", self.jwt)
         print("✅ Logged in and saved JWT to gcp_jwt.txt")
 
     def switch_account(self):
-        sandbox_id = self._read_file("sandbox_id.txt")
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        headers = self._auth_headers()
-        response = self.session.post(f"{self.base_url}/v2/session/account_switch", headers=headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        sandbox_id = self.state.require("sandbox_id")
+        self.jwt = csp_client.switch_account(self.base_url, self.jwt, sandbox_id, email=self.email)
         self._save_to_file("gcp_jwt.txt", self.jwt)
         print(f"✅ Switched to sandbox {sandbox_id} and updated JWT")
 
@@ -86,7 +82,7 @@ class GCPInfobloxSession:
             for cred in creds:
                 if cred.get("credential_type") == "Google Cloud Platform":
                     credential_id = cred.get("id")
-                    self._save_to_file("gcp_cloud_credential_id.txt", credential_id)
+                    self.state.update(gcp_cloud_credential_id=credential_id)
                     print(f"✅ GCP Cloud Credential ID saved: {credential_id}")
                     return credential_id
 
@@ -100,7 +96,7 @@ class GCPInfobloxSession:
         response = self.session.get(url, headers=self._auth_headers())
         response.raise_for_status()
         dns_view_id = response.json().get("results", [{}])[0].get("id")
-        self._save_to_file("gcp_dns_view_id.txt", dns_view_id)
+        self.state.update(gcp_dns_view_id=dns_view_id)
         print(f"✅ DNS View ID saved: {dns_view_id}")
         return dns_view_id
 
@@ -135,9 +131,6 @@ class GCPInfobloxSession:
         with open(filename, "w") as f:
             f.write(content.strip())
 
-    def _read_file(self, filename):
-        with open(filename, "r") as f:
-            return f.read().strip()
 
 
 if __name__ == "__main__":
@@ -1,38 +1,41 @@
 import os
 import json
-import requests
-import time
+import csp_client
+import tracing
+from csp_client import get_session
+from csp_query import Query
+from lab_state import LabState
+from retry_policy import policy
+from step_journal import StepJournal
+from waiter import Condition, wait_all, wait_one
 import random
 
+# GCP service account key uploaded by create_gcp_key
+SA_KEY_FILE = os.environ.get("GCP_SA_KEY_FILE", "/root/infoblox-lab/sa-key.json")
+
 class GCPInfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
+        self.base_url = csp_client.base_url()
         self.email = os.getenv("INFOBLOX_EMAIL")
         self.password = os.getenv("INFOBLOX_PASSWORD")
         self.jwt = None
-        self.session = requests.Session()
+        self.session = get_session()
+        self.state = LabState()
         self.headers = {"Content-Type": "application/json"}
 
     def login(self):
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(f"{self.base_url}/v2/session/users/sign_in", headers=self.headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = csp_client.sign_in(self.base_url, self.email, self.password)
         self._save_to_file("gcp_jwt.txt", self.jwt)
         print("✅ Logged in and saved JWT to gcp_jwt.txt")
 
     def switch_account(self):
-        sandbox_id = self._read_file("sandbox_id.txt")
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        headers = self._auth_headers()
-        response = self.session.post(f"{self.base_url}/v2/session/account_switch", headers=headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        sandbox_id = self.state.require("sandbox_id")
+        self.jwt = csp_client.switch_account(self.base_url, self.jwt, sandbox_id, email=self.email)
         self._save_to_file("gcp_jwt.txt", self.jwt)
         print(f"✅ Switched to sandbox {sandbox_id} and updated JWT")
 
-    def create_gcp_key(self):
-        sa_key_file = "/root/infoblox-lab/sa-key.json"
+    @tracing.traced("gcp.key_create")
+    def create_gcp_key(self, sa_key_file=SA_KEY_FILE):
         if not os.path.exists(sa_key_file):
             raise FileNotFoundError("❌ GCP service account key (sa-key.json) not found.")
 
@@ -59,52 +62,77 @@ class GCPInfobloxSession:
         else:
             print("🔐 GCP key created successfully.")
 
+    # ---------- readiness conditions (see waiter.py) ----------
+    def _cloud_credential_condition(self):
+        query = Query().eq("credential_type", "Google Cloud Platform").fields("id", "credential_type").limit(1)
+
+        def check(response):
+            for cred in response.json().get("results", []):
+                if cred.get("credential_type") == "Google Cloud Platform":
+                    return cred.get("id")
+            return None
+        return Condition(
+            "GCP Cloud Credential",
+            request=lambda: self.session.get(f"{self.base_url}/api/iam/v1/cloud_credential",
+                                             headers=self._auth_headers(), params=query.params()),
+            check=check,
+        )
+
+    def _dns_view_condition(self):
+        query = Query().fields("id").limit(1)
+
+        def check(response):
+            return (response.json().get("results") or [{}])[0].get("id")
+        return Condition(
+            "DNS View",
+            request=lambda: self.session.get(f"{self.base_url}/api/ddi/v1/dns/view",
+                                             headers=self._auth_headers(), params=query.params()),
+            check=check,
+        )
+
+    def _discovery_api_condition(self):
+        # Any authorized answer means ready; don't download the provider list
+        query = Query().fields("id").limit(1)
+        return Condition(
+            "Discovery API",
+            request=lambda: self.session.get(f"{self.base_url}/api/cloud_discovery/v2/providers",
+                                             headers=self._auth_headers(), params=query.params()),
+            check=lambda response: True,
+            max_interval=30,
+        )
+
+    def _save_cloud_credential_id(self, cred_id):
+        self.state.update(gcp_cloud_credential_id=cred_id)
+        print(f"✅ GCP Cloud Credential ID saved: {cred_id}")
+
+    def _save_dns_view_id(self, view_id):
+        self.state.update(gcp_dns_view_id=view_id)
+        print(f"✅ DNS View ID saved: {view_id}")
+
+    @tracing.traced("gcp.wait_for_resources")
+    def wait_for_resources(self, timeout=300):
+        """
+        Wait for the cloud credential, the DNS view and the discovery API
+        together under one deadline. Returns (cloud_credential_id, dns_view_id).
+        """
+        cred = self._cloud_credential_condition()
+        view = self._dns_view_condition()
+        results = wait_all([cred, view, self._discovery_api_condition()], timeout)
+        self._save_cloud_credential_id(results[cred.name])
+        self._save_dns_view_id(results[view.name])
+        return results[cred.name], results[view.name]
+
+    @tracing.traced("gcp.credential_wait")
     def fetch_cloud_credential_id(self, timeout=240):
-        url = f"{self.base_url}/api/iam/v1/cloud_credential"
-        print("⏳ Waiting for GCP Cloud Credential to appear...")
-        start = time.monotonic()
-        interval = 3
-
-        while time.monotonic() - start < timeout:
-            try:
-                response = self.session.get(url, headers=self._auth_headers())
-                if response.status_code == 429:
-                    time.sleep(5)
-                    continue
-                response.raise_for_status()
-                creds = response.json().get("results", [])
-                for cred in creds:
-                    if cred.get("credential_type") == "Google Cloud Platform":
-                        cred_id = cred.get("id")
-                        self._save_to_file("gcp_cloud_credential_id.txt", cred_id)
-                        print(f"✅ GCP Cloud Credential ID saved: {cred_id}")
-                        return cred_id
-            except Exception as e:
-                print(f"⚠️ Retry due to: {e}")
-            time.sleep(interval)
-            interval = min(interval * 1.7, 20)
-        raise RuntimeError("❌ GCP Cloud Credential did not appear in time.")
+        cred_id = wait_one(self._cloud_credential_condition(), timeout)
+        self._save_cloud_credential_id(cred_id)
+        return cred_id
 
+    @tracing.traced("gcp.dns_view_wait")
     def fetch_dns_view_id(self, timeout=240):
-        url = f"{self.base_url}/api/ddi/v1/dns/view"
-        print("⏳ Waiting for DNS View...")
-        start = time.monotonic()
-        interval = 3
-
-        while time.monotonic() - start < timeout:
-            try:
-                response = self.session.get(url, headers=self._auth_headers())
-                response.raise_for_status()
-                view_id = response.json().get("results", [{}])[0].get("id")
-                if view_id:
-                    self._save_to_file("gcp_dns_view_id.txt", view_id)
-                    print(f"✅ DNS View ID saved: {view_id}")
-                    return view_id
-            except Exception as e:
-                print(f"⚠️ Retry due to: {e}")
-            time.sleep(interval)
-            interval = min(interval * 1.7, 20)
-        raise RuntimeError("❌ DNS View ID not available in time.")
+        view_id = wait_one(self._dns_view_condition(), timeout)
+        self._save_dns_view_id(view_id)
+        return view_id
 
     def inject_variables_into_payload(self, template_file, output_file, dns_view_id, cloud_credential_id, project_id):
         with open(template_file, "r") as f:
@@ -120,37 +148,35 @@ class GCPInfobloxSession:
         print(f"📦 GCP payload created in {output_file} with injected variables")
 
     def wait_discovery_api_ready(self, timeout=300):
-        url = f"{self.base_url}/api/cloud_discovery/v2/providers"
-        print("🔎 Waiting for Discovery API to be ready...")
-        start = time.monotonic()
-        interval = 3
-        while time.monotonic() - start < timeout:
-            r = self.session.get(url, headers=self._auth_headers())
-            if r.status_code < 400:
-                print("✅ Discovery API ready")
-                return
-            time.sleep(interval)
-            interval = min(interval * 1.5, 30)
-        raise RuntimeError("❌ Discovery API not ready in time.")
-
-    def submit_discovery_job(self, payload_file, timeout=300):
+        wait_one(self._discovery_api_condition(), timeout)
+
+    @tracing.traced("gcp.discovery_submit")
+    def submit_discovery_job(self, payload_file, timeout=300, wait_ready=True):
         with open(payload_file, "r") as f:
             payload = json.load(f)
 
-        self.wait_discovery_api_ready()
+        if wait_ready:
+            self.wait_discovery_api_ready()
         url = f"{self.base_url}/api/cloud_discovery/v2/providers"
-        start = time.monotonic()
-        interval = 3
-        while time.monotonic() - start < timeout:
-            r = self.session.post(url, headers=self._auth_headers(), json=payload)
-            if r.status_code < 400:
-                print("🚀 GCP Cloud Discovery Job submitted:")
-                print(json.dumps(r.json(), indent=2))
-                return
-            print(f"⚠️ Discovery POST failed: {r.status_code} {r.text[:200]}")
-            time.sleep(interval)
-            interval = min(interval * 1.7, 30)
-        raise RuntimeError("❌ Timed out submitting GCP discovery job")
+        retry = policy("csp.discovery.submit", deadline=timeout)
+        r = retry.call(lambda: self.session.post(url, headers=self._auth_headers(), json=payload))
+        if r.status_code < 400:
+            print("🚀 GCP Cloud Discovery Job submitted:")
+            print(json.dumps(r.json(), indent=2))
+            return
+        print(f"⚠️ Discovery POST failed: {r.status_code} {r.text[:200]}")
+        raise RuntimeError(f"❌ GCP discovery job not submitted after {retry.attempts} attempt(s) (HTTP {r.status_code})")
+
+    def journal_inputs(self, project_id):
+        return {"account": self.state.require("sandbox_id"), "project_id": project_id}
+
+    def deploy(self, project_id, journal):
+        """Key upload, ID lookups and discovery job; the key upload is journaled on its own."""
+        journal.run("gcp_key", self.journal_inputs(project_id), self.create_gcp_key)
+        cred_id, dns_id = self.wait_for_resources()
+        self.inject_variables_into_payload("gcp_payload_template.json", "gcp_payload.json", dns_id, cred_id, project_id)
+        self.submit_discovery_job("gcp_payload.json", wait_ready=False)
+        return {"cloud_credential_id": cred_id, "dns_view_id": dns_id}
 
     def _auth_headers(self):
         return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
@@ -159,17 +185,16 @@ class GCPInfobloxSession:
         with open(filename, "w") as f:
             f.write(content.strip())
 
-    def _read_file(self, filename):
-        with open(filename, "r") as f:
-            return f.read().strip()
 
 if __name__ == "__main__":
     project_id = os.getenv("INSTRUQT_GCP_PROJECT_INFOBLOX_DEMO_PROJECT_ID")
     session = GCPInfobloxSession()
-    session.login()
-    session.switch_account()
-    session.create_gcp_key()
-    cred_id = session.fetch_cloud_credential_id()
-    dns_id = session.fetch_dns_view_id()
-    session.inject_variables_into_payload("gcp_payload_template.json", "gcp_payload.json", dns_id, cred_id, project_id)
-    session.submit_discovery_job("gcp_payload.json")
+    journal = StepJournal(session.state)
+
+    def setup():
+        session.login()
+        session.switch_account()
+        return session.deploy(project_id, journal)
+
+    # A retried setup script skips everything that already completed
+    journal.run("gcp_discovery", session.journal_inputs(project_id), setup)
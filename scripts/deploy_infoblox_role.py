@@ -1,5 +1,7 @@
 import boto3
 import json
+import http_metrics
+from lab_state import LabState
 
 # Config
 STACK_NAME = "InfobloxDiscoveryRoleStack"
@@ -8,9 +10,9 @@ EXTERNAL_ID_FILE = "external_id.txt"
 OUTPUT_FILE = "infoblox_role_arn.txt"
 PRINCIPAL_ID = "902917483333"  # Infoblox CSP Account ID
 
-# Step 1: Load external_id from file
-with open(EXTERNAL_ID_FILE, "r") as f:
-    external_id = f.read().strip()
+# Step 1: Load external_id from lab state (falls back to external_id.txt)
+state = LabState()
+external_id = state.require("external_id")
 
 print(f"📥 Loaded External ID: {external_id}")
 
@@ -18,8 +20,8 @@ print(f"📥 Loaded External ID: {external_id}")
 with open(TEMPLATE_FILE, "r") as f:
     template_body = f.read()
 
-# Step 3: Create boto3 CloudFormation client
-cf = boto3.client("cloudformation")
+# Step 3: Create boto3 CloudFormation client (requests recorded by http_metrics)
+cf = http_metrics.instrument_boto3(boto3.client("cloudformation"))
 
 # Step 4: Deploy the stack
 print("🚀 Creating CloudFormation stack...")
@@ -57,8 +59,7 @@ for output in outputs:
         break
 
 if role_arn:
-    with open(OUTPUT_FILE, "w") as f:
-        f.write(role_arn)
+    state.update(infoblox_role_arn=role_arn)
     print(f"✅ Role ARN saved to {OUTPUT_FILE}: {role_arn}")
 else:
     print("⚠️ Role ARN not found in stack outputs.")
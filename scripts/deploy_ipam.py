@@ -2,8 +2,24 @@ import os
 import re
 import yaml
 import json
-import requests
-import time
+import argparse
+import csp_client
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from cidr_planner import CIDRPlanner, PlanError
+from csp_client import get_session
+from csp_query import Query, eq
+from ipam_import import DEFAULT_BATCH_SIZE, BulkImporter
+from lab_state import LabState
+from paginator import paginate
+from retry_policy import policy
+
+# Parallel block writes in reconcile mode
+DEFAULT_CONCURRENCY = int(os.environ.get("IPAM_WRITE_CONCURRENCY", "8"))
+
+# Fields compared between config.yaml and CSP; anything else is CSP-owned
+REALM_FIELDS = ("comment", "tags")
+BLOCK_FIELDS = ("name", "comment", "tags")
 
 def load_config_with_env(file_path):
     with open(file_path, "r") as f:
@@ -20,25 +36,28 @@ class InfobloxCSPClient:
     def __init__(self, config_file):
         config = load_config_with_env(config_file)
 
-        self.base_url = config['base_url']
+        # CSP_URL (e.g. a local stand-in) wins over config.yaml
+        self.base_url = csp_client.base_url() if os.environ.get("CSP_URL") else config['base_url']
         self.email = config['email']
         self.password = config['password']
-        self.sandbox_id_file = config['sandbox_id_file']
         self.realm = config['realm']
         self.blocks = config['blocks']
+        self.subnets = config.get('subnets', [])
+        self.ip_space = config.get('ip_space', {"name": "default"})
         self.jwt = None
+        self.session = get_session()
         self.headers = {}
         self.output = {
             "realm": {},
             "blocks": []
         }
 
+    def validate(self) -> CIDRPlanner:
+        """Local CIDR checks (cidr_planner.py); raises PlanError before any API call."""
+        return CIDRPlanner(self.blocks, self.subnets)
+
     def authenticate(self):
-        url = f"{self.base_url}/v2/session/users/sign_in"
-        payload = {"email": self.email, "password": self.password}
-        r = requests.post(url, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = csp_client.sign_in(self.base_url, self.email, self.password)
         self.headers = {
             "Authorization": f"Bearer {self.jwt}",
             "Content-Type": "application/json"
@@ -46,19 +65,15 @@ class InfobloxCSPClient:
         print("✅ Logged in and JWT obtained.")
 
     def switch_account(self):
-        with open(self.sandbox_id_file, "r") as f:
-            sandbox_id = f.read().strip()
-        url = f"{self.base_url}/v2/session/account_switch"
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        r = requests.post(url, headers=self.headers, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        sandbox_id = LabState().require("sandbox_id")
+        # ⏱️ Returns once the federation API accepts the new JWT (permission lag)
+        self.jwt = csp_client.switch_account(
+            self.base_url, self.jwt, sandbox_id, email=self.email,
+            probe_path="/api/ddi/v1/federation/federated_realm?_limit=1"
+        )
         self.headers["Authorization"] = f"Bearer {self.jwt}"
         print(f"🔁 Switched to sandbox account {sandbox_id}")
 
-        # ⏱️ Wait to avoid permission lag
-        time.sleep(10)  # Add 10 seconds wait to be safe
-
     def create_realm(self):
         url = f"{self.base_url}/api/ddi/v1/federation/federated_realm"
         payload = {
@@ -67,7 +82,7 @@ class InfobloxCSPClient:
             "tags": self.realm["tags"],
             "utilization": 0
         }
-        r = requests.post(url, headers=self.headers, json=payload)
+        r = self.session.post(url, headers=self.headers, json=payload)
         r.raise_for_status()
         result = r.json()["result"]
         realm_id = result["id"]
@@ -87,21 +102,216 @@ class InfobloxCSPClient:
                 "tags": block["tags"],
                 "utilization": 0
             }
-            r = requests.post(url, headers=self.headers, json=payload)
+            r = self.session.post(url, headers=self.headers, json=payload)
             r.raise_for_status()
             result = r.json()["result"]
             self.output["blocks"].append(result)
             print(f"🧱 Created federated block: {block['name']}")
 
+    # ---------- reconcile (plan/diff, idempotent) ----------
+    def _realm_payload(self) -> dict:
+        return {"name": self.realm["name"], "comment": self.realm["comment"], "tags": self.realm["tags"]}
+
+    def _block_payload(self, block: dict, realm_id: Optional[str]) -> dict:
+        return {
+            "name": block["name"],
+            "address": block["address"],
+            "cidr": block["cidr"],
+            "comment": block["comment"],
+            "federated_realm": realm_id,
+            "tags": block["tags"],
+        }
+
+    @staticmethod
+    def _block_key(block: dict) -> str:
+        return f"{block['address']}/{int(block['cidr'])}"
+
+    @staticmethod
+    def _changes(desired: dict, current: dict, fields) -> dict:
+        return {f: desired[f] for f in fields if (current.get(f) or None) != (desired.get(f) or None)}
+
+    def fetch_existing(self) -> Tuple[Optional[dict], List[dict]]:
+        """One GET for the realm (by name) and one paginated GET for its blocks."""
+        r = self.session.get(f"{self.base_url}/api/ddi/v1/federation/federated_realm", headers=self.headers,
+                             params=Query().eq("name", self.realm["name"]).params())
+        r.raise_for_status()
+        realms = [x for x in r.json().get("results", []) if x.get("name") == self.realm["name"]]
+        if not realms:
+            return None, []
+        realm = realms[0]
+        blocks = list(paginate(self.session, f"{self.base_url}/api/ddi/v1/federation/federated_block",
+                               headers=self.headers,
+                               params=Query().where(eq("federated_realm", realm["id"])).params()))
+        return realm, blocks
+
+    def plan(self, realm: Optional[dict], blocks: List[dict]) -> List[tuple]:
+        """
+        Diff config.yaml against what exists. Returns actions
+        (op, kind, name, id_or_None, payload) with op create/update; blocks
+        are matched on address/cidr, blocks not in the config are left alone.
+        """
+        actions = []
+        desired_realm = self._realm_payload()
+        if realm is None:
+            actions.append(("create", "realm", desired_realm["name"], None, desired_realm))
+        else:
+            changes = self._changes(desired_realm, realm, REALM_FIELDS)
+            if changes:
+                actions.append(("update", "realm", desired_realm["name"], realm["id"], changes))
+
+        existing = {self._block_key(b): b for b in blocks}
+        realm_id = realm["id"] if realm else None
+        for block in self.blocks:
+            desired = self._block_payload(block, realm_id)
+            current = existing.get(self._block_key(block))
+            if current is None:
+                actions.append(("create", "block", block["name"], None, desired))
+            else:
+                changes = self._changes(desired, current, BLOCK_FIELDS)
+                if changes:
+                    actions.append(("update", "block", block["name"], current["id"], changes))
+        return actions
+
+    def _write(self, op: str, kind: str, obj_id: Optional[str], payload: dict) -> dict:
+        if op == "create":
+            url = f"{self.base_url}/api/ddi/v1/federation/federated_{kind}"
+            send = lambda: self.session.post(url, headers=self.headers, json=dict(payload, utilization=0))
+        else:
+            url = f"{self.base_url}/api/ddi/v1/{obj_id}"
+            send = lambda: self.session.patch(url, headers=self.headers, json=payload)
+        r = policy("csp.ipam.write").call(send)
+        r.raise_for_status()
+        return r.json()["result"]
+
+    def reconcile(self, concurrency: int = DEFAULT_CONCURRENCY, dry_run: bool = False) -> Optional[str]:
+        """
+        Bring the realm and blocks in line with config.yaml: create what is
+        missing, patch what differs, touch nothing else. Safe to re-run; an
+        up-to-date account costs two GETs. Returns the realm ID.
+        """
+        realm, blocks = self.fetch_existing()
+        actions = self.plan(realm, blocks)
+        unchanged = len(self.blocks) - sum(1 for a in actions if a[1] == "block")
+        print(f"📐 Plan: {len(actions)} change(s), {unchanged} block(s) already up to date")
+        for op, kind, name, obj_id, payload in actions:
+            print(f"   {'+' if op == 'create' else '~'} {kind} {name}"
+                  + (f" ({', '.join(payload)})" if op == "update" else ""))
+        if dry_run:
+            return realm["id"] if realm else None
+
+        # The realm goes first: new blocks need its ID
+        realm_actions = [a for a in actions if a[1] == "realm"]
+        for op, kind, name, obj_id, payload in realm_actions:
+            realm = self._write(op, kind, obj_id, payload)
+            print(f"🏗️  {'Created' if op == 'create' else 'Updated'} federated realm: {name} → ID: {realm['id']}")
+        realm_id = realm["id"]
+        self.output["realm"] = realm
+
+        block_actions = [(op, kind, name, obj_id, dict(payload, federated_realm=realm_id) if op == "create" else payload)
+                         for op, kind, name, obj_id, payload in actions if kind == "block"]
+
+        def apply(action):
+            op, kind, name, obj_id, payload = action
+            try:
+                result = self._write(op, kind, obj_id, payload)
+                print(f"🧱 {'Created' if op == 'create' else 'Updated'} federated block: {name}", flush=True)
+                return result, None
+            except Exception as e:
+                print(f"❌ Federated block {name}: {e}", flush=True)
+                return None, f"{name}: {e}"
+
+        written = {}
+        errors = []
+        if block_actions:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(block_actions)))) as pool:
+                for result, error in pool.map(apply, block_actions):
+                    if error:
+                        errors.append(error)
+                    else:
+                        written[self._block_key(result)] = result
+
+        current = {self._block_key(b): b for b in blocks}
+        current.update(written)
+        self.output["blocks"] = [current[k] for k in map(self._block_key, self.blocks) if k in current]
+        if errors:
+            raise RuntimeError(f"{len(errors)} federated block write(s) failed: {'; '.join(errors)}")
+        return realm_id
+
+    # ---------- bulk import ----------
+    def ensure_ip_space(self) -> str:
+        """ID of the IP space named in config.yaml (ip_space.name), created if missing."""
+        url = f"{self.base_url}/api/ddi/v1/ipam/ip_space"
+        r = self.session.get(url, headers=self.headers,
+                             params=Query().eq("name", self.ip_space["name"]).fields("id", "name").params())
+        r.raise_for_status()
+        for space in r.json().get("results", []):
+            if space.get("name") == self.ip_space["name"]:
+                return space["id"]
+        r = policy("csp.ipam.write").call(lambda: self.session.post(url, headers=self.headers, json={
+            "name": self.ip_space["name"], "comment": self.ip_space.get("comment", ""),
+            "tags": self.ip_space.get("tags", {})}))
+        r.raise_for_status()
+        space_id = r.json()["result"]["id"]
+        print(f"🗂️  Created IP space: {self.ip_space['name']} → ID: {space_id}")
+        return space_id
+
+    def import_rows(self, source: str, realm_id: Optional[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                    concurrency: int = DEFAULT_CONCURRENCY, restart: bool = False,
+                    report: Optional[str] = None) -> BulkImporter:
+        """Stream subnets/address blocks from source (see ipam_import.py) under realm_id."""
+        importer = BulkImporter(self.session, self.base_url, self.headers, realm_id, self.ensure_ip_space(),
+                                planner=self.validate(), batch_size=batch_size, concurrency=concurrency,
+                                checkpoint_file=f"{source}.checkpoint.json")
+        importer.run(source, restart=restart)
+        importer.print_report(report)
+        return importer
+
     def save_output(self, filename="federation_output.json"):
         with open(filename, "w") as f:
             json.dump(self.output, f, indent=2)
         print(f"📄 Output saved to {filename}")
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Create/update the federated realm and blocks from config.yaml.")
+    ap.add_argument("--plan", action="store_true",
+                    help="Only print the diff against CSP, change nothing.")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                    help="Federated block writes in parallel.")
+    ap.add_argument("--validate-only", action="store_true",
+                    help="Only run the local CIDR checks, no API calls.")
+    ap.add_argument("--import", dest="import_source", metavar="FILE",
+                    help="After the realm/blocks, stream-import subnets/address blocks from CSV/YAML.")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                    help="Import rows per batch/checkpoint.")
+    ap.add_argument("--restart", action="store_true",
+                    help="Ignore the import checkpoint and start from the first row.")
+    ap.add_argument("--report", help="Write the import report as JSON to this file.")
+    ap.add_argument("--no-reconcile", action="store_true",
+                    help="Old behaviour: always POST the realm and every block.")
+    args = ap.parse_args()
+
     client = InfobloxCSPClient("config.yaml")
+    try:
+        client.validate()
+    except PlanError as e:
+        for problem in e.problems:
+            print(f"❌ {problem}")
+        raise SystemExit(1)
+    print(f"✅ {len(client.blocks)} federated block(s) passed local CIDR checks")
+    if args.validate_only:
+        raise SystemExit(0)
     client.authenticate()
     client.switch_account()
-    realm_id = client.create_realm()
-    client.create_blocks(realm_id)
-    client.save_output()
+    if args.no_reconcile:
+        realm_id = client.create_realm()
+        client.create_blocks(realm_id)
+    else:
+        realm_id = client.reconcile(concurrency=args.concurrency, dry_run=args.plan)
+    if not args.plan:
+        client.save_output()
+        if args.import_source:
+            importer = client.import_rows(args.import_source, realm_id, batch_size=args.batch_size,
+                                          concurrency=args.concurrency, restart=args.restart,
+                                          report=args.report)
+            if importer.counts["failed"] or importer.counts["invalid"]:
+                raise SystemExit(1)
@@ -1,19 +1,20 @@
 import os
 import json
-import requests
+from csp_client import base_url, get_session
+from lab_state import LabState
+from paginator import paginate_parallel
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
 PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
 OUTPUT_FILE = "dns_view_ids.txt"
 
-API_URL = "https://csp.infoblox.com/api/ddi/v1/dns/zone_child"
+API_URL = f"{base_url()}/api/ddi/v1/dns/zone_child"
+# Paged by paginate_parallel() (was a single _limit=101 page that truncated
+# silently): page 1 returns total_size, the other pages are fetched at once
 PARAMS = {
     "_filter": 'flat=="false"',
     "_order_by": "name asc",
-    "_is_total_size_needed": "true",
-    "_limit": "101",
-    "_offset": "0"
 }
 
 # === Validation ===
@@ -26,27 +27,20 @@ headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
 print(f"📡 Querying DNS views for participant ID: {PARTICIPANT_ID}...")
 
-response = requests.get(API_URL, headers=headers, params=PARAMS)
-try:
-    data = response.json()
-except Exception:
-    data = {"raw": response.text}
+# === Stream all pages, keeping only matching views
+total = 0
+matching = []
+for z in paginate_parallel(session, API_URL, headers=headers, params=PARAMS):
+    total += 1
+    if PARTICIPANT_ID in z.get("name", "") and z.get("type") == "view":
+        matching.append((z["name"], z["id"]))
+print(f"🔍 Scanned {total} DNS zone/view entries.")
 
-zones = data.get("results", [])
-print(f"🔍 Found {len(zones)} total DNS views.")
-
-# === Filter and write matching views
-matching = [
-    (z["name"], z["id"]) for z in zones
-    if PARTICIPANT_ID in z.get("name", "") and z.get("type") == "view"
-]
-
-with open(OUTPUT_FILE, "w") as f:
-    for name, view_id in matching:
-        f.write(view_id + "\n")
+LabState().update(dns_view_ids=[view_id for name, view_id in matching])
 
 print(f"✅ Found {len(matching)} DNS views matching '{PARTICIPANT_ID}'")
 for name, view_id in matching:
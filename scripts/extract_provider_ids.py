@@ -1,6 +1,9 @@
 import os
 import json
-import requests
+from csp_client import base_url, get_session
+from csp_query import Query, all_of, ends_with, starts_with
+from lab_state import LabState
+from paginator import paginate
 
 TOKEN = os.environ.get("Infoblox_Token")
 PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
@@ -11,32 +14,31 @@ if not TOKEN:
 if not PARTICIPANT_ID:
     raise EnvironmentError("❌ 'INSTRUQT_PARTICIPANT_ID' environment variable is not set.")
 
-url = "https://csp.infoblox.com/api/cloud_discovery/v2/providers"
+url = f"{base_url()}/api/cloud_discovery/v2/providers"
 headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
 print(f"📡 Fetching cloud providers created for participant: {PARTICIPANT_ID}...")
 
-response = requests.get(url, headers=headers)
-try:
-    data = response.json()
-except Exception:
-    data = {"raw": response.text}
+# Server-side: only this participant's AWS/Azure demo providers, id + name
+query = Query().any(
+    all_of(starts_with("name", "AWS_Demo"), ends_with("name", PARTICIPANT_ID)),
+    all_of(starts_with("name", "Azure_Demo_Lab"), ends_with("name", PARTICIPANT_ID)),
+).fields("id", "name")
 
-print(f"📦 Status Code: {response.status_code}")
-providers = data.get("results", [])
+providers = paginate(session, url, headers=headers, params=query.params())
 
-# Filter providers by name suffix (e.g., AWS_Demo_XYZ, Azure_Demo_Lab_XYZ)
+# Filter providers by name suffix (e.g., AWS_Demo_XYZ, Azure_Demo_Lab_XYZ);
+# the server filter already did this, the check stays as a guard
 matching_providers = [
     p for p in providers
     if p.get("name", "").endswith(PARTICIPANT_ID)
     and (p.get("name", "").startswith("AWS_Demo") or p.get("name", "").startswith("Azure_Demo_Lab"))
 ]
 
-with open(OUTPUT_FILE, "w") as f:
-    for p in matching_providers:
-        f.write(p["id"] + "\n")
+LabState().update(provider_ids=[p["id"] for p in matching_providers])
 
 print(f"✅ {len(matching_providers)} provider ID(s) for participant '{PARTICIPANT_ID}' written to {OUTPUT_FILE}")
@@ -0,0 +1,210 @@
+"""
+Fleet-wide orphan garbage collector
+
+When a cleanup hook is skipped, a participant's discovery providers
+(AWS_Demo_<id>, Azure_Demo_Lab_<id>) and DNS views (AWS_Demo_Lab_<id>,
+Azure_Demo_Lab_<id>) stay behind in the sandbox account and slow every
+later list call there. This command logs in once (purge_discovery_jobs'
+InfobloxSession), lists every sandbox account through SandboxAccountAPI,
+switches into the accounts concurrently and deletes the providers and
+views whose participant ID is no longer active, using the AIMD bulk
+deleter (see bulk_delete.py).
+
+Sandbox account names say nothing about who is using them (pooled broker
+accounts are named lab-NNNN), so the active participants come only from
+--active-file: one participant ID per line, exported from the broker's
+current allocations. The file is required; a missing, unreadable or
+empty file stops the run before anything is listed.
+
+Nothing is deleted unless --delete is given; the default is a dry run.
+
+Usage:
+  python gc_orphans.py --active-file active_participants.txt
+  python gc_orphans.py --active-file active_participants.txt --delete --report gc_report.json
+
+Environment Variables:
+  INFOBLOX_EMAIL / INFOBLOX_PASSWORD - Admin login (as purge_discovery_jobs.py)
+  GC_ACCOUNT_CONCURRENCY             - Accounts processed at once (default: 8)
+  GC_DELETE_CONCURRENCY              - Max concurrent deletes per account (default: 4)
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+import csp_client
+from bulk_delete import BulkDeleter
+from csp_query import Query, starts_with
+from paginator import collection_url, paginate_parallel
+from purge_discovery_jobs import InfobloxSession
+from sandbox_api import SandboxAccountAPI
+
+DEFAULT_ACCOUNT_CONCURRENCY = int(os.environ.get("GC_ACCOUNT_CONCURRENCY", "8"))
+DEFAULT_DELETE_CONCURRENCY = int(os.environ.get("GC_DELETE_CONCURRENCY", "4"))
+
+# Longest prefix first, so "AWS_Demo_Lab_x" is not read as participant "Lab_x"
+PROVIDER_PREFIXES = ("Azure_Demo_Lab", "AWS_Demo_Lab", "AWS_Demo")
+VIEW_PREFIXES = ("Azure_Demo_Lab", "AWS_Demo_Lab")
+
+
+def participant_of(name: str, prefixes) -> Optional[str]:
+    """Participant ID encoded in a lab object name, or None for foreign objects."""
+    m = re.match(rf"^(?:{'|'.join(map(re.escape, prefixes))})_(.+)$", name or "")
+    return m.group(1) if m else None
+
+
+def prefix_query(prefixes) -> Query:
+    return Query().any(*(starts_with("name", f"{p}_") for p in prefixes)).fields("id", "name")
+
+
+def account_id_of(account: dict) -> str:
+    return str(account.get("id", "")).split("/")[-1]
+
+
+class ActiveSetError(Exception):
+    """The active participant set is unavailable or empty; nothing may be deleted."""
+
+
+def load_active(active_file: str) -> Set[str]:
+    """Active participant IDs from active_file (one per line, # comments allowed)."""
+    try:
+        with open(active_file) as f:
+            active = {line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")}
+    except OSError as e:
+        raise ActiveSetError(f"cannot read active participant file {active_file}: {e}")
+    if not active:
+        raise ActiveSetError(f"active participant file {active_file} is empty")
+    return active
+
+
+class AccountGC:
+    """Finds and deletes orphans inside one sandbox account."""
+
+    def __init__(self, home: InfobloxSession, account: dict, active: Set[str],
+                 dry_run: bool, delete_concurrency: int):
+        self.home = home
+        self.account = account
+        self.account_id = account_id_of(account)
+        self.label = f"{account.get('name')} ({self.account_id})"
+        self.active = active
+        self.dry_run = dry_run
+        self.delete_concurrency = delete_concurrency
+
+    def _orphans(self, items, prefixes) -> Dict[str, str]:
+        out = {}
+        for item in items:
+            pid = participant_of(item.get("name", ""), prefixes)
+            if pid and pid not in self.active:
+                out[item["id"]] = item["name"]
+        return out
+
+    def _delete(self, kind: str, orphans: Dict[str, str], delete_fn) -> dict:
+        if self.dry_run or not orphans:
+            for oid, name in orphans.items():
+                print(f"DRY-RUN: [{self.label}] would delete {kind} {name} ({oid})", flush=True)
+            return dict(kind=kind, total=len(orphans), deleted=0, failed=0)
+        deleter = BulkDeleter(kind, delete_fn, max_workers=self.delete_concurrency,
+                              initial=min(2, self.delete_concurrency),
+                              label=lambda oid: f"[{self.label}] {orphans.get(oid)} ({oid})")
+        results = deleter.run(orphans)
+        deleter.print_report(results)
+        summary = deleter.summary(results)
+        return dict(kind=kind, total=len(orphans),
+                    deleted=summary["deleted"] + summary["accepted"] + summary["already_gone"],
+                    failed=summary["failed"])
+
+    def run(self) -> dict:
+        start = time.monotonic()
+        report = dict(account=self.account.get("name"), account_id=self.account_id)
+        try:
+            # Per-account copy: same pooled HTTP session, its own scoped JWT
+            s = copy.copy(self.home)
+            s.jwt = csp_client.switch_account(s.base_url, self.home.jwt, self.account_id)
+            headers = s._auth_headers()
+
+            providers = self._orphans(s.iter_providers(prefix_query(PROVIDER_PREFIXES)), PROVIDER_PREFIXES)
+            views = self._orphans(
+                paginate_parallel(s.session, collection_url(s.base_url, "dns_view"), headers=headers,
+                                  params=prefix_query(VIEW_PREFIXES).params()),
+                VIEW_PREFIXES,
+            )
+            # Providers first: a view still referenced by a provider cannot go
+            report["providers"] = self._delete("provider", providers,
+                                               lambda pid: s.delete_provider_request(pid))
+            report["views"] = self._delete(
+                "dns view", views,
+                lambda vid: s.session.delete(f"{s.base_url}/api/ddi/v1/dns/view/{vid.split('/')[-1]}",
+                                             headers=headers),
+            )
+        except Exception as e:
+            print(f"❌ [{self.label}] {e}", flush=True)
+            report["error"] = str(e)
+        report["seconds"] = round(time.monotonic() - start, 2)
+        return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Delete orphaned lab providers/DNS views across all sandbox accounts.")
+    ap.add_argument("--delete", action="store_true",
+                    help="Actually delete orphans (default: only report what would be deleted).")
+    ap.add_argument("--active-file", required=True,
+                    help="Active participant IDs from the broker's current allocations, one per line.")
+    ap.add_argument("--account", action="append",
+                    help="Only process this sandbox account name (repeatable).")
+    ap.add_argument("--account-concurrency", type=int, default=DEFAULT_ACCOUNT_CONCURRENCY,
+                    help="Sandbox accounts processed in parallel.")
+    ap.add_argument("--delete-concurrency", type=int, default=DEFAULT_DELETE_CONCURRENCY,
+                    help="Max concurrent deletes inside one account.")
+    ap.add_argument("--report", help="Write the per-account report as JSON to this file.")
+    args = ap.parse_args()
+    dry_run = not args.delete
+
+    # Fail closed before touching CSP: without an authoritative active set
+    # every participant would look orphaned
+    try:
+        active = load_active(args.active_file)
+    except ActiveSetError as e:
+        print(f"⛔ {e}; refusing to run", flush=True)
+        raise SystemExit(2)
+
+    s = InfobloxSession()
+    s.login()
+    api = SandboxAccountAPI(base_url=f"{s.base_url}/v2", token=s.jwt, auth_scheme="Bearer")
+
+    accounts = list(api.iter_sandbox_accounts())
+    targets = [a for a in accounts if not args.account or a.get("name") in args.account]
+    print(f"📋 {len(accounts)} sandbox account(s), {len(active)} active participant(s); "
+          f"scanning {len(targets)} account(s){' (dry run)' if dry_run else ''}...", flush=True)
+    if not targets:
+        return
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(args.account_concurrency, len(targets)))) as pool:
+        reports = list(pool.map(
+            lambda a: AccountGC(s, a, active, dry_run, args.delete_concurrency).run(), targets))
+    elapsed = time.monotonic() - start
+
+    def total(kind, key):
+        return sum(r.get(kind, {}).get(key, 0) for r in reports)
+
+    errors = [r for r in reports if "error" in r]
+    print(f"\n🧾 GC: {len(reports)} account(s) in {elapsed:.1f}s "
+          f"({len(reports) / elapsed * 60 if elapsed else 0:.1f} accounts/min), {len(errors)} with errors", flush=True)
+    print(f"   providers: {total('providers', 'total')} orphaned, {total('providers', 'deleted')} deleted, "
+          f"{total('providers', 'failed')} failed", flush=True)
+    print(f"   dns views: {total('views', 'total')} orphaned, {total('views', 'deleted')} deleted, "
+          f"{total('views', 'failed')} failed", flush=True)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"seconds": round(elapsed, 2), "dry_run": dry_run, "accounts": reports}, f, indent=2)
+        print(f"📄 Report written to {args.report}", flush=True)
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
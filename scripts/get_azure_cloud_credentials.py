@@ -1,6 +1,8 @@
 import os
 import json
-import requests
+from csp_client import base_url, get_session
+from csp_query import Query
+from lab_state import LabState
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
@@ -16,15 +18,19 @@ TARGET_NAME = f"Azure-Demo-Lab-{PARTICIPANT_ID}"
 print(f"🔎 Looking for credential named: '{TARGET_NAME}'")
 
 # === Request ===
-url = "https://csp.infoblox.com/api/iam/v1/cloud_credential"
+url = f"{base_url()}/api/iam/v1/cloud_credential"
 headers = {
     "Authorization": f"Token {TOKEN}",  # Fixed to use 'Bearer'
     "Content-Type": "application/json"
 }
+session = get_session()
 
-print("📡 Listing all cloud credentials...")
+# Let CSP do the name match and return only the columns we read
+query = Query().eq("name", TARGET_NAME).fields("id", "name")
 
-response = requests.get(url, headers=headers)
+print("📡 Listing matching cloud credentials...")
+
+response = session.get(url, headers=headers, params=query.params())
 try:
     data = response.json()
 except Exception:
@@ -35,15 +41,14 @@ print("📥 Cloud Credential List:")
 print(json.dumps(data, indent=2))
 
 credentials = data.get("results", [])
-print(f"🔍 Found {len(credentials)} credential(s) total.")
+print(f"🔍 Found {len(credentials)} matching credential(s).")
 
-# === Filter by dynamic name ===
+# === Filter by dynamic name (server already did; kept as a guard) ===
 filtered = [c for c in credentials if c.get("name") == TARGET_NAME]
 
 if filtered:
     cred_id = filtered[0]["id"]
-    with open(OUTPUT_FILE, "w") as f:
-        f.write(cred_id)
+    LabState().update(azure_cloud_credential_id=cred_id)
     print(f"✅ Credential ID for '{TARGET_NAME}' saved to {OUTPUT_FILE}: {cred_id}")
 else:
     print(f"⚠️ No credential found with name: '{TARGET_NAME}'")
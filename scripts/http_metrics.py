@@ -0,0 +1,280 @@
+"""
+Per-request HTTP metrics
+
+Every HTTP request the lab scripts make goes through observe(): the pooled
+CSP session (csp_client.CSPSession, so SandboxAccountAPI, the
+InfobloxSession classes and the broker calls) reports each request it
+sends, and instrument_boto3() does the same for a boto3 client, one
+observation per HTTP attempt.
+
+Each observation carries the method, the endpoint template (path with IDs
+replaced by {id}, no query string), status ("error" when no response came
+back), latency, request/response bytes and the retry attempt (set by
+retry_policy, or botocore's own attempt counter). They are aggregated in
+the process into a latency histogram per (service, method, endpoint,
+status) plus byte and attempt counters.
+
+At exit the aggregate is merged into a JSON file shared by all scripts in
+the sandbox (like admission_stats.json) and the merged totals are
+rewritten as a Prometheus textfile (node_exporter textfile collector
+format), so one file covers the whole lab lifecycle.
+
+Other modules can subscribe to the raw observations with add_listener().
+Inside output_to(json_path, prom_path) the export goes to other files
+instead, e.g. one pair per benchmark iteration.
+
+Usage:
+  ec2 = http_metrics.instrument_boto3(boto3.client("ec2", region_name=region))
+
+  with http_metrics.attempt(2):   # what retry_policy does around each try
+      session.get(url)
+
+Environment Variables:
+  HTTP_METRICS_FILE - Merged JSON histograms (default: http_metrics.json)
+  HTTP_METRICS_PROM - Prometheus textfile (default: http_metrics.prom)
+  HTTP_METRICS      - Set to 0 to disable the histograms and their export
+                      (listeners are still called)
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from atomic_file import atomic_write, locked
+
+METRICS_FILE = os.environ.get("HTTP_METRICS_FILE", "http_metrics.json")
+PROM_FILE = os.environ.get("HTTP_METRICS_PROM", "http_metrics.prom")
+ENABLED = os.environ.get("HTTP_METRICS", "1") != "0"
+
+# Latency histogram upper bounds in seconds (+Inf is implied)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path segments that are object IDs: UUIDs, numbers, long hex/opaque tokens
+_ID_SEGMENT = re.compile(
+    r"^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+|[0-9a-f]{16,}|[A-Za-z0-9_-]{32,})$",
+    re.IGNORECASE,
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_series: Dict[tuple, dict] = {}
+_listeners: List[Callable[[dict], None]] = []
+_exporter_registered = False
+# (json, prom) absolute paths for the next export; resolved on first use
+_output: Optional[tuple] = None
+
+
+def endpoint_template(url: str) -> str:
+    """/api/ddi/v1/dns/view/<uuid>?x=1 -> /api/ddi/v1/dns/view/{id}"""
+    path = urlsplit(url).path or "/"
+    return "/".join("{id}" if _ID_SEGMENT.match(seg) else seg for seg in path.split("/"))
+
+
+def current_attempt() -> int:
+    return getattr(_local, "attempt", 1)
+
+
+@contextmanager
+def attempt(n: int):
+    """Mark requests sent inside the block as retry attempt n (1 = first try)."""
+    previous = current_attempt()
+    _local.attempt = n
+    try:
+        yield
+    finally:
+        _local.attempt = previous
+
+
+def add_listener(fn: Callable[[dict], None]):
+    """Call fn(observation) for every request observed in this process."""
+    _listeners.append(fn)
+
+
+def _new_series() -> dict:
+    return {"buckets": [0] * (len(BUCKETS) + 1), "count": 0, "sum": 0.0,
+            "bytes_in": 0, "bytes_out": 0, "attempts": {}}
+
+
+def observe(service: str, method: str, endpoint: str, status, seconds: float,
+            bytes_in: int = 0, bytes_out: int = 0, attempt: Optional[int] = None,
+            started: Optional[float] = None):
+    """Record one HTTP request (see module docstring)."""
+    attempt = attempt or current_attempt()
+    key = (service, method.upper(), endpoint, str(status))
+    if ENABLED:
+        with _lock:
+            s = _series.get(key)
+            if s is None:
+                s = _series[key] = _new_series()
+            index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+            s["buckets"][index] += 1
+            s["count"] += 1
+            s["sum"] += seconds
+            s["bytes_in"] += bytes_in
+            s["bytes_out"] += bytes_out
+            s["attempts"][str(attempt)] = s["attempts"].get(str(attempt), 0) + 1
+        _register_exporter()
+    if _listeners:
+        observation = {"service": service, "method": key[1], "endpoint": endpoint, "status": key[3],
+                       "seconds": seconds, "bytes_in": bytes_in, "bytes_out": bytes_out, "attempt": attempt,
+                       "started": started if started is not None else time.time() - seconds}
+        for fn in list(_listeners):
+            fn(observation)
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode())
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0  # streamed/file bodies are not measured
+
+
+def observe_requests(method: str, url: str, response, seconds: float, started: float,
+                     streamed: bool = False):
+    """Record a requests call; response is None when it raised."""
+    if response is None:
+        observe(urlsplit(url).netloc, method, endpoint_template(url), "error", seconds, started=started)
+        return
+    if streamed:
+        bytes_in = int(response.headers.get("Content-Length") or 0)
+    else:
+        bytes_in = len(response.content or b"")
+    observe(urlsplit(url).netloc, method, endpoint_template(url), response.status_code, seconds,
+            bytes_in=bytes_in, bytes_out=_body_size(response.request.body), started=started)
+
+
+def instrument_boto3(client):
+    """Observe every HTTP attempt a boto3 client makes; returns the client."""
+    service = f"aws:{client.meta.service_model.service_name}"
+
+    def before_send(request, **kwargs):
+        _local.aws_started = (time.monotonic(), time.time(), _body_size(request.body))
+
+    def needs_retry(response, operation, attempts, caught_exception=None, **kwargs):
+        began, wall, bytes_out = getattr(_local, "aws_started", (time.monotonic(), time.time(), 0))
+        http_response = response[0] if response else None
+        status = http_response.status_code if http_response is not None else "error"
+        bytes_in = len(http_response.content or b"") if http_response is not None else 0
+        observe(service, operation.http.get("method", "POST"), operation.name, status,
+                time.monotonic() - began, bytes_in=bytes_in, bytes_out=bytes_out,
+                attempt=attempts, started=wall)
+        return None  # never influence botocore's retry decision
+
+    client.meta.events.register("before-send", before_send, unique_id="http_metrics.before_send")
+    client.meta.events.register("needs-retry", needs_retry, unique_id="http_metrics.needs_retry")
+    return client
+
+
+# ---------- export ----------
+def _merge(existing: dict, series: Dict[tuple, dict]) -> dict:
+    merged = {tuple(json.loads(k)): v for k, v in existing.get("series", {}).items()}
+    for key, s in series.items():
+        m = merged.setdefault(key, _new_series())
+        m["buckets"] = [a + b for a, b in zip(m["buckets"], s["buckets"])]
+        for field in ("count", "sum", "bytes_in", "bytes_out"):
+            m[field] += s[field]
+        for n, count in s["attempts"].items():
+            m["attempts"][n] = m["attempts"].get(n, 0) + count
+    return {"buckets": list(BUCKETS), "series": {json.dumps(list(k)): v for k, v in sorted(merged.items())}}
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(data: dict) -> str:
+    """Render merged JSON as Prometheus text exposition format."""
+    out = [
+        "# HELP lab_http_request_duration_seconds HTTP request latency by endpoint template.",
+        "# TYPE lab_http_request_duration_seconds histogram",
+    ]
+    counters = {"bytes_in": [], "bytes_out": [], "attempts": []}
+    for raw_key, s in data.get("series", {}).items():
+        service, method, endpoint, status = json.loads(raw_key)
+        labels = (f'service="{_label(service)}",method="{_label(method)}",'
+                  f'endpoint="{_label(endpoint)}",status="{_label(status)}"')
+        cumulative = 0
+        for bound, count in zip(list(data["buckets"]) + ["+Inf"], s["buckets"]):
+            cumulative += count
+            out.append(f'lab_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f"lab_http_request_duration_seconds_sum{{{labels}}} {s['sum']:.6f}")
+        out.append(f"lab_http_request_duration_seconds_count{{{labels}}} {s['count']}")
+        counters["bytes_in"].append(f"lab_http_response_bytes_total{{{labels}}} {s['bytes_in']}")
+        counters["bytes_out"].append(f"lab_http_request_bytes_total{{{labels}}} {s['bytes_out']}")
+        for n, count in sorted(s["attempts"].items(), key=lambda kv: int(kv[0])):
+            counters["attempts"].append(f'lab_http_requests_by_attempt_total{{{labels},attempt="{n}"}} {count}')
+    out += ["# HELP lab_http_response_bytes_total Response body bytes received.",
+            "# TYPE lab_http_response_bytes_total counter"] + counters["bytes_in"]
+    out += ["# HELP lab_http_request_bytes_total Request body bytes sent.",
+            "# TYPE lab_http_request_bytes_total counter"] + counters["bytes_out"]
+    out += ["# HELP lab_http_requests_by_attempt_total Requests by retry attempt (1 = first try).",
+            "# TYPE lab_http_requests_by_attempt_total counter"] + counters["attempts"]
+    return "\n".join(out) + "\n"
+
+
+def export(json_path: str = METRICS_FILE, prom_path: str = PROM_FILE):
+    """Merge this process's histograms into json_path and rewrite prom_path."""
+    with _lock:
+        series = {k: dict(v, buckets=list(v["buckets"]), attempts=dict(v["attempts"])) for k, v in _series.items()}
+        _series.clear()
+    if not series:
+        return
+    try:
+        with locked(json_path):
+            try:
+                with open(json_path, "r") as f:
+                    existing = json.load(f)
+            except (FileNotFoundError, ValueError):
+                existing = {}
+            merged = _merge(existing, series)
+            atomic_write(json_path, json.dumps(merged, indent=2))
+            atomic_write(prom_path, prometheus_text(merged))
+    except OSError as e:
+        print(f"⚠️ Could not write HTTP metrics to {json_path}: {e}", flush=True)
+
+
+def _output_paths() -> tuple:
+    global _output
+    if _output is None:
+        with _lock:
+            if _output is None:
+                # Resolve the paths now: scripts may chdir before exiting
+                _output = (os.path.abspath(METRICS_FILE), os.path.abspath(PROM_FILE))
+    return _output
+
+
+@contextmanager
+def output_to(json_path: str, prom_path: str):
+    """Export requests observed inside the block to json_path/prom_path instead."""
+    global _output
+    previous = _output_paths()
+    export(*previous)
+    _output = (os.path.abspath(json_path), os.path.abspath(prom_path))
+    try:
+        yield
+    finally:
+        export(*_output)
+        _output = previous
+
+
+def _export_at_exit():
+    export(*_output_paths())
+
+
+def _register_exporter():
+    global _exporter_registered
+    if _exporter_registered:
+        return
+    _output_paths()
+    with _lock:
+        if not _exporter_registered:
+            atexit.register(_export_at_exit)
+            _exporter_registered = True
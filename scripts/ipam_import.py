@@ -0,0 +1,225 @@
+"""
+Streaming bulk import of IPAM subnets and address blocks
+
+Loads thousands of child subnets / address blocks (e.g. the per-student
+plan written by cidr_planner.py) under the federated realm created by
+deploy_ipam.py. The source is read lazily and handled in batches: each
+row is checked locally against the CIDR plan (cidr_planner.py), then the
+batch is written with bounded concurrency through one csp.ipam.write
+retry policy per import, with its own retry budget so a large batch
+neither drains nor is starved by the process-wide one. After every
+batch the row offset is checkpointed, so an interrupted import resumes
+where it stopped; a 409 (already exists) counts as done, which makes the
+overlap on resume harmless. Rows whose write failed are listed in the
+checkpoint too and are written again on resume, even though they sit
+before the saved offset.
+
+Source formats (columns/keys: name, address, cidr, parent, type, comment, owner):
+  - CSV with a header row, streamed row by row
+  - YAML, streamed document by document; a document may be one row,
+    a list of rows, or {"subnets": [rows]}
+type is "subnet" (default) or "address_block". An address_block may nest
+inside a federated block and hold subnets of its own; list it before the
+rows that sit inside it.
+
+Usage:
+  python deploy_ipam.py --import subnets.csv --batch-size 200 --concurrency 16
+
+  importer = BulkImporter(session, base_url, headers, realm_id, space_id, planner)
+  importer.run("subnets.csv")
+  importer.print_report()
+
+Environment Variables:
+  IPAM_IMPORT_BATCH_SIZE - Rows per batch / checkpoint (default: 100)
+  IPAM_WRITE_CONCURRENCY - Concurrent writes (default: 8)
+  IPAM_IMPORT_RETRY_BUDGET - Max retries across one import (default: 200)
+"""
+
+import os
+import csv
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional
+from atomic_file import atomic_write
+from cidr_planner import CIDRPlanner, PlanError, network
+from retry_policy import RetryBudget, policy
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("IPAM_IMPORT_BATCH_SIZE", "100"))
+DEFAULT_CONCURRENCY = int(os.environ.get("IPAM_WRITE_CONCURRENCY", "8"))
+DEFAULT_RETRY_BUDGET = int(os.environ.get("IPAM_IMPORT_RETRY_BUDGET", "200"))
+
+ENDPOINTS = {
+    "subnet": "/api/ddi/v1/ipam/subnet",
+    "address_block": "/api/ddi/v1/ipam/address_block",
+}
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    """Yield rows from a CSV or YAML source without loading it whole."""
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        with open(path) as f:
+            for doc in yaml.safe_load_all(f):
+                if isinstance(doc, dict) and "subnets" in doc:
+                    yield from doc["subnets"]
+                elif isinstance(doc, list):
+                    yield from doc
+                elif doc:
+                    yield doc
+        return
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+class BulkImporter:
+    def __init__(self, session, base_url: str, headers: dict, realm_id: Optional[str], space_id: str,
+                 planner: Optional[CIDRPlanner] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 concurrency: int = DEFAULT_CONCURRENCY, checkpoint_file: Optional[str] = None,
+                 retry_budget: int = DEFAULT_RETRY_BUDGET):
+        self.session = session
+        self.base_url = base_url
+        self.headers = headers
+        self.realm_id = realm_id
+        self.space_id = space_id
+        self.planner = planner
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint_file = checkpoint_file
+        self.retry = policy("csp.ipam.write", budget=RetryBudget(retry_budget))
+        self.counts = Counter()
+        self.errors: List[dict] = []
+        self.failed_rows = set()
+        self.elapsed = 0.0
+        self.rate = 0.0
+
+    # ---------- checkpoint ----------
+    def _load_checkpoint(self, source: str) -> int:
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return 0
+        with open(self.checkpoint_file) as f:
+            cp = json.load(f)
+        if cp.get("source") != os.path.abspath(source):
+            return 0
+        self.counts.update(cp.get("counts", {}))
+        # Failed writes are retried on this run, so they stop counting as failed until they fail again
+        self.failed_rows = set(cp.get("failed_rows", []))
+        self.errors = [e for e in cp.get("errors", []) if e["row"] not in self.failed_rows]
+        self.counts["failed"] -= len(self.failed_rows)
+        return cp.get("next_row", 0)
+
+    def _save_checkpoint(self, source: str, next_row: int):
+        if self.checkpoint_file:
+            atomic_write(self.checkpoint_file, json.dumps({
+                "source": os.path.abspath(source), "next_row": next_row,
+                "counts": dict(self.counts), "errors": self.errors,
+                "failed_rows": sorted(self.failed_rows),
+            }, indent=2))
+
+    # ---------- rows ----------
+    def _payload(self, row: dict) -> dict:
+        payload = {
+            "address": row["address"],
+            "cidr": int(row["cidr"]),
+            "space": self.space_id,
+            "name": row.get("name") or "",
+            "comment": row.get("comment") or "",
+            "tags": {"owner": row["owner"]} if row.get("owner") else {},
+        }
+        if self.realm_id:
+            payload["federated_realms"] = [self.realm_id]
+        return payload
+
+    def _check(self, row: dict):
+        """Local validation; raises PlanError/ValueError/KeyError with the reason."""
+        kind = row.get("type") or "subnet"
+        if kind not in ENDPOINTS:
+            raise ValueError(f"unknown type {kind!r}")
+        net = network(row["address"], row["cidr"])
+        if self.planner:
+            self.planner.add_child(row.get("name") or str(net), net, row.get("parent") or None,
+                                   nested=kind == "address_block")
+        return kind
+
+    def _write(self, item) -> tuple:
+        number, row, kind = item
+        url = f"{self.base_url}{ENDPOINTS[kind]}"
+        try:
+            r = self.retry.call(
+                lambda: self.session.post(url, headers=self.headers, json=self._payload(row)))
+        except Exception as e:
+            return number, row, "failed", str(e)
+        if r.status_code < 300:
+            return number, row, "created", None
+        if r.status_code == 409:
+            return number, row, "exists", None
+        return number, row, "failed", f"HTTP {r.status_code}: {r.text[:200]}"
+
+    def _record(self, number: int, row: dict, outcome: str, error: Optional[str]):
+        self.counts[outcome] += 1
+        if outcome == "failed":
+            self.failed_rows.add(number)
+        else:
+            self.failed_rows.discard(number)
+        if error:
+            self.errors.append({"row": number, "name": row.get("name"),
+                                "cidr": f"{row.get('address')}/{row.get('cidr')}", "error": error})
+
+    def run(self, source: str, restart: bool = False):
+        """Import every row of source; resumes from the checkpoint unless restart."""
+        start_row = 0 if restart else self._load_checkpoint(source)
+        retry_rows = set(self.failed_rows)
+        if start_row:
+            print(f"⏩ Resuming {source} at row {start_row + 1} (checkpoint {self.checkpoint_file})"
+                  + (f", retrying {len(retry_rows)} failed row(s)" if retry_rows else ""), flush=True)
+        start = time.monotonic()
+        processed = 0
+        rows = enumerate(read_rows(source), start=1)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                to_write = []
+                for number, row in batch:
+                    try:
+                        kind = self._check(row)
+                    except (PlanError, ValueError, KeyError) as e:
+                        if number > start_row:
+                            self._record(number, row, "invalid", f"local: {e}")
+                        continue
+                    # Rows before the checkpoint still go into the planner, just not to CSP
+                    if number > start_row or number in retry_rows:
+                        to_write.append((number, row, kind))
+                for result in pool.map(self._write, to_write):
+                    self._record(*result)
+                processed += len(to_write)
+                last = batch[-1][0]
+                if to_write or last > start_row:
+                    self._save_checkpoint(source, max(last, start_row))
+                    print(f"📦 Row {last}: {self.counts['created']} created, {self.counts['exists']} existing, "
+                          f"{self.counts['failed'] + self.counts['invalid']} error(s)", flush=True)
+
+        self.elapsed = time.monotonic() - start
+        self.rate = processed / self.elapsed if self.elapsed else 0.0
+        return self.counts
+
+    def print_report(self, json_path: Optional[str] = None):
+        c = self.counts
+        print(f"\n🧾 Import: {c['created']} created, {c['exists']} already existed, {c['failed']} failed, "
+              f"{c['invalid']} invalid in {self.elapsed:.1f}s ({self.rate:.1f} rows/s)", flush=True)
+        if self.errors:
+            by_reason = Counter(e["error"].split(":")[0] for e in self.errors)
+            print("   Errors by reason: " + ", ".join(f"{r} x{n}" for r, n in by_reason.most_common()), flush=True)
+            for e in self.errors[:20]:
+                print(f"   ❌ row {e['row']} {e['name']} ({e['cidr']}): {e['error']}", flush=True)
+            if len(self.errors) > 20:
+                print(f"   ... {len(self.errors) - 20} more", flush=True)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump({"counts": dict(c), "seconds": round(self.elapsed, 2),
+                           "rows_per_second": round(self.rate, 1), "errors": self.errors}, f, indent=2)
+            print(f"📄 Report written to {json_path}", flush=True)
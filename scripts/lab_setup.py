@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Instruqt Lab Setup Orchestrator
+
+Runs the whole setup chain in one interpreter with one warm CSP session
+instead of one Python process per script:
+
+  allocate ─┐
+            ├─> switch ─┬─> user           (user_provision.py)
+  login ────┘           ├─> api_key        (deploy_api_key.py)
+                        ├─> gcp_discovery  (deploy_gcp_discovery_final.py)
+                        └─> ipam           (deploy_ipam.py)
+
+Steps run as soon as their dependencies are done, so the broker allocation
+and the CSP sign-in overlap, and everything after the account switch runs
+in parallel. The same output files as the individual scripts are written.
+
+Completed steps are recorded in the step journal (see step_journal.py), so
+when Instruqt retries a failed setup, the rerun skips straight to the first
+step that did not finish; login/switch are covered by the token cache.
+
+Usage in Instruqt (setup-sandbox script):
+  python3 lab_setup.py
+  python3 lab_setup.py --skip gcp_discovery --skip ipam
+  python3 lab_setup.py --skip api_key --skip gcp_discovery --skip ipam   # allocate + user
+  python3 lab_setup.py --fresh      # forget completed steps, rerun all
+
+Environment Variables:
+  Union of the individual scripts: BROKER_API_TOKEN, INSTRUQT_PARTICIPANT_ID,
+  INFOBLOX_EMAIL, INFOBLOX_PASSWORD, CSP_URL, USER_DOMAIN,
+  INSTRUQT_GCP_PROJECT_INFOBLOX_DEMO_PROJECT_ID (gcp_discovery),
+  config.yaml (ipam).
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List
+
+import csp_client
+import tracing
+import user_provision
+import allocation_broker_subtenant as allocation
+from csp_client import bearer_headers
+from step_journal import StepJournal
+from token_cache import default_cache
+
+OPTIONAL_STEPS = ["user", "api_key", "gcp_discovery", "ipam"]
+
+
+class Step:
+    """A named unit of work; fn receives the results of all finished steps."""
+
+    def __init__(self, name: str, fn: Callable[[dict], object], deps: Iterable[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+
+
+def run_dag(steps: List[Step], max_workers: int = 8) -> Dict[str, object]:
+    """
+    Run steps on a thread pool, each as soon as all of its deps have finished.
+    Returns {step name: result}. The first step to raise an Exception stops
+    scheduling and its exception is re-raised once running steps have
+    drained. SystemExit/KeyboardInterrupt are not step failures and
+    propagate as they are; steps report failure by raising, never by exiting.
+    """
+    pending = {s.name: s for s in steps}
+    results: Dict[str, object] = {}
+    timings: Dict[str, float] = {}
+    running = {}
+    failure = None
+
+    def timed(step):
+        start = time.monotonic()
+        try:
+            with tracing.span(step.name):
+                return step.fn(results)
+        finally:
+            timings[step.name] = time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while (pending and failure is None) or running:
+            if failure is None:
+                for name, step in list(pending.items()):
+                    if all(d in results for d in step.deps):
+                        print(f"▶️  [{name}] starting", flush=True)
+                        running[pool.submit(timed, step)] = name
+                        del pending[name]
+                if not running:
+                    raise RuntimeError(f"Unsatisfiable dependencies for: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                    print(f"✅ [{name}] done in {timings[name]:.1f}s", flush=True)
+                except Exception as e:
+                    print(f"❌ [{name}] failed after {timings[name]:.1f}s: {e}", flush=True)
+                    failure = failure or e
+
+    print("\n⏱️ Step timings:", flush=True)
+    for name, secs in sorted(timings.items(), key=lambda kv: -kv[1]):
+        print(f"   {name:<15} {secs:6.1f}s", flush=True)
+
+    if failure is not None:
+        raise failure
+    return results
+
+
+def build_steps(skip: Iterable[str], journal: StepJournal) -> List[Step]:
+    csp_url = csp_client.base_url()
+    email = os.environ.get("INFOBLOX_EMAIL")
+    password = os.environ.get("INFOBLOX_PASSWORD")
+    participant_id = os.environ.get("INSTRUQT_PARTICIPANT_ID")
+    user_domain = os.environ.get("USER_DOMAIN", "infoblox.lab")
+
+    if not email or not password:
+        raise RuntimeError("Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD")
+    allocation.validate_config()
+
+    def allocate(results):
+        def run():
+            alloc = allocation.allocate_sandbox()
+            allocation.save_allocation(alloc)
+            return alloc
+        return journal.run("allocate", allocation.journal_inputs(), run)
+
+    def login(results):
+        # A cached login skips the network, so still warm the TLS connection
+        # the switch will use while /allocate is in flight
+        if default_cache.get(csp_url, email, password=password):
+            csp_client.warm_up(csp_url)
+        return csp_client.sign_in(csp_url, email, password)
+
+    def switch(results):
+        return csp_client.switch_account(
+            csp_url, results["login"], results["allocate"]["external_id"],
+            email=email, probe_path="/v2/groups"
+        )
+
+    def user(results):
+        alloc = results["allocate"]
+        user_email = f"{participant_id}@{user_domain}"
+
+        def run():
+            user_password = user_provision.generate_password()
+            headers = bearer_headers(results["switch"])
+            user_id = user_provision.provision_user(csp_url, headers, participant_id, user_email, user_password)
+            user_provision.save_credentials(user_email, user_password, user_id, alloc.get("sfdc_account_id", ""))
+            return {"email": user_email, "password": user_password, "id": user_id}
+        return journal.run("user", user_provision.journal_inputs(alloc["external_id"], user_email), run)
+
+    def api_key(results):
+        from deploy_api_key import InfobloxSession
+        session = InfobloxSession()
+        session.base_url = csp_url
+        session.jwt = results["switch"]
+        journal.run("api_key", {"account": results["allocate"]["external_id"]},
+                    session.create_api_key_and_export_env)
+
+    def gcp_discovery(results):
+        from deploy_gcp_discovery_final import GCPInfobloxSession
+        project_id = os.getenv("INSTRUQT_GCP_PROJECT_INFOBLOX_DEMO_PROJECT_ID")
+        session = GCPInfobloxSession()
+        session.base_url = csp_url
+        session.jwt = results["switch"]
+        return journal.run("gcp_discovery", session.journal_inputs(project_id),
+                           lambda: session.deploy(project_id, journal))
+
+    def ipam(results):
+        from deploy_ipam import InfobloxCSPClient
+        client = InfobloxCSPClient("config.yaml")
+        client.base_url = csp_url
+        client.jwt = results["switch"]
+        client.headers = bearer_headers(client.jwt)
+
+        def run():
+            # The federation API may lag behind the groups API after a switch
+            csp_client.wait_until_ready(csp_url, client.jwt, "/api/ddi/v1/federation/federated_realm?_limit=1")
+            realm_id = client.reconcile()
+            client.save_output()
+            return {"realm_id": realm_id}
+        inputs = {"account": results["allocate"]["external_id"], "realm": client.realm, "blocks": client.blocks}
+        return journal.run("ipam", inputs, run)
+
+    steps = [
+        Step("allocate", allocate),
+        Step("login", login),
+        Step("switch", switch, deps=["allocate", "login"]),
+        Step("user", user, deps=["switch"]),
+        Step("api_key", api_key, deps=["switch"]),
+        Step("gcp_discovery", gcp_discovery, deps=["switch"]),
+        Step("ipam", ipam, deps=["switch"]),
+    ]
+    return [s for s in steps if s.name not in skip]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the lab setup chain as one parallel DAG.")
+    ap.add_argument("--skip", action="append", default=[], choices=OPTIONAL_STEPS,
+                    help="Skip an optional step (repeatable).")
+    ap.add_argument("--max-workers", type=int, default=8,
+                    help="Max steps running at the same time.")
+    ap.add_argument("--fresh", action="store_true",
+                    help="Forget previously completed steps and run everything again.")
+    args = ap.parse_args()
+
+    journal = StepJournal()
+    if args.fresh:
+        journal.reset()
+
+    start = time.monotonic()
+    try:
+        results = run_dag(build_steps(args.skip, journal), max_workers=args.max_workers)
+    except Exception as e:
+        print(f"\n❌ Lab setup failed after {time.monotonic() - start:.1f}s: {e}", flush=True)
+        sys.exit(1)
+
+    alloc = results["allocate"]
+    print(f"\n{'='*60}", flush=True)
+    print("🎉 Lab Setup Complete!", flush=True)
+    print(f"   Sandbox:    {alloc.get('name')}", flush=True)
+    print(f"   Account ID: {alloc['external_id']}", flush=True)
+    if "user" in results:
+        print(f"   Email:      {results['user']['email']}", flush=True)
+        print(f"   Password:   {results['user']['password']}", flush=True)
+    print(f"   Wall clock: {time.monotonic() - start:.1f}s", flush=True)
+    print(f"{'='*60}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Lab state store
+
+One JSON document (lab_state.json) holding everything the lifecycle scripts
+hand to each other: sandbox/account IDs, user credentials, discovered
+credential/view IDs, etc. Updates are read-modify-write under an flock and
+land via temp file + os.replace, so two hooks running at once cannot lose
+each other's keys or read a torn file.
+
+For compatibility every key that used to live in its own one-line file is
+still emitted there (sandbox_id.txt, user_id.txt, ...), and reads fall back
+to those files when the key is not in the document yet, so old and new
+scripts can be mixed in one track.
+
+Usage:
+  from lab_state import LabState
+  state = LabState()
+  sandbox_id = state.require("sandbox_id")
+  state.update(user_id=user_id, user_email=user_email)
+
+Environment Variables:
+  LAB_STATE_FILE - State document path (default: lab_state.json)
+"""
+
+import os
+import json
+from typing import List, Optional
+from atomic_file import atomic_write, locked
+
+STATE_FILE = os.environ.get("LAB_STATE_FILE", "lab_state.json")
+
+# key -> legacy handoff file that is still written for older scripts/hooks
+LEGACY_FILES = {
+    "sandbox_id": "sandbox_id.txt",
+    "subtenant_id": "subtenant_id.txt",
+    "external_id": "external_id.txt",
+    "sandbox_name": "sandbox_name.txt",
+    "sfdc_account_id": "sfdc_account_id.txt",
+    "user_id": "user_id.txt",
+    "user_email": "user_email.txt",
+    "user_password": "user_password.txt",
+    "gcp_cloud_credential_id": "gcp_cloud_credential_id.txt",
+    "gcp_dns_view_id": "gcp_dns_view_id.txt",
+    "azure_cloud_credential_id": "azure_cloud_credential_id",
+    "infoblox_role_arn": "infoblox_role_arn.txt",
+    "provider_ids": "provider_ids.txt",
+    "dns_view_ids": "dns_view_ids.txt",
+    "trace_id": "trace_id.txt",
+}
+
+# Keys stored as lists (one item per line in the legacy file)
+LIST_KEYS = {"provider_ids", "dns_view_ids"}
+
+# sandbox_env.sh / user_credentials.sh variable -> state key
+SANDBOX_ENV_VARS = {
+    "STUDENT_TENANT": "sandbox_name",
+    "CSP_ACCOUNT_ID": "external_id",
+    "BROKER_SANDBOX_ID": "subtenant_id",
+    "SFDC_ACCOUNT_ID": "sfdc_account_id",
+    "LAB_TRACE_ID": "trace_id",
+}
+USER_CREDENTIAL_VARS = {
+    "CSP_USER_EMAIL": "user_email",
+    "CSP_USER_PASSWORD": "user_password",
+    "CSP_USER_ID": "user_id",
+    "SFDC_ACCOUNT_ID": "sfdc_account_id",
+}
+
+
+class MissingStateError(KeyError):
+    """A required key is neither in lab_state.json nor in its legacy file."""
+
+    def __init__(self, key: str):
+        legacy = LEGACY_FILES.get(key)
+        where = f" (or {legacy})" if legacy else ""
+        super().__init__(f"{key} not found in {STATE_FILE}{where}")
+        self.key = key
+
+    def __str__(self):
+        return self.args[0]
+
+
+class LabState:
+    def __init__(self, path: str = STATE_FILE, emit_legacy: bool = True):
+        self.path = path
+        self.emit_legacy = emit_legacy
+        self._data = None
+
+    # ---------- storage ----------
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load(self) -> dict:
+        if self._data is None:
+            with locked(self.path, exclusive=False):
+                self._data = self._read()
+        return self._data
+
+    def refresh(self):
+        """Drop the in-memory copy so the next read sees other writers' changes."""
+        self._data = None
+
+    @staticmethod
+    def _read_legacy(key: str):
+        filename = LEGACY_FILES.get(key)
+        if not filename:
+            return None
+        try:
+            with open(filename, "r") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        if key in LIST_KEYS:
+            return [line.strip() for line in text.splitlines() if line.strip()]
+        return text.strip()
+
+    def _write_legacy(self, key: str, value):
+        filename = LEGACY_FILES.get(key)
+        if not filename or not self.emit_legacy:
+            return
+        if key in LIST_KEYS:
+            text = "".join(f"{item}\n" for item in value)
+        else:
+            text = "" if value is None else str(value)
+        atomic_write(filename, text)
+
+    # ---------- typed accessors ----------
+    def get(self, key: str, default=None):
+        data = self._load()
+        if key in data:
+            return data[key]
+        legacy = self._read_legacy(key)
+        return default if legacy is None else legacy
+
+    def get_str(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self.get(key)
+        return default if value in (None, "") else str(value)
+
+    def get_list(self, key: str) -> List[str]:
+        value = self.get(key)
+        if value is None:
+            return []
+        return list(value) if isinstance(value, (list, tuple)) else [value]
+
+    def require(self, key: str) -> str:
+        """Like get_str but raises MissingStateError when the key is unset or empty."""
+        value = self.get_str(key)
+        if value is None:
+            raise MissingStateError(key)
+        return value
+
+    def as_dict(self) -> dict:
+        return dict(self._load())
+
+    # ---------- updates ----------
+    def update(self, **values):
+        """Merge values into the document (atomically) and emit legacy files."""
+        with locked(self.path):
+            data = self._read()
+            data.update(values)
+            atomic_write(self.path, json.dumps(data, indent=2, sort_keys=True), mode=0o600)
+            self._data = data
+        for key, value in values.items():
+            self._write_legacy(key, value)
+
+    def merge(self, key: str, values: dict):
+        """
+        Merge values into the dict stored under key, atomically with respect
+        to other writers of the same key. A value of None removes the entry.
+        """
+        with locked(self.path):
+            data = self._read()
+            nested = dict(data.get(key) or {})
+            for k, v in values.items():
+                if v is None:
+                    nested.pop(k, None)
+                else:
+                    nested[k] = v
+            data[key] = nested
+            atomic_write(self.path, json.dumps(data, indent=2, sort_keys=True), mode=0o600)
+            self._data = data
+
+    def delete(self, *keys: str):
+        """Remove keys from the document and delete their legacy files."""
+        with locked(self.path):
+            data = self._read()
+            for key in keys:
+                data.pop(key, None)
+            atomic_write(self.path, json.dumps(data, indent=2, sort_keys=True), mode=0o600)
+            self._data = data
+        for key in keys:
+            filename = LEGACY_FILES.get(key)
+            if filename and os.path.exists(filename):
+                os.remove(filename)
+
+    # ---------- shell exports ----------
+    def _export(self, path: str, generator: str, variables: dict, quote: str):
+        lines = ["#!/bin/bash", f"# Auto-generated by {generator}"]
+        for var, key in variables.items():
+            value = self.get_str(key)
+            if value is not None:
+                lines.append(f"export {var}={quote}{value}{quote}")
+        atomic_write(path, "\n".join(lines) + "\n", mode=0o600)
+
+    def export_sandbox_env(self, generator: str, path: str = "sandbox_env.sh"):
+        self._export(path, generator, SANDBOX_ENV_VARS, quote="")
+
+    def export_user_credentials(self, generator: str, path: str = "user_credentials.sh"):
+        self._export(path, generator, USER_CREDENTIAL_VARS, quote="'")
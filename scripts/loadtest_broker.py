@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Cohort stampede load test for sandbox allocation
+
+Starts N simulated students at the same instant, each running the real
+allocation script (allocation_broker_subtenant.py by default) as its own
+process in its own working directory, against the local broker stand-in
+(broker_standin.py) or any --broker-url. With --cleanup every student that
+got a sandbox then runs the cleanup script the same way.
+
+Reported per phase: p50/p95/p99 time-to-sandbox (process start to exit),
+retry counts and contention statuses (from each student's
+admission_stats.json), and the pool-exhaustion (409) rate, so jitter and
+retry settings can be tuned for classes of 200+ before a real class hits
+production.
+
+Usage:
+  python loadtest_broker.py --students 200 --pool 180 --waf-rate 25 --p-5xx 0.02 \\
+      --latency lognormal:250,0.5 --cleanup --json loadtest.json
+
+  python loadtest_broker.py --students 50 --broker-url http://127.0.0.1:8081/v1
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from broker_standin import BrokerStandin
+from standin import add_fault_arguments, serve
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class Student:
+    def __init__(self, index: int, workdir: str, env: dict):
+        self.participant = f"loadtest-{index:04d}"
+        self.workdir = os.path.join(workdir, self.participant)
+        os.makedirs(self.workdir, exist_ok=True)
+        self.env = dict(env, INSTRUQT_PARTICIPANT_ID=self.participant,
+                        ADMISSION_STATS_FILE=os.path.join(self.workdir, "admission_stats.json"),
+                        CIRCUIT_BREAKER_FILE=os.path.join(self.workdir, "circuit_breakers.json"))
+        self.results = {}
+
+    def run(self, phase: str, script: str, start: threading.Event, timeout: float) -> dict:
+        start.wait()
+        began = time.monotonic()
+        try:
+            proc = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, script)], cwd=self.workdir,
+                                  env=self.env, capture_output=True, text=True, timeout=timeout)
+            code, output = proc.returncode, proc.stdout + proc.stderr
+        except subprocess.TimeoutExpired as e:
+            code, output = "timeout", e.stdout if isinstance(e.stdout, str) else ""
+        seconds = time.monotonic() - began
+        with open(os.path.join(self.workdir, f"{phase}.log"), "w") as f:
+            f.write(output)
+        result = {"ok": code == 0, "code": code, "seconds": seconds,
+                  "exhausted": "Pool exhausted" in output}
+        self.results[phase] = result
+        return result
+
+    def admission_stats(self) -> dict:
+        try:
+            with open(self.env["ADMISSION_STATS_FILE"]) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+def run_phase(students: List[Student], phase: str, script: str, timeout: float) -> dict:
+    """Release every student at once through script; returns the phase summary."""
+    start = threading.Event()
+    print(f"🏁 {phase}: {len(students)} student(s) running {script}...", flush=True)
+    began = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, len(students))) as pool:
+        futures = [pool.submit(s.run, phase, script, start, timeout) for s in students]
+        start.set()
+        results = [f.result() for f in futures]
+    wall = time.monotonic() - began
+    ok = [r["seconds"] for r in results if r["ok"]]
+    return {
+        "phase": phase,
+        "script": script,
+        "students": len(results),
+        "succeeded": len(ok),
+        "exhausted": sum(1 for r in results if r["exhausted"]),
+        "exhaustion_rate": round(sum(1 for r in results if r["exhausted"]) / len(results), 4) if results else 0,
+        "failed": sum(1 for r in results if not r["ok"]),
+        "wall_seconds": round(wall, 2),
+        "latency": latency_summary(ok),
+    }
+
+
+def retry_summary(students: List[Student]) -> dict:
+    """Retries (attempts beyond the first) and contention statuses per gate."""
+    gates = {}
+    for s in students:
+        for gate, entry in s.admission_stats().items():
+            g = gates.setdefault(gate, {"attempts": 0, "retries": [], "statuses": Counter()})
+            g["attempts"] += entry.get("attempts", 0)
+            g["retries"].append(max(0, entry.get("attempts", 0) - 1))
+            g["statuses"].update(entry.get("statuses", {}))
+    return {gate: {"attempts": g["attempts"], "retries": sum(g["retries"]),
+                   "max_retries_per_student": max(g["retries"]),
+                   "students_retrying": sum(1 for r in g["retries"] if r),
+                   "contention_statuses": dict(g["statuses"])}
+            for gate, g in gates.items()}
+
+
+def print_phase(summary: dict):
+    lat = summary["latency"]
+    fmt = lambda v: f"{v:.2f}s" if v is not None else "n/a"
+    print(f"📈 {summary['phase']}: {summary['succeeded']}/{summary['students']} ok, "
+          f"{summary['exhausted']} exhausted ({summary['exhaustion_rate'] * 100:.1f}%), "
+          f"{summary['failed']} failed, wall {summary['wall_seconds']}s", flush=True)
+    print(f"   latency p50 {fmt(lat['p50'])}  p95 {fmt(lat['p95'])}  p99 {fmt(lat['p99'])}  "
+          f"max {fmt(lat['max'])}", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stampede the broker allocation path with N simulated students.")
+    ap.add_argument("--students", type=int, default=50)
+    ap.add_argument("--script", default="allocation_broker_subtenant.py",
+                    help="Allocation script to run (allocation_broker_subtenant.py or allocation_subtenant.py).")
+    ap.add_argument("--cleanup", action="store_true",
+                    help="Then run the cleanup script for every allocated student.")
+    ap.add_argument("--cleanup-script", default="cleanup_broker_allocation.py",
+                    help="cleanup_broker_allocation.py or deallocation_subtenant.py.")
+    ap.add_argument("--broker-url", help="Use this broker instead of starting the local stand-in.")
+    ap.add_argument("--token", default="standin")
+    ap.add_argument("--timeout", type=float, default=600, help="Per-student process timeout (s).")
+    ap.add_argument("--workdir", help="Where student directories go (default: a new temp dir).")
+    ap.add_argument("--json", help="Write the full report as JSON to this file.")
+    # Stand-in knobs (ignored with --broker-url)
+    ap.add_argument("--pool", type=int, default=None, help="Stand-in pool size (default: --students).")
+    ap.add_argument("--waf-rate", type=float, default=0)
+    ap.add_argument("--waf-burst", type=float, default=None)
+    add_fault_arguments(ap)
+    args = ap.parse_args()
+
+    broker = None
+    url = args.broker_url
+    if not url:
+        broker = BrokerStandin(pool=args.pool if args.pool is not None else args.students, token=args.token,
+                               latency=args.latency, p_5xx=args.p_5xx, rate=args.waf_rate, burst=args.waf_burst,
+                               retry_after=args.retry_after, seed=args.seed)
+        server, base = serve(broker.app)
+        url = f"{base}/v1"
+        print(f"🧪 Broker stand-in on {url}", flush=True)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="broker_loadtest_")
+    env = dict(os.environ, BROKER_API_URL=url, BROKER_API_TOKEN=args.token,
+               INSTRUQT_TRACK_SLUG="loadtest", PYTHONUNBUFFERED="1")
+    students = [Student(i, workdir, env) for i in range(args.students)]
+    print(f"📂 Student directories under {workdir}", flush=True)
+
+    report = {"students": args.students, "broker_url": url, "phases": []}
+    allocate = run_phase(students, "allocate", args.script, args.timeout)
+    print_phase(allocate)
+    report["phases"].append(allocate)
+
+    if args.cleanup:
+        allocated = [s for s in students if s.results["allocate"]["ok"]]
+        if allocated:
+            cleanup = run_phase(allocated, "cleanup", args.cleanup_script, args.timeout)
+            print_phase(cleanup)
+            report["phases"].append(cleanup)
+
+    report["retries"] = retry_summary(students)
+    for gate, g in report["retries"].items():
+        print(f"🔁 {gate}: {g['retries']} retries over {g['attempts']} attempts, "
+              f"{g['students_retrying']} student(s) retried (max {g['max_retries_per_student']}); "
+              f"statuses {g['contention_statuses'] or '{}'}", flush=True)
+    if broker:
+        report["broker"] = broker.stats()
+        print(f"🗄️ Stand-in: {report['broker']['free']} free, {report['broker']['allocated']} allocated, "
+              f"{report['broker']['exhausted_409']} x 409", flush=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Streaming paginator for CSP list endpoints
+
+Yields the items of a CSP collection one at a time, fetching page after
+page, instead of a single request with a guessed _limit that silently
+truncates large tenants. While the caller works through the current page
+the next one is already being fetched on a background thread, and only
+those two pages are ever held in memory.
+
+Both CSP pagination styles are understood:
+  - offset: _limit/_offset. The first page asks for total_size
+    (_is_total_size_needed=true); when the server reports it, paging stops
+    once that many items were read, so a server that caps _limit below what
+    was asked does not truncate the listing. Without a total, paging stops
+    on a page shorter than _limit.
+  - token:  the response carries next_page_token / page_token / next, and
+    the next request sends it back as _page_token; the first page without
+    a token is the last one
+
+Either way paging also stops when a page starts with the same item as the
+one before it (a server that ignores _offset/_page_token would otherwise be
+read forever).
+
+Usage:
+  for view in paginate(session, f"{base}/api/ddi/v1/dns/zone_child",
+                       headers=headers, params=query.params()):
+      ...
+
+For big collections, paginate_parallel() asks for total_size with the
+first page (_is_total_size_needed=true), then fetches every remaining
+offset concurrently (bounded) and yields the pages back in order: N
+serial round trips become about N/concurrency. Collections that answer
+with a page token instead of a total are walked serially from the first
+page, as paginate() does.
+
+  for view in paginate_parallel(session, collection_url(base, "dns_view"),
+                                headers=headers, concurrency=8):
+      ...
+
+Environment Variables:
+  CSP_PAGE_SIZE         - Default _limit per page (default: 100)
+  CSP_FETCH_CONCURRENCY - Default parallel page fetches (default: 8)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("CSP_PAGE_SIZE", "100"))
+DEFAULT_CONCURRENCY = int(os.environ.get("CSP_FETCH_CONCURRENCY", "8"))
+
+# Collections known to return total_size with _is_total_size_needed=true
+COLLECTIONS = {
+    "zone_child": "/api/ddi/v1/dns/zone_child",
+    "dns_view": "/api/ddi/v1/dns/view",
+    "providers": "/api/cloud_discovery/v2/providers",
+    "users": "/v2/users",
+}
+
+TOKEN_KEYS = ("next_page_token", "page_token", "next")
+
+
+def _page_items(data) -> Tuple[List[dict], Optional[str], Optional[int]]:
+    """(items, next token, total_size) from one decoded response."""
+    if isinstance(data, list):
+        return data, None, None
+    items = data.get("results", data.get("items", []))
+    if not isinstance(items, list):
+        items = [items] if items else []
+    token = next((data[k] for k in TOKEN_KEYS if data.get(k)), None)
+    total = data.get("total_size")
+    return items, token, int(total) if total is not None else None
+
+
+def collection_url(base_url: str, collection: str) -> str:
+    return f"{base_url}{COLLECTIONS[collection]}"
+
+
+def _fetch_page(session, url: str, headers: Optional[dict], params: dict):
+    r = session.get(url, headers=headers, params=params)
+    r.raise_for_status()
+    return _page_items(r.json())
+
+
+def _item_key(item):
+    return item.get("id", item) if isinstance(item, dict) else item
+
+
+def _walk(url: str, fetch, page, offset: int, limit: int, prefetch: bool) -> Iterator[dict]:
+    """Yield the items of page and of every page after it; fetch(offset, token) gets the next one."""
+    pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    last_token = None
+    total = None
+    previous_first = None
+    try:
+        while True:
+            items, token, page_total = page
+            if page_total is not None:
+                total = page_total
+            if items:
+                first = _item_key(items[0])
+                if previous_first is not None and first == previous_first:
+                    print(f"⚠️ {url} returned the same page again; stopping after {offset} item(s)", flush=True)
+                    return
+                previous_first = first
+            offset += len(items)
+            if token:
+                # A server that echoes the same token back would loop forever
+                more = token != last_token
+                last_token = token
+            elif last_token is not None:
+                # Token paging: the last page simply carries no token
+                more = False
+            elif total is not None:
+                more = offset < total and len(items) > 0
+            else:
+                more = len(items) >= limit
+            if more and pool:
+                pending = pool.submit(fetch, offset, token)
+            yield from items
+            if not more:
+                return
+            page = pending.result() if pending else fetch(offset, token)
+            pending = None
+    finally:
+        if pending:
+            pending.cancel()
+        if pool:
+            pool.shutdown(wait=False)
+
+
+def _page_fetcher(session, url: str, headers: Optional[dict], base_params: dict, token_param: str):
+    def fetch(offset: int, token: Optional[str]):
+        page_params = dict(base_params)
+        if token:
+            page_params[token_param] = token
+        else:
+            page_params["_offset"] = str(offset)
+        return _fetch_page(session, url, headers, page_params)
+    return fetch
+
+
+def paginate(session, url: str, headers: Optional[dict] = None, params: Optional[dict] = None,
+             page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True,
+             token_param: str = "_page_token") -> Iterator[dict]:
+    """Yield every item of the collection at url (see module docstring)."""
+    base_params = dict(params or {})
+    base_params.setdefault("_limit", str(page_size))
+    limit = int(base_params["_limit"])
+    offset = int(base_params.pop("_offset", 0))
+    base_params.pop("_is_total_size_needed", None)
+
+    fetch = _page_fetcher(session, url, headers, base_params, token_param)
+    first = _fetch_page(session, url, headers, dict(base_params, _offset=str(offset), _is_total_size_needed="true"))
+    yield from _walk(url, fetch, first, offset, limit, prefetch)
+
+
+def paginate_parallel(session, url: str, headers: Optional[dict] = None, params: Optional[dict] = None,
+                      page_size: int = DEFAULT_PAGE_SIZE,
+                      concurrency: int = DEFAULT_CONCURRENCY) -> Iterator[dict]:
+    """Like paginate(), but fans out all remaining offsets once total_size is known."""
+    base_params = dict(params or {})
+    base_params.setdefault("_limit", str(page_size))
+    base_params["_is_total_size_needed"] = "true"
+    start = int(base_params.pop("_offset", 0))
+
+    first = _fetch_page(session, url, headers, dict(base_params, _offset=str(start)))
+    first_items, token, total = first
+    if token or total is None:
+        # Nothing to plan with (token-paged or no total): walk on serially from the page we have
+        serial_params = {k: v for k, v in base_params.items() if k != "_is_total_size_needed"}
+        fetch = _page_fetcher(session, url, headers, serial_params, "_page_token")
+        yield from _walk(url, fetch, first, start, int(base_params["_limit"]), prefetch=True)
+        return
+
+    yield from first_items
+    if not first_items:
+        return
+    # Step by what the server actually returned, in case it caps _limit
+    step = len(first_items)
+    offsets = range(start + step, total, step)
+    if not offsets:
+        return
+
+    def fetch(offset):
+        return _fetch_page(session, url, headers, dict(base_params, _offset=str(offset)))[0]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(offsets)))) as pool:
+        # map() yields in submission order, so items come out in offset order
+        for items in pool.map(fetch, offsets):
+            yield from items
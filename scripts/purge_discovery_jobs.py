@@ -1,89 +1,62 @@
 import os
 import json
 import argparse
-import requests
-from typing import Iterable, List, Optional, Tuple
+import statistics
+from typing import Iterable, Iterator, List, Optional
+import csp_client
+import tracing
+from bulk_delete import BulkDeleter
+from csp_client import get_session
+from csp_query import Query, contains, eq
+from lab_state import LabState
+from paginator import DEFAULT_CONCURRENCY, paginate, paginate_parallel
+from waiter import Condition, wait_each
 
 class InfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
+        self.base_url = csp_client.base_url()
         self.email = os.getenv("INFOBLOX_EMAIL")
         self.password = os.getenv("INFOBLOX_PASSWORD")
         if not self.email or not self.password:
             raise RuntimeError("Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD env vars.")
         self.jwt = None
-        self.session = requests.Session()
+        self.session = get_session()
 
     # ---------- auth ----------
     def login(self):
-        r = self.session.post(
-            f"{self.base_url}/v2/session/users/sign_in",
-            headers={"Content-Type": "application/json"},
-            json={"email": self.email, "password": self.password},
-        )
-        r.raise_for_status()
-        self.jwt = r.json().get("jwt")
-        if not self.jwt:
-            raise RuntimeError("Login succeeded but no JWT returned.")
+        self.jwt = csp_client.sign_in(self.base_url, self.email, self.password)
         print("✅ Logged in.")
 
-    def switch_account(self, sandbox_id_file: str = "sandbox_id.txt"):
-        with open(sandbox_id_file, "r") as f:
-            sandbox_id = f.read().strip()
-        r = self.session.post(
-            f"{self.base_url}/v2/session/account_switch",
-            headers=self._auth_headers(),
-            json={"id": f"identity/accounts/{sandbox_id}"},
-        )
-        r.raise_for_status()
-        self.jwt = r.json().get("jwt")
-        if not self.jwt:
-            raise RuntimeError("Account switch succeeded but no JWT returned.")
+    def switch_account(self, sandbox_id: Optional[str] = None):
+        sandbox_id = sandbox_id or LabState().require("sandbox_id")
+        self.jwt = csp_client.switch_account(self.base_url, self.jwt, sandbox_id, email=self.email)
         print(f"✅ Switched to sandbox {sandbox_id}.")
 
     def _auth_headers(self):
         return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
 
     # ---------- discovery providers ----------
-    def list_providers(self) -> List[dict]:
+    def iter_providers(self, query: Optional[Query] = None, concurrency: int = 1) -> Iterator[dict]:
         """
-        GET /api/cloud_discovery/v2/providers
-        Handles both {"results":[...]} and raw list responses.
-        Adds naive pagination support if API returns 'next' or 'page_token'.
+        Stream GET /api/cloud_discovery/v2/providers page by page (offset or
+        token pagination, next page prefetched; see paginator.py). With
+        concurrency > 1 all pages after the first are fetched in parallel.
+        query (see csp_query.py) narrows rows/columns server-side.
         """
         url = f"{self.base_url}/api/cloud_discovery/v2/providers"
-        providers: List[dict] = []
-        params = {}
-
-        while True:
-            r = self.session.get(url, headers=self._auth_headers(), params=params)
-            r.raise_for_status()
-            data = r.json()
-
-            if isinstance(data, dict):
-                items = data.get("results", data.get("items", []))
-                providers.extend(items if isinstance(items, list) else [])
-                # common pagination keys; keep it defensive
-                next_token = data.get("next") or data.get("next_page_token")
-                if next_token:
-                    params["page_token"] = next_token
-                    continue
-            elif isinstance(data, list):
-                providers.extend(data)
-            break
-
-        return providers
-
-    def delete_provider(self, provider_id: str,
-                        delete_ipam: bool = True,
-                        delete_asset: bool = True) -> Tuple[int, str]:
-        """
-        DELETE /providers/{id}?deletion_objects=ipam_data&deletion_objects=asset_data
-        Returns (status_code, message).
-        """
-        if not delete_ipam and not delete_asset:
-            return (0, "Skipped (no deletion objects selected)")
-
+        params = query.params() if query else {}
+        if concurrency > 1:
+            return paginate_parallel(self.session, url, headers=self._auth_headers(), params=params,
+                                     concurrency=concurrency)
+        return paginate(self.session, url, headers=self._auth_headers(), params=params)
+
+    def list_providers(self, query: Optional[Query] = None, concurrency: int = 1) -> List[dict]:
+        return list(self.iter_providers(query, concurrency))
+
+    def delete_provider_request(self, provider_id: str,
+                                delete_ipam: bool = True,
+                                delete_asset: bool = True):
+        """DELETE /providers/{id}?deletion_objects=... and return the raw response."""
         params = []
         if delete_ipam:
             params.append(("deletion_objects", "ipam_data"))
@@ -91,18 +64,64 @@ class InfobloxSession:
             params.append(("deletion_objects", "asset_data"))
 
         url = f"{self.base_url}/api/cloud_discovery/v2/providers/{provider_id}"
-        r = self.session.delete(url, headers=self._auth_headers(), params=params)
+        return self.session.delete(url, headers=self._auth_headers(), params=params)
+
+    def deletion_condition(self, provider_id: str, name: Optional[str] = None) -> Condition:
+        """Satisfied once GET /providers/{id} answers 404, i.e. the async delete finished."""
+        url = f"{self.base_url}/api/cloud_discovery/v2/providers/{provider_id}"
+        return Condition(
+            f"id={provider_id} name={name}",
+            request=lambda: self.session.get(url, headers=self._auth_headers(), params={"_fields": "id"}),
+            check=lambda resp: True if resp.status_code == 404 else None,
+            interval=2, factor=1.5, max_interval=15,
+            check_statuses=(404,), verbose=False,
+        )
+
 
-        if r.status_code in (200, 202, 204):
-            return (r.status_code, "Deleted")
-        if r.status_code == 404:
-            return (r.status_code, "Not found (already deleted?)")
+def wait_for_deletions(s: InfobloxSession, results, names: dict, timeout: float) -> bool:
+    """
+    Poll every provider whose delete came back 202 until it is gone, all
+    under one deadline. Prints the time from DELETE to completion per
+    provider; returns False if any were still pending at the deadline.
+    """
+    accepted = [r for r in results if r.status == 202]
+    if not accepted:
+        return True
+    print(f"\n⏳ Tracking {len(accepted)} asynchronous provider deletion(s) (up to {timeout:.0f}s)...",
+          flush=True)
+    conditions = {r.item: s.deletion_condition(r.item, names.get(r.item)) for r in accepted}
+    waited = wait_each(list(conditions.values()), timeout)
+
+    durations = []
+    for r in accepted:
+        w = waited[conditions[r.item].name]
+        if w.done:
+            # Measured from the DELETE request, not from when polling started
+            total = r.seconds + (w.done_at - r.done_at)
+            durations.append(total)
+            print(f"✅ {conditions[r.item].name} deletion completed in {total:.1f}s ({w.polls} poll(s))",
+                  flush=True)
+        else:
+            print(f"❌ {conditions[r.item].name} still deleting after {timeout:.0f}s", flush=True)
+
+    pending = len(accepted) - len(durations)
+    if durations:
+        print(f"🧾 Async deletes: {len(durations)} completed, {pending} pending; "
+              f"p50 {statistics.median(durations):.1f}s, max {max(durations):.1f}s", flush=True)
+    else:
+        print(f"🧾 Async deletes: none completed, {pending} pending", flush=True)
+    return pending == 0
+
+
+def provider_query(name_exact: Optional[str], name_contains: Optional[str]) -> Query:
+    """Server-side counterpart of filter_providers (which still runs as a guard)."""
+    query = Query().fields("id", "name", "display_name")
+    if name_exact:
+        query.where(eq("name", name_exact))
+    elif name_contains:
+        query.where(contains("name", name_contains, ignore_case=True))
+    return query
 
-        try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        return (r.status_code, f"Failed: {detail}")
 
 def filter_providers(providers: Iterable[dict],
                      name_exact: Optional[str],
@@ -123,7 +142,7 @@ def filter_providers(providers: Iterable[dict],
 def main():
     ap = argparse.ArgumentParser(description="List and delete Cloud Discovery providers (jobs).")
     ap.add_argument("--no-switch", action="store_true",
-                    help="Skip account switch via sandbox_id.txt.")
+                    help="Skip account switch to the lab sandbox (lab_state.json / sandbox_id.txt).")
     ap.add_argument("--list", action="store_true",
                     help="Only list providers and exit.")
     ap.add_argument("--name", help="Delete providers with exact name match.")
@@ -134,6 +153,12 @@ def main():
                     help="Do NOT delete Asset data.")
     ap.add_argument("--dry-run", action="store_true",
                     help="Show what would be deleted without deleting.")
+    ap.add_argument("--fetch-concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                    help="Provider list pages fetched in parallel (1 = one page at a time).")
+    ap.add_argument("--wait", action="store_true",
+                    help="Poll providers whose delete was accepted (202) until they are gone.")
+    ap.add_argument("--wait-timeout", type=float, default=600,
+                    help="Combined deadline in seconds for --wait (default: 600).")
     args = ap.parse_args()
 
     s = InfobloxSession()
@@ -141,36 +166,58 @@ def main():
     if not args.no_switch:
         s.switch_account()
 
-    providers = s.list_providers()
-    # Pretty print current state
-    print("📋 Providers:")
-    for p in providers:
-        pid = p.get("id")
-        pname = p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
-        print(f"- id: {pid} | name: {pname}")
+    # --list shows everything; otherwise only fetch the rows the filter can match
+    providers = s.iter_providers(provider_query(None, None) if args.list
+                                 else provider_query(args.name, args.contains),
+                                 concurrency=args.fetch_concurrency)
+
+    # Pretty print current state while streaming; only matches are kept
+    def printed(providers):
+        for p in providers:
+            pid = p.get("id")
+            pname = p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
+            print(f"- id: {pid} | name: {pname}")
+            yield p
 
+    print("📋 Providers:")
     if args.list:
+        for _ in printed(providers):
+            pass
         return
 
-    targets = filter_providers(providers, args.name, args.contains)
+    targets = filter_providers(printed(providers), args.name, args.contains)
     if not targets:
         print("ℹ️ No providers matched the filter; nothing to do.")
         return
 
     print(f"\n🎯 Candidates to delete: {len(targets)}")
+    names = {}
     for p in targets:
         pid = p.get("id")
-        pname = p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
+        names[pid] = p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
         if args.dry_run:
-            print(f"DRY-RUN: would delete id={pid} name={pname}")
-            continue
+            print(f"DRY-RUN: would delete id={pid} name={names[pid]}")
+    if args.dry_run:
+        return
+    if args.keep_ipam and args.keep_asset:
+        print("ℹ️ Skipped (no deletion objects selected)")
+        return
 
-        code, msg = s.delete_provider(
-            provider_id=pid,
-            delete_ipam=not args.keep_ipam,
-            delete_asset=not args.keep_asset
-        )
-        print(f"id={pid} name={pname} -> {msg} (HTTP {code})")
+    # Concurrent deletes with AIMD backoff on 429/5xx (see bulk_delete.py)
+    deleter = BulkDeleter(
+        "provider",
+        lambda pid: s.delete_provider_request(pid, delete_ipam=not args.keep_ipam,
+                                              delete_asset=not args.keep_asset),
+        label=lambda pid: f"id={pid} name={names.get(pid)}",
+    )
+    with tracing.span("delete_providers", count=len(names)):
+        results = deleter.run(names)
+    deleter.print_report(results)
+
+    if args.wait:
+        with tracing.span("wait_for_deletions"):
+            if not wait_for_deletions(s, results, names, args.wait_timeout):
+                raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,10 @@
 import os
 import json
-import requests
+from csp_client import base_url, get_session
+from lab_state import LabState
 
 # === Configuration ===
-API_URL = "https://csp.infoblox.com/api/cloud_discovery/v2/providers"
+API_URL = f"{base_url()}/api/cloud_discovery/v2/providers"
 TOKEN = os.environ.get("Infoblox_Token")
 ROLE_ARN_FILE = "infoblox_role_arn.txt"
 PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
@@ -13,12 +14,11 @@ if not TOKEN:
     raise EnvironmentError("❌ 'Infoblox_Token' environment variable is not set.")
 if not PARTICIPANT_ID:
     raise EnvironmentError("❌ 'INSTRUQT_PARTICIPANT_ID' environment variable is not set.")
-if not os.path.isfile(ROLE_ARN_FILE):
-    raise FileNotFoundError(f"❌ IAM Role ARN file not found: {ROLE_ARN_FILE}")
 
-# === Load Role ARN from file ===
-with open(ROLE_ARN_FILE, "r") as f:
-    role_arn = f.read().strip()
+# === Load Role ARN from lab state (falls back to infoblox_role_arn.txt) ===
+role_arn = LabState().get_str("infoblox_role_arn")
+if not role_arn:
+    raise FileNotFoundError(f"❌ IAM Role ARN not found in lab state or {ROLE_ARN_FILE}")
 
 print(f"🔐 Using IAM Role ARN: {role_arn}")
 print(f"👤 Participant ID: {PARTICIPANT_ID}")
@@ -119,11 +119,12 @@ headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
 # === Send the POST request ===
 print("🚀 Sending API request to register AWS cloud provider with Infoblox...")
 
-response = requests.post(API_URL, headers=headers, data=json.dumps(payload))
+response = session.post(API_URL, headers=headers, data=json.dumps(payload))
 
 # === Handle Response ===
 try:
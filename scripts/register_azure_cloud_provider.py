@@ -1,9 +1,10 @@
 import os
 import json
-import requests
+from csp_client import base_url, get_session
+from lab_state import LabState
 
 # === Configuration ===
-API_URL = "https://csp.infoblox.com/api/cloud_discovery/v2/providers"
+API_URL = f"{base_url()}/api/cloud_discovery/v2/providers"
 TOKEN = os.environ.get("Infoblox_Token")
 RESTRICTED_ACCOUNT_ID = os.environ.get("INSTRUQT_AZURE_SUBSCRIPTION_INFOBLOX_TENANT_SUBSCRIPTION_ID")
 PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
@@ -16,12 +17,11 @@ if not RESTRICTED_ACCOUNT_ID:
     raise EnvironmentError("❌ 'INSTRUQT_AZURE_SUBSCRIPTION_INFOBLOX_TENANT_SUBSCRIPTION_ID' is not set.")
 if not PARTICIPANT_ID:
     raise EnvironmentError("❌ 'INSTRUQT_PARTICIPANT_ID' environment variable is not set.")
-if not os.path.exists(CLOUD_CREDENTIAL_FILE):
-    raise FileNotFoundError(f"❌ Credential ID file '{CLOUD_CREDENTIAL_FILE}' not found.")
 
-# === Load cloud_credential_id from file ===
-with open(CLOUD_CREDENTIAL_FILE, "r") as f:
-    CLOUD_CREDENTIAL_ID = f.read().strip()
+# === Load cloud_credential_id from lab state (falls back to the legacy file) ===
+CLOUD_CREDENTIAL_ID = LabState().get_str("azure_cloud_credential_id")
+if not CLOUD_CREDENTIAL_ID:
+    raise FileNotFoundError(f"❌ Credential ID not found in lab state or '{CLOUD_CREDENTIAL_FILE}'.")
 
 # === Dynamic names ===
 provider_name = f"Azure_Demo_Lab_{PARTICIPANT_ID}"
@@ -122,11 +122,12 @@ headers = {
     "Authorization": f"Token {TOKEN}",
     "Content-Type": "application/json"
 }
+session = get_session()
 
 # === Make the POST request ===
 print(f"🚀 Registering Azure cloud provider '{provider_name}' with view '{view_name}'...")
 
-response = requests.post(API_URL, headers=headers, data=json.dumps(payload))
+response = session.post(API_URL, headers=headers, data=json.dumps(payload))
 
 # === Handle Response ===
 try:
@@ -0,0 +1,162 @@
+"""
+Unified retry policy
+
+One retry loop for every broker/CSP call instead of a hand-written loop per
+script. Each endpoint has a named policy saying which statuses are worth
+retrying, how many attempts it gets and how long the whole step may take;
+anything else (400, 401, 404, 409, ...) is returned to the caller on the
+first attempt instead of being retried for minutes.
+
+Backoff and contention accounting go through admission.Admission, so
+Retry-After is honoured and every retry shows up in admission_stats.json.
+Policies for the broker and CSP also feed a host-wide circuit breaker per
+backend (see circuit_breaker.py); while it is open, call() raises
+CircuitOpenError before sending anything.
+All policies in a process also draw from one shared retry budget, so a
+degraded backend cannot make a single run retry without bound.
+Requests sent by fn are tagged with their attempt number in http_metrics.
+
+Usage:
+  retry = policy("csp.users.create")
+  resp = retry.call(lambda: session.post(url, json=payload, headers=headers))
+  if resp.status_code == 409: ...
+
+call() returns the last response (successful, non-retryable, or the final
+retryable one once attempts/budget/deadline run out) and re-raises the last
+connection error/timeout if no response was ever received.
+
+Environment Variables:
+  RETRY_BUDGET - Max retries (not first attempts) per process (default: 30)
+"""
+
+import os
+import time
+import threading
+import requests
+import http_metrics
+from typing import Callable, Optional
+from admission import Admission, BROKER_CONTENTION, CSP_CONTENTION
+from circuit_breaker import CircuitBreaker
+
+DEFAULT_BUDGET = int(os.environ.get("RETRY_BUDGET", "30"))
+
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+class RetryBudget:
+    """Thread-safe count of retries left for this process."""
+
+    def __init__(self, total: int = DEFAULT_BUDGET):
+        self.total = total
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+default_budget = RetryBudget()
+
+# Per-endpoint settings; keys are the names passed to policy()
+POLICIES = {
+    "broker.allocate": dict(retry_statuses=BROKER_CONTENTION, max_attempts=5, deadline=180, base=2.0,
+                            breaker="broker"),
+    "broker.mark_for_deletion": dict(retry_statuses=BROKER_CONTENTION, max_attempts=4, deadline=60, base=2.0,
+                                     breaker="broker"),
+    "csp.sandbox_create": dict(retry_statuses=CSP_CONTENTION, max_attempts=5, deadline=120, breaker="csp"),
+    "csp.sandbox_delete": dict(retry_statuses=CSP_CONTENTION, max_attempts=5, deadline=180, breaker="csp"),
+    "csp.users.create": dict(retry_statuses=CSP_CONTENTION, max_attempts=5, deadline=60, breaker="csp"),
+    "csp.users.delete": dict(retry_statuses=CSP_CONTENTION, max_attempts=5, deadline=60, breaker="csp"),
+    "csp.ipam.write": dict(retry_statuses=CSP_CONTENTION, max_attempts=5, deadline=120, breaker="csp"),
+    # 403 right after the switch is permission propagation, not a real denial
+    # (so it is retried but does not count against the CSP breaker)
+    "csp.discovery.submit": dict(retry_statuses=CSP_CONTENTION | {403}, max_attempts=10, deadline=300, base=3.0,
+                                 breaker="csp", breaker_statuses=CSP_CONTENTION),
+}
+
+
+class RetryPolicy:
+    def __init__(self, name: str, retry_statuses=CSP_CONTENTION, max_attempts: int = 5,
+                 deadline: Optional[float] = None, base: float = 1.0, cap: float = 30.0,
+                 budget: Optional[RetryBudget] = None, breaker: Optional[str] = None,
+                 breaker_statuses=None):
+        if max_attempts < 1:
+            raise ValueError(f"{name}: max_attempts must be at least 1, got {max_attempts}")
+        self.name = name
+        self.retry_statuses = frozenset(retry_statuses)
+        self.breaker = CircuitBreaker(breaker) if breaker else None
+        self.breaker_statuses = frozenset(breaker_statuses if breaker_statuses is not None else retry_statuses)
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.budget = budget or default_budget
+        self.gate = Admission(name, contention_statuses=self.retry_statuses, base=base, cap=cap)
+        self.attempts = 0
+
+    def is_retryable(self, status) -> bool:
+        return status in self.retry_statuses
+
+    def _may_retry(self, attempt: int, start: float) -> Optional[float]:
+        """Seconds left for backoff, or None when no further attempt is allowed."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        remaining = float("inf")
+        if self.deadline is not None:
+            remaining = self.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                print(f"⏱️ {self.name}: step deadline of {self.deadline:.0f}s reached", flush=True)
+                return None
+        if not self.budget.take():
+            print(f"🪫 {self.name}: retry budget of {self.budget.total} exhausted for this run", flush=True)
+            return None
+        return remaining
+
+    def call(self, fn: Callable[[], requests.Response]) -> requests.Response:
+        start = time.monotonic()
+        for attempt in range(self.max_attempts):
+            self.attempts = attempt + 1
+            if self.breaker:
+                self.breaker.before_call()
+            try:
+                with http_metrics.attempt(attempt + 1):
+                    resp = fn()
+            except RETRYABLE_EXCEPTIONS as e:
+                label = "timeout" if isinstance(e, requests.Timeout) else "error"
+                self.gate.observe(label)
+                self._record_outcome(failed=True)
+                remaining = self._may_retry(attempt, start)
+                if remaining is None:
+                    raise
+                self.gate.backoff(attempt, reason=f"{label}: {e}", max_delay=remaining)
+                continue
+
+            self.gate.observe(resp.status_code)
+            self._record_outcome(failed=resp.status_code in self.breaker_statuses)
+            if not self.is_retryable(resp.status_code):
+                return resp
+            remaining = self._may_retry(attempt, start)
+            if remaining is None:
+                return resp
+            self.gate.backoff(attempt, resp, max_delay=remaining)
+        return resp
+
+    def _record_outcome(self, failed: bool):
+        if not self.breaker:
+            return
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def summary(self) -> str:
+        return self.gate.summary()
+
+
+def policy(name: str, **overrides) -> RetryPolicy:
+    """Build the named endpoint policy from POLICIES, with optional overrides."""
+    settings = dict(POLICIES.get(name, {}))
+    settings.update(overrides)
+    return RetryPolicy(name, **settings)
@@ -1,7 +1,9 @@
 import json
-import requests
 import logging
 from logging.handlers import RotatingFileHandler
+from typing import Iterator, Optional
+from csp_client import get_session
+from paginator import paginate
 
 # Setup logging
 logger = logging.getLogger('SandboxAccountLogger')
@@ -17,9 +19,12 @@ class SandboxAccountAPI:
     Interacts with the /sandbox/accounts endpoint to manage sandbox accounts.
     """
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str, auth_scheme: str = "token"):
         self.base_url = base_url.rstrip("/")
         self.token = token
+        # "token" for an API key, "Bearer" for a JWT from sign_in
+        self.auth_scheme = auth_scheme
+        self.session = get_session()
 
     def _headers(self):
         headers = {
@@ -27,14 +32,14 @@ class SandboxAccountAPI:
             "Accept": "application/json"
         }
         if self.token:
-            headers["Authorization"] = f"token {self.token}"
+            headers["Authorization"] = f"{self.auth_scheme} {self.token}"
         return headers
 
     def create_sandbox_account(self, sandbox_account_request: dict) -> dict:
         endpoint = f"{self.base_url}/sandbox/accounts"
         try:
             logger.debug(f"Creating sandbox at {endpoint} with payload: {sandbox_account_request}")
-            response = requests.post(url=endpoint, headers=self._headers(), data=json.dumps(sandbox_account_request))
+            response = self.session.post(url=endpoint, headers=self._headers(), data=json.dumps(sandbox_account_request))
             response.raise_for_status()
             result = response.json()
             logger.info(f"Sandbox created: {json.dumps(result, indent=2)}")
@@ -48,7 +53,7 @@ class SandboxAccountAPI:
         params = {"_filter": f'name=="{name}"'}
         try:
             logger.debug(f"Querying sandbox ID with filter: {params}")
-            response = requests.get(endpoint, headers=self._headers(), params=params)
+            response = self.session.get(endpoint, headers=self._headers(), params=params)
             response.raise_for_status()
             result = response.json()
             if result.get("results"):
@@ -62,11 +67,17 @@ class SandboxAccountAPI:
             logger.error(f"Error fetching sandbox ID: {e}")
             return None
 
+    def iter_sandbox_accounts(self, params: Optional[dict] = None) -> Iterator[dict]:
+        """Stream every sandbox account page by page (see paginator.py)."""
+        endpoint = f"{self.base_url}/sandbox/accounts"
+        logger.debug(f"Listing sandbox accounts with params: {params}")
+        return paginate(self.session, endpoint, headers=self._headers(), params=params)
+
     def delete_sandbox_account(self, sandbox_id: str) -> bool:
         endpoint = f"{self.base_url}/sandbox/accounts/{sandbox_id}"
         try:
             logger.debug(f"Deleting sandbox ID: {sandbox_id} at {endpoint}")
-            response = requests.delete(endpoint, headers=self._headers())
+            response = self.session.delete(endpoint, headers=self._headers())
             if response.status_code == 204:
                 logger.info(f"Sandbox ID {sandbox_id} deleted successfully.")
                 return True
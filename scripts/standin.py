@@ -0,0 +1,199 @@
+"""
+Shared plumbing for the local API stand-ins (broker_standin.py, csp_standin.py)
+
+A stand-in is a small threaded HTTP server (stdlib only) that answers the
+routes our scripts call, with knobs to make it behave like a loaded
+production backend: latency drawn from a distribution, a token-bucket rate
+limit answered with 403/429, random 5xx, and per-route counters exposed at
+GET /_stats for the load/benchmark harnesses.
+
+Latency specs (milliseconds):
+  fixed:50            always 50 ms
+  uniform:20,200      uniform between 20 and 200 ms
+  normal:80,20        mean 80, stddev 20 (clamped at 0)
+  lognormal:80,0.5    median 80, sigma 0.5 (long tail)
+  exp:80              exponential with mean 80
+
+Usage:
+  app = App(latency="lognormal:80,0.5", p_5xx=0.02)
+  app.route("POST", r"/v1/allocate", handler)     # handler(req) -> (status, body[, headers])
+  server, url = serve(app, port=0)                # background thread; port 0 = any free port
+"""
+
+import re
+import json
+import math
+import argparse
+import time
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class Latency:
+    def __init__(self, spec: Optional[str] = None):
+        self.spec = spec or "fixed:0"
+        kind, _, args = self.spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a] or [0.0]
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"unknown latency distribution {spec!r}")
+
+    def sample(self) -> float:
+        """Seconds to sleep."""
+        a = self.args
+        if self.kind == "uniform":
+            ms = random.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            ms = random.gauss(a[0], a[1] if len(a) > 1 else 0)
+        elif self.kind == "lognormal":
+            ms = random.lognormvariate(math.log(max(a[0], 1e-3)), a[1] if len(a) > 1 else 0.5)
+        elif self.kind == "exp":
+            ms = random.expovariate(1 / a[0]) if a[0] else 0
+        else:
+            ms = a[0]
+        return max(0.0, ms) / 1000
+
+
+class TokenBucket:
+    """rate requests/s with bursts up to `burst`; rate 0 disables the limit."""
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class Request:
+    def __init__(self, method: str, path: str, query: Dict[str, List[str]], headers, body, match):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def arg(self, name: str, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+
+class App:
+    def __init__(self, latency: Optional[str] = None, p_5xx: float = 0.0, p_429: float = 0.0,
+                 rate: float = 0, burst: Optional[float] = None, limit_status: int = 429,
+                 retry_after: Optional[float] = None, seed: Optional[int] = None):
+        self.latency = Latency(latency)
+        self.route_latency: Dict[str, Latency] = {}
+        self.p_5xx = p_5xx
+        self.p_429 = p_429
+        self.bucket = TokenBucket(rate, burst)
+        self.limit_status = limit_status
+        self.retry_after = retry_after
+        self.routes: List[Tuple[str, re.Pattern, str, Callable]] = []
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        if seed is not None:
+            random.seed(seed)
+
+    def route(self, method: str, pattern: str, fn: Callable, latency: Optional[str] = None):
+        self.routes.append((method, re.compile(f"^{pattern}$"), pattern, fn))
+        if latency:
+            self.route_latency[pattern] = Latency(latency)
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _throttled(self) -> Optional[tuple]:
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+        if not self.bucket.allow():
+            return self.limit_status, {"error": "rate limited"}, headers
+        if self.p_429 and random.random() < self.p_429:
+            return 429, {"error": "too many requests"}, headers
+        if self.p_5xx and random.random() < self.p_5xx:
+            return random.choice((500, 502, 503, 504)), {"error": "injected server error"}, {}
+        return None
+
+    def dispatch(self, method: str, raw_path: str, headers, body) -> tuple:
+        url = urlparse(raw_path)
+        if method == "GET" and url.path == "/_stats":
+            with self._lock:
+                return 200, dict(self.stats), {}
+        for m, regex, pattern, fn in self.routes:
+            match = regex.match(url.path)
+            if m == method and match:
+                time.sleep(self.route_latency.get(pattern, self.latency).sample())
+                result = self._throttled() or fn(Request(method, url.path, parse_qs(url.query),
+                                                         headers, body, match))
+                status = result[0]
+                self.count(f"{method} {pattern} {status}")
+                return result if len(result) == 3 else (result[0], result[1], {})
+        self.count(f"{method} <unknown> 404")
+        return 404, {"error": f"no route for {method} {url.path}"}, {}
+
+
+def add_fault_arguments(ap: argparse.ArgumentParser):
+    """Latency/fault knobs shared by the stand-in CLIs and the harnesses."""
+    ap.add_argument("--latency", default="fixed:0", help="Latency distribution (see standin.py).")
+    ap.add_argument("--p-5xx", type=float, default=0.0, help="Probability of an injected 5xx.")
+    ap.add_argument("--retry-after", type=float, default=None,
+                    help="Retry-After seconds sent with throttled responses.")
+    ap.add_argument("--seed", type=int, default=None)
+
+
+def _handler_class(app: App):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes on a keep-alive socket;
+        # with Nagle on, delayed ACKs add ~40ms to every response
+        disable_nagle_algorithm = True
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = None
+            status, payload, headers = app.dispatch(self.command, self.path, self.headers, body)
+            data = b"" if payload is None else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(app: App, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start app on a daemon thread; returns (server, base URL)."""
+    server = ThreadingHTTPServer((host, port), _handler_class(app))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
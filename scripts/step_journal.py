@@ -0,0 +1,98 @@
+"""
+Resumable step journal
+
+Records every completed lifecycle step (allocate, user, gcp_key, ...) in
+lab_state.json together with its output and a hash of the inputs it ran
+with. When Instruqt retries a setup script that failed halfway, steps that
+already completed with the same inputs are skipped and their recorded
+output is returned, so the retry does not re-allocate from the broker or
+re-POST creates that would only come back 409.
+
+Entries live under the "steps" key of the lab state:
+
+  {"steps": {"allocate": {"inputs": "<sha256>", "output": {...},
+                          "completed_at": "...", "duration": 1.9}}}
+
+A step whose inputs changed (different account, project, participant) is
+treated as not done and runs again.
+
+Usage:
+  from step_journal import StepJournal
+  journal = StepJournal()
+  alloc = journal.run("allocate", {"participant": pid}, allocate_sandbox)
+
+Environment Variables:
+  LAB_JOURNAL_DISABLE - Set to 1 to always run every step (default: unset)
+"""
+
+import os
+import json
+import time
+import hashlib
+from typing import Callable, Optional
+from lab_state import LabState
+
+JOURNAL_KEY = "steps"
+DISABLED = os.environ.get("LAB_JOURNAL_DISABLE", "") in ("1", "true", "yes")
+
+
+def hash_inputs(inputs) -> str:
+    """Stable sha256 of a JSON-serializable inputs value."""
+    blob = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class StepJournal:
+    def __init__(self, state: Optional[LabState] = None, disabled: bool = DISABLED):
+        self.state = state or LabState()
+        self.disabled = disabled
+
+    def _entries(self) -> dict:
+        self.state.refresh()
+        return self.state.get(JOURNAL_KEY) or {}
+
+    def get(self, name: str, inputs) -> Optional[dict]:
+        """Return the journal entry for name if it completed with these inputs."""
+        if self.disabled:
+            return None
+        entry = self._entries().get(name)
+        if entry and entry.get("inputs") == hash_inputs(inputs):
+            return entry
+        return None
+
+    def is_done(self, name: str, inputs) -> bool:
+        return self.get(name, inputs) is not None
+
+    def record(self, name: str, inputs, output=None, duration: Optional[float] = None):
+        """Mark name as completed with inputs; output must be JSON-serializable."""
+        entry = {
+            "inputs": hash_inputs(inputs),
+            "output": output,
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        if duration is not None:
+            entry["duration"] = round(duration, 3)
+        self.state.merge(JOURNAL_KEY, {name: entry})
+
+    def run(self, name: str, inputs, fn: Callable[[], object]):
+        """
+        Return the recorded output if name already completed with inputs,
+        otherwise call fn(), record its result and return it. Nothing is
+        recorded when fn raises (or exits), so the next run retries it.
+        """
+        entry = self.get(name, inputs)
+        if entry is not None:
+            print(f"⏭️ [{name}] already completed at {entry.get('completed_at')}, skipping", flush=True)
+            return entry.get("output")
+        start = time.monotonic()
+        output = fn()
+        self.record(name, inputs, output, time.monotonic() - start)
+        return output
+
+    def invalidate(self, *names: str):
+        """Forget the given steps so they run again."""
+        self.state.merge(JOURNAL_KEY, {name: None for name in names})
+
+    def reset(self):
+        """Forget every step (e.g. after the sandbox was deallocated)."""
+        self.state.delete(JOURNAL_KEY)
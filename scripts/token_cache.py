@@ -0,0 +1,129 @@
+"""
+On-disk CSP JWT cache
+
+Stores JWTs per (CSP host, email, account id) together with the `exp`
+claim decoded from the token, so the next script in the setup chain can
+reuse a still valid token instead of repeating /v2/session/users/sign_in
+and /v2/session/account_switch. An account id of None is the admin's home
+account (the token returned by sign_in); that entry also keeps a salted
+hash of the password it was issued for, and is only reused for the same
+password. Keying on the host keeps stand-in, staging and production tokens
+apart. A token CSP rejects with 401 is dropped with discard().
+
+The cache is one JSON file shared by every script in the sandbox. Writes go
+through a temp file + os.replace and all access is serialized with flock on
+a sidecar .lock file, so concurrent hooks never see a half-written cache.
+
+Environment Variables:
+  CSP_TOKEN_CACHE   - Cache file path (default: csp_token_cache.json)
+  CSP_TOKEN_MIN_TTL - Seconds of validity a cached token must still have
+                      to be reused (default: 120)
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+from typing import Optional
+from urllib.parse import urlsplit
+from atomic_file import atomic_write, locked
+
+DEFAULT_CACHE_FILE = os.environ.get("CSP_TOKEN_CACHE", "csp_token_cache.json")
+DEFAULT_MIN_TTL = int(os.environ.get("CSP_TOKEN_MIN_TTL", "120"))
+
+
+def jwt_expiry(jwt: str) -> Optional[int]:
+    """Return the `exp` claim of a JWT (epoch seconds), or None if absent/undecodable."""
+    try:
+        payload = jwt.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return int(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError):
+        return None
+
+
+class TokenCache:
+    """
+    JSON file of {"<host>|<email>|<account_id>": {"jwt": ..., "exp": ...[, "salt": ..., "pw": ...]}}.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_FILE, min_ttl: int = DEFAULT_MIN_TTL):
+        self.path = path
+        self.min_ttl = min_ttl
+
+    @staticmethod
+    def _key(base_url: str, email: str, account_id: Optional[str]) -> str:
+        host = urlsplit(base_url).netloc or base_url
+        return f"{host}|{email}|{account_id or ''}"
+
+    @staticmethod
+    def _password_hash(salt: str, password: str) -> str:
+        return hashlib.sha256(f"{salt}|{password}".encode()).hexdigest()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, entries: dict):
+        atomic_write(self.path, json.dumps(entries), mode=0o600)
+
+    def get(self, base_url: str, email: str, account_id: Optional[str] = None,
+            password: Optional[str] = None) -> Optional[str]:
+        """
+        Return a cached JWT that is valid for at least min_ttl more seconds.
+        With password given, the entry must have been stored for that password.
+        """
+        with locked(self.path, exclusive=False):
+            entry = self._read().get(self._key(base_url, email, account_id))
+        if not entry or entry.get("exp") is None:
+            return None
+        if entry["exp"] - time.time() < self.min_ttl:
+            return None
+        if password is not None:
+            if "salt" not in entry or not hmac.compare_digest(
+                    entry.get("pw", ""), self._password_hash(entry["salt"], password)):
+                return None
+        return entry.get("jwt")
+
+    def put(self, base_url: str, email: str, account_id: Optional[str], jwt: str,
+            password: Optional[str] = None):
+        """Store a JWT; tokens without an `exp` claim are not cached."""
+        exp = jwt_expiry(jwt)
+        if exp is None:
+            return
+        entry = {"jwt": jwt, "exp": exp}
+        if password is not None:
+            entry["salt"] = secrets.token_hex(8)
+            entry["pw"] = self._password_hash(entry["salt"], password)
+        with locked(self.path):
+            entries = self._read()
+            now = time.time()
+            entries = {k: v for k, v in entries.items() if v.get("exp", 0) > now}
+            entries[self._key(base_url, email, account_id)] = entry
+            self._write(entries)
+
+    def invalidate(self, base_url: str, email: str, account_id: Optional[str] = None):
+        with locked(self.path):
+            entries = self._read()
+            if entries.pop(self._key(base_url, email, account_id), None) is not None:
+                self._write(entries)
+
+    def discard(self, jwt: str):
+        """Drop every entry holding jwt (e.g. after CSP answered 401 to it)."""
+        if not os.path.exists(self.path):
+            return
+        with locked(self.path):
+            entries = self._read()
+            kept = {k: v for k, v in entries.items() if v.get("jwt") != jwt}
+            if len(kept) != len(entries):
+                self._write(kept)
+
+
+default_cache = TokenCache()
@@ -0,0 +1,338 @@
+"""
+Lightweight lifecycle tracing
+
+Links the separate lifecycle processes (allocation, user provisioning,
+discovery deployment, cleanup) of one student into one trace.
+
+- Allocation calls start_trace(): a new trace ID is stored in lab state,
+  so it lands in trace_id.txt and as LAB_TRACE_ID in sandbox_env.sh next
+  to the other handoff files. Every later script picks it up from lab
+  state (or from LAB_TRACE_ID when sandbox_env.sh was sourced) when it
+  records its first span; importing this module touches no files.
+- Each process that records spans gets a root span named after the
+  script, covering its whole run; span("...") / @traced("...") add step
+  spans under the innermost open span of the calling thread.
+- Every HTTP request reported to http_metrics becomes a CLIENT span with
+  method, endpoint template, status, body sizes and resend count.
+- Finished spans are buffered and appended in batches of
+  LAB_TRACE_FLUSH_SPANS, each batch as one OTLP/JSON
+  ExportTraceServiceRequest line, to LAB_TRACE_FILE (the format the
+  OpenTelemetry Collector's file exporter writes and otlpjsonfile reads);
+  the rest and the root span are written at exit. Inside
+  output_to(path) spans go to another file instead, e.g. one per
+  benchmark iteration.
+
+Cleanup calls end_trace() once the sandbox is released, so the next
+allocation in the same directory starts a new trace.
+
+Usage:
+  import tracing
+  with tracing.span("wait_for_resources", timeout=300):
+      ...
+
+  @tracing.traced("csp.sign_in")
+  def sign_in(...): ...
+
+Environment Variables:
+  LAB_TRACE_FILE        - OTLP JSON lines output (default: lab_traces.jsonl)
+  LAB_TRACE_FLUSH_SPANS - Finished spans per written batch (default: 256)
+  LAB_TRACE_ID          - Trace ID to join when lab state has none
+  LAB_TRACING           - Set to 0 to disable span recording and export
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import secrets
+import threading
+import functools
+from contextlib import contextmanager
+from typing import List, Optional
+import http_metrics
+from atomic_file import locked
+from lab_state import LabState
+
+TRACE_FILE = os.environ.get("LAB_TRACE_FILE", "lab_traces.jsonl")
+FLUSH_SPANS = int(os.environ.get("LAB_TRACE_FLUSH_SPANS", "256"))
+ENABLED = os.environ.get("LAB_TRACING", "1") != "0"
+
+# OTLP enums
+KIND_INTERNAL, KIND_CLIENT = 1, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+SCOPE = {"name": "lab.tracing", "version": "1"}
+
+_local = threading.local()
+_lock = threading.RLock()
+# Finished spans not written yet (at most FLUSH_SPANS)
+_finished: List["Span"] = []
+_started = time.time()
+_trace_id: Optional[str] = None
+_provisional = False
+_trace_file: Optional[str] = None
+_root: Optional["Span"] = None
+
+
+def _new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def _persisted_trace_id() -> Optional[str]:
+    try:
+        return LabState().get_str("trace_id") or os.environ.get("LAB_TRACE_ID") or None
+    except (OSError, ValueError):
+        return os.environ.get("LAB_TRACE_ID") or None
+
+
+def _output_path() -> str:
+    global _trace_file
+    if _trace_file is None:
+        with _lock:
+            if _trace_file is None:
+                _trace_file = os.path.abspath(TRACE_FILE)
+    return _trace_file
+
+
+def trace_id() -> str:
+    """This process's trace ID, looked up in lab state on first use."""
+    global _trace_id, _provisional
+    if _trace_id is None:
+        with _lock:
+            if _trace_id is None:
+                # Resolve the output path now: scripts may chdir before exiting
+                _output_path()
+                persisted = _persisted_trace_id()
+                # Not part of a lab lifecycle (yet): spans still share one ID per process
+                _provisional = persisted is None
+                _trace_id = persisted or _new_trace_id()
+    return _trace_id
+
+
+def _attr(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    def __init__(self, name: str, parent_id: Optional[str], kind: int = KIND_INTERNAL,
+                 attributes: Optional[dict] = None, start: Optional[float] = None):
+        self.trace_id = trace_id()
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = int((start if start is not None else time.time()) * 1e9)
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_UNSET
+        self.message = ""
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None, end: Optional[float] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = int((end if end is not None else time.time()) * 1e9)
+        if error is not None:
+            self.status, self.message = STATUS_ERROR, f"{type(error).__name__}: {error}"
+        elif self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+        if self is not _root:
+            with _lock:
+                _finished.append(self)
+                full = len(_finished) >= FLUSH_SPANS
+            if full:
+                flush()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_attr(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, **({"message": self.message} if self.message else {})},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+SCRIPT = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+
+
+def _root_span() -> Optional[Span]:
+    """The script's root span, started (back-dated to import) with the first span."""
+    global _root
+    if _root is None and ENABLED:
+        with _lock:
+            if _root is None:
+                _root = Span(SCRIPT, None, attributes={"lab.script": SCRIPT}, start=_started)
+    return _root
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_span_id() -> Optional[str]:
+    stack = _stack()
+    if stack:
+        return stack[-1].span_id
+    root = _root_span()
+    return root.span_id if root else None
+
+
+def _is_error(e: BaseException) -> bool:
+    return not (isinstance(e, SystemExit) and e.code in (None, 0))
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span; exceptions mark it failed."""
+    if not ENABLED:
+        yield None
+        return
+    s = Span(name, current_span_id(), attributes=attributes)
+    stack = _stack()
+    stack.append(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.end(error=e if _is_error(e) else None)
+        raise
+    finally:
+        stack.pop()
+        s.end()
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def start_trace() -> str:
+    """Begin (or, on a retried allocation, rejoin) this student's trace and persist its ID."""
+    global _trace_id, _provisional
+    state = LabState()
+    existing = state.get_str("trace_id")
+    new_id = existing or _new_trace_id()
+    if not existing:
+        state.update(trace_id=new_id)
+    with _lock:
+        old_id = trace_id()
+        if _provisional:
+            # Spans recorded before the ID was known and not yet written move into the trace
+            for s in _finished + ([_root] if _root else []) + _stack():
+                if s.trace_id == old_id:
+                    s.trace_id = new_id
+        _trace_id, _provisional = new_id, False
+    return new_id
+
+
+def end_trace():
+    """Forget the persisted trace ID; spans of this process keep it."""
+    LabState().delete("trace_id")
+
+
+def reset_trace():
+    """Forget this process's trace ID; the next span looks it up again (or starts a provisional one)."""
+    global _trace_id, _provisional
+    with _lock:
+        _trace_id, _provisional = None, False
+
+
+def _http_span(obs: dict):
+    status = obs["status"]
+    s = Span(f"{obs['method']} {obs['endpoint']}", current_span_id(), kind=KIND_CLIENT, start=obs["started"],
+             attributes={
+                 "http.request.method": obs["method"],
+                 "url.template": obs["endpoint"],
+                 "server.address": obs["service"],
+                 "http.response.status_code": int(status) if status.isdigit() else None,
+                 "http.request.body.size": obs["bytes_out"],
+                 "http.response.body.size": obs["bytes_in"],
+                 "http.request.resend_count": obs["attempt"] - 1 or None,
+             })
+    if status == "error" or (status.isdigit() and int(status) >= 400):
+        s.status, s.message = STATUS_ERROR, f"HTTP {status}"
+    s.end(end=obs["started"] + obs["seconds"])
+
+
+def _write(spans: List[Span], path: str):
+    resource = {"attributes": [
+        _attr("service.name", "instruqt-lab"),
+        _attr("lab.script", SCRIPT),
+        _attr("lab.participant", os.environ.get("INSTRUQT_PARTICIPANT_ID", "")),
+        _attr("process.pid", os.getpid()),
+    ]}
+    line = json.dumps({"resourceSpans": [{
+        "resource": resource,
+        "scopeSpans": [{"scope": SCOPE, "spans": [s.to_otlp() for s in spans]}],
+    }]})
+    try:
+        with locked(path):
+            with open(path, "a") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write trace spans to {path}: {e}", flush=True)
+
+
+def flush(path: Optional[str] = None):
+    """Append the finished spans not written yet to path as one OTLP/JSON line."""
+    with _lock:
+        spans = list(_finished)
+        _finished.clear()
+    if spans:
+        _write(spans, path or _output_path())
+
+
+def export(path: Optional[str] = None):
+    """Close the root span and write every remaining span of this process."""
+    if _root and _root.end_ns is None:
+        _root.end()
+        with _lock:
+            _finished.append(_root)
+    flush(path)
+
+
+@contextmanager
+def output_to(path: str):
+    """Write spans finished inside the block to path instead."""
+    global _trace_file
+    previous = _output_path()
+    flush(previous)
+    _trace_file = os.path.abspath(path)
+    try:
+        yield
+    finally:
+        flush(_trace_file)
+        _trace_file = previous
+
+
+if ENABLED:
+    http_metrics.add_listener(_http_span)
+    atexit.register(export)
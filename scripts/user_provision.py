@@ -15,15 +15,15 @@ Usage in Instruqt (setup-sandbox script, AFTER allocation):
 Environment Variables:
   INFOBLOX_EMAIL    - Required. Admin email for CSP JWT auth.
   INFOBLOX_PASSWORD - Required. Admin password for CSP JWT auth.
-  CSP_URL           - CSP base URL (default: csp.infoblox.com)
+  CSP_URL           - CSP host or base URL (default: csp.infoblox.com, see csp_client.base_url)
   USER_DOMAIN       - Domain for user email (default: infoblox.lab)
 
-Input Files (from allocation_broker_subtenant.py):
+Input (lab_state.json or legacy files, from allocation_broker_subtenant.py):
   sandbox_id.txt        - Account UUID for account switching
   sandbox_name.txt      - Used to construct username
   sfdc_account_id.txt   - SFDC ID (saved to credentials)
 
-Output Files:
+Output (lab_state.json, plus legacy files):
   user_email.txt        - Generated login email
   user_password.txt     - Generated password
   user_id.txt           - CSP user ID (for cleanup/deletion)
@@ -32,10 +32,16 @@ Output Files:
 
 import os
 import sys
-import time
 import random
 import string
 import requests
+import csp_client
+import tracing
+from csp_client import bearer_headers, get_session
+from csp_query import Query, eq
+from lab_state import LabState, MissingStateError
+from retry_policy import policy
+from step_journal import StepJournal
 
 
 def generate_password(length=16):
@@ -53,42 +59,36 @@ def generate_password(length=16):
     return "".join(password)
 
 
-def read_file(filename):
-    """Read a single-line txt file, exit if missing."""
+def read_state(state, key):
+    """Read a value from the lab state store, exit if missing."""
     try:
-        with open(filename, "r") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        print(f"❌ {filename} not found. Run allocation_broker_subtenant.py first.", flush=True)
+        return state.require(key)
+    except MissingStateError as e:
+        print(f"❌ {e}. Run allocation_broker_subtenant.py first.", flush=True)
         sys.exit(1)
 
 
 def authenticate(base_url, email, password):
-    """Authenticate with CSP and return JWT headers."""
-    resp = requests.post(
-        f"{base_url}/v2/session/users/sign_in",
-        json={"email": email, "password": password}
-    )
-    resp.raise_for_status()
-    jwt = resp.json()["jwt"]
-    return {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+    """Authenticate with CSP and return JWT headers (reuses a cached login)."""
+    return bearer_headers(csp_client.sign_in(base_url, email, password))
 
 
-def switch_account(base_url, headers, account_id):
-    """Switch to sandbox account and return new JWT headers."""
-    resp = requests.post(
-        f"{base_url}/v2/session/account_switch",
-        headers=headers,
-        json={"id": f"identity/accounts/{account_id}"}
-    )
-    resp.raise_for_status()
-    jwt = resp.json()["jwt"]
-    return {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+def switch_account(base_url, headers, account_id, email=None, probe_path="/v2/groups"):
+    """Switch to sandbox account and return new JWT headers.
+
+    With email set, a still-valid cached JWT for the account is reused.
+    A fresh switch returns once probe_path accepts the new JWT.
+    """
+    jwt = headers["Authorization"].split(" ", 1)[1]
+    scoped = csp_client.switch_account(base_url, jwt, account_id, email=email, probe_path=probe_path)
+    return bearer_headers(scoped)
 
 
+@tracing.traced("csp.groups")
 def get_groups(base_url, headers):
     """Fetch user and admin group IDs."""
-    resp = requests.get(f"{base_url}/v2/groups", headers=headers)
+    query = Query().any(eq("name", "user"), eq("name", "act_admin")).fields("id", "name")
+    resp = get_session().get(f"{base_url}/v2/groups", headers=headers, params=query.params())
     resp.raise_for_status()
     groups = resp.json().get("results", [])
     user_gid = next((g["id"] for g in groups if g.get("name") == "user"), None)
@@ -98,10 +98,8 @@ def get_groups(base_url, headers):
 
 def get_user_id_by_email(base_url, headers, email):
     """Look up existing user by email, return user_id or None."""
-    resp = requests.get(
-        f"{base_url}/v2/users?_filter=email==\"{email}\"",
-        headers=headers
-    )
+    query = Query().eq("email", email).fields("id").limit(1)
+    resp = get_session().get(f"{base_url}/v2/users", headers=headers, params=query.params())
     if resp.status_code == 200:
         results = resp.json().get("results", [])
         if results:
@@ -110,8 +108,9 @@ def get_user_id_by_email(base_url, headers, email):
     return None
 
 
+@tracing.traced("csp.user_create")
 def create_user(base_url, headers, name, email, user_gid, admin_gid):
-    """Create user with retries. Returns user_id or None."""
+    """Create user, retrying only 429/5xx and connection errors. Returns user_id or None."""
     payload = {
         "name": name,
         "email": email,
@@ -119,25 +118,26 @@ def create_user(base_url, headers, name, email, user_gid, admin_gid):
         "group_ids": [user_gid, admin_gid]
     }
 
-    for attempt in range(5):
-        try:
-            resp = requests.post(f"{base_url}/v2/users", headers=headers, json=payload)
-            if resp.status_code == 409:
-                print("  ⚠️ User already exists, looking up ID...", flush=True)
-                return get_user_id_by_email(base_url, headers, email)
-            resp.raise_for_status()
-            uid = resp.json().get("result", {}).get("id", "")
-            return uid.split("/")[-1] if "/" in uid else uid
-        except requests.RequestException as e:
-            print(f"  ⚠️ Attempt {attempt + 1} failed: {e}", flush=True)
-            time.sleep((2 ** attempt) + random.random())
-
-    return None
-
-
+    retry = policy("csp.users.create")
+    try:
+        resp = retry.call(lambda: get_session().post(f"{base_url}/v2/users", headers=headers, json=payload))
+    except requests.RequestException as e:
+        print(f"  ⚠️ Create failed after {retry.attempts} attempt(s): {e}", flush=True)
+        return None
+    if resp.status_code == 409:
+        print("  ⚠️ User already exists, looking up ID...", flush=True)
+        return get_user_id_by_email(base_url, headers, email)
+    if resp.status_code >= 400:
+        print(f"  ⚠️ Create failed after {retry.attempts} attempt(s): HTTP {resp.status_code} {resp.text[:200]}", flush=True)
+        return None
+    uid = resp.json().get("result", {}).get("id", "")
+    return uid.split("/")[-1] if "/" in uid else uid
+
+
+@tracing.traced("csp.password_set")
 def set_password(base_url, headers, user_id, password):
     """Set user password. Returns True on success."""
-    resp = requests.post(
+    resp = get_session().post(
         f"{base_url}/v2/users/{user_id}/password",
         headers=headers,
         json={"new_password": password}
@@ -145,12 +145,70 @@ def set_password(base_url, headers, user_id, password):
     return resp.status_code == 200
 
 
+@tracing.traced("csp.user_delete")
 def delete_user(base_url, headers, user_id):
     """Delete user by ID. Returns True on success."""
-    resp = requests.delete(f"{base_url}/v2/users/{user_id}", headers=headers)
+    resp = get_session().delete(f"{base_url}/v2/users/{user_id}", headers=headers)
     return resp.status_code in (200, 204)
 
 
+@tracing.traced("save_credentials")
+def save_credentials(user_email, user_password, user_id, sfdc_account_id):
+    """Store the user in lab state (+ user_*.txt) and write user_credentials.sh."""
+    state = LabState()
+    state.update(
+        user_email=user_email,
+        user_password=user_password,
+        user_id=user_id,
+        sfdc_account_id=sfdc_account_id,
+    )
+    state.export_user_credentials("user_provision.py")
+
+
+def provision_user(base_url, headers, participant_id, user_email, user_password):
+    """Groups lookup, user create and password set. Returns user_id; raises RuntimeError on failure."""
+    # Step 3: Get groups
+    print("👥 Fetching groups...", flush=True)
+    user_gid, admin_gid = get_groups(base_url, headers)
+    if not user_gid or not admin_gid:
+        raise RuntimeError("Could not find required groups")
+    print("✅ Groups found", flush=True)
+
+    # Step 4: Create user
+    print(f"👤 Creating user {user_email}...", flush=True)
+    user_id = create_user(base_url, headers, participant_id, user_email, user_gid, admin_gid)
+    if not user_id:
+        raise RuntimeError("User creation failed")
+    print(f"✅ User created (ID: {user_id})", flush=True)
+
+    # Step 5: Set password
+    print("🔑 Setting password...", flush=True)
+    if not set_password(base_url, headers, user_id, user_password):
+        raise RuntimeError("Password set failed")
+    print("✅ Password set", flush=True)
+    return user_id
+
+
+def journal_inputs(account_id, user_email):
+    """Inputs that identify a provisioned user in the step journal."""
+    return {"account": account_id, "email": user_email}
+
+
+def print_summary(sandbox_name, sfdc_account_id, user_email, user_password, user_id):
+    print(f"\n{'='*60}", flush=True)
+    print("🎉 User Provisioning Complete!", flush=True)
+    print(f"   Sandbox:  {sandbox_name}", flush=True)
+    print(f"   SFDC ID:  {sfdc_account_id}", flush=True)
+    print(f"   Email:    {user_email}", flush=True)
+    print(f"   Password: {user_password}", flush=True)
+    print(f"   User ID:  {user_id}", flush=True)
+    print(f"\n   Login at: {csp_client.base_url()}", flush=True)
+    print(f"\n   Instruqt:", flush=True)
+    print(f"     set-var CSP_USER_EMAIL '{user_email}'", flush=True)
+    print(f"     set-var CSP_USER_PASSWORD '{user_password}'", flush=True)
+    print(f"{'='*60}", flush=True)
+
+
 # ==============================================================
 # Main
 # ==============================================================
@@ -162,7 +220,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # --- Config ---
-    CSP_URL = f"https://{os.environ.get('CSP_URL', 'csp.infoblox.com')}"
+    CSP_URL = csp_client.base_url()
     INFOBLOX_EMAIL = os.environ.get("INFOBLOX_EMAIL")
     INFOBLOX_PASSWORD = os.environ.get("INFOBLOX_PASSWORD")
     USER_DOMAIN = os.environ.get("USER_DOMAIN", "infoblox.lab")
@@ -171,10 +229,11 @@ if __name__ == "__main__":
         print("❌ Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD", flush=True)
         sys.exit(1)
 
-    # --- Read allocation files + env vars ---
-    sandbox_id = read_file("sandbox_id.txt")
-    sandbox_name = read_file("sandbox_name.txt")
-    sfdc_account_id = read_file("sfdc_account_id.txt")
+    # --- Read allocation state + env vars ---
+    state = LabState()
+    sandbox_id = read_state(state, "sandbox_id")
+    sandbox_name = read_state(state, "sandbox_name")
+    sfdc_account_id = state.get_str("sfdc_account_id", "")
 
     PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
     if not PARTICIPANT_ID:
@@ -190,6 +249,15 @@ if __name__ == "__main__":
     print(f"📋 User:     {user_email}", flush=True)
     print()
 
+    # --- A retried setup script skips a user it already provisioned ---
+    journal = StepJournal(state)
+    done = None if args.delete else journal.get("user", journal_inputs(sandbox_id, user_email))
+    if done:
+        print(f"⏭️ User already provisioned at {done.get('completed_at')}, skipping", flush=True)
+        user = done["output"]
+        print_summary(sandbox_name, sfdc_account_id, user["email"], user["password"], user["id"])
+        sys.exit(0)
+
     # --- Step 1: Authenticate ---
     print("🔐 Authenticating with CSP...", flush=True)
     headers = authenticate(CSP_URL, INFOBLOX_EMAIL, INFOBLOX_PASSWORD)
@@ -197,74 +265,33 @@ if __name__ == "__main__":
 
     # --- Step 2: Switch to sandbox account ---
     print(f"🔁 Switching to sandbox {sandbox_id}...", flush=True)
-    headers = switch_account(CSP_URL, headers, sandbox_id)
+    headers = switch_account(CSP_URL, headers, sandbox_id, email=INFOBLOX_EMAIL)
     print("✅ Switched", flush=True)
-    time.sleep(2)
 
     # --- DELETE mode ---
     if args.delete:
-        user_id = read_file("user_id.txt")
+        user_id = read_state(state, "user_id")
         print(f"\n🗑️ Deleting user {user_email} (ID: {user_id})...", flush=True)
         if delete_user(CSP_URL, headers, user_id):
             print("✅ User deleted", flush=True)
+            state.delete("user_id", "user_email", "user_password")
+            journal.invalidate("user")
         else:
             print("❌ Delete failed", flush=True)
             sys.exit(1)
         sys.exit(0)
 
     # --- CREATE mode ---
-    # Step 3: Get groups
-    print("👥 Fetching groups...", flush=True)
-    user_gid, admin_gid = get_groups(CSP_URL, headers)
-    if not user_gid or not admin_gid:
-        print("❌ Could not find required groups", flush=True)
-        sys.exit(1)
-    print("✅ Groups found", flush=True)
-
-    # Step 4: Create user
-    print(f"👤 Creating user {user_email}...", flush=True)
-    user_id = create_user(CSP_URL, headers, PARTICIPANT_ID, user_email, user_gid, admin_gid)
-    if not user_id:
-        print("❌ User creation failed", flush=True)
-        sys.exit(1)
-    print(f"✅ User created (ID: {user_id})", flush=True)
-
-    # Step 5: Set password
-    print("🔑 Setting password...", flush=True)
-    if set_password(CSP_URL, headers, user_id, user_password):
-        print("✅ Password set", flush=True)
-    else:
-        print("❌ Password set failed", flush=True)
+    try:
+        user_id = provision_user(CSP_URL, headers, PARTICIPANT_ID, user_email, user_password)
+    except RuntimeError as e:
+        print(f"❌ {e}", flush=True)
         sys.exit(1)
 
     # --- Save credentials ---
-    files = {
-        "user_email.txt": user_email,
-        "user_password.txt": user_password,
-        "user_id.txt": user_id,
-    }
-    for filename, value in files.items():
-        with open(filename, "w") as f:
-            f.write(value)
-
-    with open("user_credentials.sh", "w") as f:
-        f.write("#!/bin/bash\n")
-        f.write("# Auto-generated by user_provision.py\n")
-        f.write(f"export CSP_USER_EMAIL='{user_email}'\n")
-        f.write(f"export CSP_USER_PASSWORD='{user_password}'\n")
-        f.write(f"export CSP_USER_ID='{user_id}'\n")
-        f.write(f"export SFDC_ACCOUNT_ID='{sfdc_account_id}'\n")
+    save_credentials(user_email, user_password, user_id, sfdc_account_id)
+    journal.record("user", journal_inputs(sandbox_id, user_email),
+                   {"email": user_email, "password": user_password, "id": user_id})
 
     # --- Summary ---
-    print(f"\n{'='*60}", flush=True)
-    print("🎉 User Provisioning Complete!", flush=True)
-    print(f"   Sandbox:  {sandbox_name}", flush=True)
-    print(f"   SFDC ID:  {sfdc_account_id}", flush=True)
-    print(f"   Email:    {user_email}", flush=True)
-    print(f"   Password: {user_password}", flush=True)
-    print(f"   User ID:  {user_id}", flush=True)
-    print(f"\n   Login at: https://csp.infoblox.com", flush=True)
-    print(f"\n   Instruqt:", flush=True)
-    print(f"     set-var CSP_USER_EMAIL '{user_email}'", flush=True)
-    print(f"     set-var CSP_USER_PASSWORD '{user_password}'", flush=True)
-    print(f"{'='*60}", flush=True)
+    print_summary(sandbox_name, sfdc_account_id, user_email, user_password, user_id)
@@ -0,0 +1,141 @@
+"""
+Concurrent readiness waiter
+
+Polls several "is it there yet?" conditions at the same time under one
+shared deadline, instead of one loop per resource with its own timeout run
+back to back. wait_all() returns as soon as every condition is satisfied,
+so the total wait is the slowest condition, not the sum.
+
+Each condition has its own backoff. A 429 is not counted as a failed check:
+the condition waits for Retry-After (or doubles its interval) and tries
+again. Other HTTP errors and request exceptions are logged and retried.
+
+Usage:
+  cred = Condition("cloud credential",
+                   request=lambda: session.get(url, headers=headers),
+                   check=lambda resp: first_gcp_id(resp.json()))
+  ready = Condition("discovery API",
+                    request=lambda: session.get(url2, headers=headers),
+                    check=lambda resp: True)
+  results = wait_all([cred, ready], timeout=300)
+  results["cloud credential"]
+
+wait_each() polls the same way but never raises: it returns a WaitResult
+per condition (value, seconds, polls, done_at), so callers tracking many
+resources can report how long each one took and which ones timed out.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from admission import parse_retry_after
+
+
+class WaitTimeout(RuntimeError):
+    """Not every condition was satisfied before the shared deadline."""
+
+
+class Condition:
+    """
+    request() performs one poll and returns a requests.Response.
+    check(resp) is called for responses with status < 400 (or listed in
+    check_statuses, e.g. 404 when waiting for something to go away) and
+    returns the condition's value once satisfied, or None to keep polling.
+    """
+
+    def __init__(self, name: str, request: Callable[[], object], check: Callable[[object], object],
+                 interval: float = 3.0, factor: float = 1.7, max_interval: float = 20.0,
+                 check_statuses=(), verbose: bool = True):
+        self.name = name
+        self.request = request
+        self.check = check
+        self.interval = interval
+        self.factor = factor
+        self.max_interval = max_interval
+        self.check_statuses = set(check_statuses)
+        self.verbose = verbose
+
+
+class WaitResult:
+    def __init__(self, value, seconds: float, polls: int, done_at: Optional[float]):
+        self.value = value
+        self.seconds = seconds
+        self.polls = polls
+        self.done_at = done_at  # time.monotonic() when satisfied, None on timeout
+
+    @property
+    def done(self) -> bool:
+        return self.done_at is not None
+
+
+def _poll(cond: Condition, deadline: float, stop: threading.Event) -> WaitResult:
+    interval = cond.interval
+    polls = 0
+    start = time.monotonic()
+    while not stop.is_set():
+        polls += 1
+        delay = interval
+        try:
+            resp = cond.request()
+            if resp.status_code == 429:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                delay = retry_after if retry_after is not None else min(interval * 2, cond.max_interval)
+            elif resp.status_code < 400 or resp.status_code in cond.check_statuses:
+                value = cond.check(resp)
+                if value is not None:
+                    done_at = time.monotonic()
+                    if cond.verbose:
+                        print(f"✅ {cond.name} ready after {done_at - start:.1f}s ({polls} poll(s))", flush=True)
+                    return WaitResult(value, done_at - start, polls, done_at)
+            else:
+                print(f"⚠️ {cond.name}: HTTP {resp.status_code}, retrying", flush=True)
+        except Exception as e:
+            print(f"⚠️ {cond.name}: retry due to: {e}", flush=True)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        stop.wait(min(delay, remaining))
+        interval = min(interval * cond.factor, cond.max_interval)
+    return WaitResult(None, time.monotonic() - start, polls, None)
+
+
+def wait_each(conditions: List[Condition], timeout: float) -> Dict[str, WaitResult]:
+    """
+    Poll all conditions concurrently under one deadline; returns
+    {name: WaitResult} with timed-out conditions marked not done.
+    """
+    if not conditions:
+        return {}
+    deadline = time.monotonic() + timeout
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(conditions)) as pool:
+        futures = {c.name: pool.submit(_poll, c, deadline, stop) for c in conditions}
+        results = {}
+        try:
+            for name, fut in futures.items():
+                results[name] = fut.result()
+        finally:
+            stop.set()
+    return results
+
+
+def wait_all(conditions: List[Condition], timeout: float) -> Dict[str, object]:
+    """
+    Poll all conditions concurrently; returns {name: value} once every one
+    is satisfied. Raises WaitTimeout naming the conditions still pending
+    when the shared deadline passes.
+    """
+    names = ", ".join(c.name for c in conditions)
+    print(f"⏳ Waiting for: {names} (up to {timeout:.0f}s)", flush=True)
+    results = wait_each(conditions, timeout)
+    missing = [name for name, r in results.items() if not r.done]
+    if missing:
+        raise WaitTimeout(f"❌ Not ready after {timeout:.0f}s: {', '.join(missing)}")
+    return {name: r.value for name, r in results.items()}
+
+
+def wait_one(condition: Condition, timeout: float):
+    """wait_all for a single condition; returns its value."""
+    return wait_all([condition], timeout)[condition.name]
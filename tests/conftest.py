@@ -0,0 +1,65 @@
+"""
+Shared test setup
+
+The lab scripts are a flat directory of modules run with scripts/ as the
+working directory, not an installed package, so it goes on sys.path here.
+Several modules read their file locations from the environment at import
+and some write handoff files to the current directory, so both point at a
+scratch directory before any test module imports them.
+
+Run from the repository root: python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS)
+
+SCRATCH = tempfile.mkdtemp(prefix="lab_tests_")
+os.environ.update({
+    "LAB_TRACING": "0",
+    "HTTP_METRICS": "0",
+    "LAB_STATE_FILE": os.path.join(SCRATCH, "lab_state.json"),
+    "CSP_TOKEN_CACHE": os.path.join(SCRATCH, "csp_token_cache.json"),
+    "ADMISSION_STATS_FILE": os.path.join(SCRATCH, "admission_stats.json"),
+    "CIRCUIT_BREAKER_FILE": os.path.join(SCRATCH, "circuit_breakers.json"),
+})
+os.chdir(SCRATCH)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data if data is not None else {}
+        self.headers = headers or {}
+        self.text = str(self._data)
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+@pytest.fixture(scope="module")
+def csp():
+    """A local CSP stand-in on a free port: (CSPStandin, base URL)."""
+    from csp_standin import CSPStandin
+    from standin import serve
+    standin = CSPStandin(views=250)
+    server, url = serve(standin.app)
+    yield standin, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test inside its own empty directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
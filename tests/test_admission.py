@@ -0,0 +1,35 @@
+import pytest
+
+from admission import BROKER_CONTENTION, CSP_CONTENTION, Admission
+from conftest import FakeResponse
+
+
+def test_jittered_backoff_is_capped_exponential():
+    gate = Admission("test", base=1.0, cap=5.0)
+    for attempt, bound in ((0, 1.0), (1, 2.0), (2, 4.0), (6, 5.0)):
+        assert all(0 <= gate.delay(attempt) <= bound for _ in range(50))
+
+
+def test_retry_after_wins_over_jitter():
+    gate = Admission("test", base=100.0)
+    assert gate.delay(5, FakeResponse(503, headers={"Retry-After": "2"})) == 2.0
+
+
+def test_backoff_respects_max_delay(monkeypatch):
+    slept = []
+    monkeypatch.setattr("admission.time.sleep", slept.append)
+    gate = Admission("test")
+    assert gate.backoff(0, FakeResponse(429, headers={"Retry-After": "9"}), max_delay=3) == 3
+    assert slept == [3] and gate.waited == 3
+
+
+@pytest.mark.parametrize("status, contended", [(200, False), (404, False), (429, True), (503, True),
+                                               ("timeout", True)])
+def test_contention_signals(tmp_path, status, contended):
+    gate = Admission("test", stats_path=str(tmp_path / "stats.json"))
+    gate.observe(status)
+    assert (gate.attempts, gate.contended) == (1, int(contended))
+
+
+def test_broker_waf_403_is_contention():
+    assert 403 in BROKER_CONTENTION and 403 not in CSP_CONTENTION
@@ -0,0 +1,68 @@
+import threading
+
+import requests
+
+from bulk_delete import AIMDLimiter, BulkDeleter
+from conftest import FakeResponse
+
+
+class Backend:
+    """delete_fn answering each item's statuses in order (the last one repeats)."""
+
+    def __init__(self, plan):
+        self.plan = {item: list(statuses) for item, statuses in plan.items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.calls.append(item)
+            statuses = self.plan[item]
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if isinstance(status, Exception):
+            raise status
+        return FakeResponse(status)
+
+
+def deleter(backend, **kwargs):
+    d = BulkDeleter("view", backend, **kwargs)
+    d.gate.base = 0.0
+    return d
+
+
+def test_outcomes_per_item_in_input_order():
+    backend = Backend({"a": [204], "b": [202], "c": [404], "d": [400], "e": [429, 503, 204]})
+    d = deleter(backend)
+    results = d.run(["a", "b", "c", "d", "e"])
+    assert [(r.item, r.ok, r.attempts) for r in results] == [
+        ("a", True, 1), ("b", True, 1), ("c", True, 1), ("d", False, 1), ("e", True, 3)]
+    assert results[1].message.startswith("Accepted")
+    summary = d.summary(results)
+    assert (summary["deleted"], summary["accepted"], summary["already_gone"], summary["failed"]) == (2, 1, 1, 1)
+    assert summary["retries"] == 2
+
+
+def test_gives_up_on_persistent_contention_and_errors():
+    backend = Backend({"busy": [503], "down": [requests.ConnectionError("reset")]})
+    results = deleter(backend, max_attempts=3).run(["busy", "down"])
+    assert [(r.ok, r.attempts, r.status) for r in results] == [(False, 3, 503), (False, 3, "error")]
+    assert "Gave up" in results[0].message and "reset" in results[1].message
+
+
+def test_limiter_grows_after_a_clean_window_and_halves_once_per_burst():
+    limiter = AIMDLimiter(initial=4, maximum=6, cooldown=60)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(congested=False)
+    assert limiter.limit == 5
+    limiter.acquire()
+    limiter.release(congested=True)
+    limiter.acquire()
+    limiter.release(congested=True)
+    assert (limiter.limit, limiter.peak) == (2, 5)
+
+
+def test_report_json(workdir):
+    d = deleter(Backend({"a": [204]}))
+    d.print_report(d.run(["a"]), json_path=str(workdir / "report.json"))
+    assert '"deleted": 1' in (workdir / "report.json").read_text()
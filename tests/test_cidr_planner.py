@@ -0,0 +1,67 @@
+import pytest
+
+from cidr_planner import CIDRPlanner, PlanError, network
+
+BLOCKS = [
+    {"name": "GCP", "address": "10.0.0.0", "cidr": 16},
+    {"name": "AWS", "address": "10.1.0.0", "cidr": 16},
+]
+
+
+@pytest.fixture
+def plan():
+    return CIDRPlanner(BLOCKS)
+
+
+def test_overlapping_blocks_listed_together():
+    with pytest.raises(PlanError) as e:
+        CIDRPlanner(BLOCKS + [{"name": "dup", "address": "10.0.128.0", "cidr": 17},
+                              {"name": "bad", "address": "10.2.0.1", "cidr": 16}])
+    assert len(e.value.problems) == 2
+
+
+def test_child_is_placed_in_its_block(plan):
+    assert plan.add_child("a", network("10.1.2.0", 24)) == "AWS"
+    with pytest.raises(PlanError, match="overlaps|inside|contains"):
+        plan.add_child("b", network("10.1.2.0", 23))
+    with pytest.raises(PlanError, match="not inside any federated block"):
+        plan.add_child("c", network("192.168.0.0", 24))
+    with pytest.raises(PlanError, match="is inside AWS, not GCP"):
+        plan.add_child("d", network("10.1.9.0", 24), parent="GCP")
+
+
+def test_subnets_nest_inside_an_address_block(plan):
+    assert plan.add_child("team", network("10.0.16.0", 20), "GCP", nested=True) == "GCP"
+    assert plan.add_child("s1", network("10.0.16.0", 24)) == "team"
+    assert plan.add_child("s2", network("10.0.17.0", 24), parent="team") == "team"
+    # The enclosing federated block is an accepted parent as well
+    assert plan.add_child("s3", network("10.0.18.0", 24), parent="GCP") == "team"
+    # Siblings outside the address block are unaffected
+    assert plan.add_child("s4", network("10.0.0.0", 24)) == "GCP"
+
+
+def test_nested_siblings_still_must_not_overlap(plan):
+    plan.add_child("team", network("10.0.16.0", 20), nested=True)
+    plan.add_child("s1", network("10.0.16.0", 24))
+    with pytest.raises(PlanError, match="inside s1"):
+        plan.add_child("s1a", network("10.0.16.0", 25))
+    with pytest.raises(PlanError, match="whole of block team"):
+        plan.add_child("all", network("10.0.16.0", 20))
+    with pytest.raises(PlanError, match="is inside GCP, not team"):
+        plan.add_child("out", network("10.0.64.0", 24), parent="team")
+
+
+def test_children_of_constructor_may_nest():
+    plan = CIDRPlanner(BLOCKS, [
+        {"name": "team", "address": "10.0.16.0", "cidr": 20, "type": "address_block"},
+        {"name": "s1", "address": "10.0.16.0", "cidr": 24, "parent": "team"},
+    ])
+    assert "team" in plan.nested
+
+
+def test_carve_skips_taken_subnets(plan):
+    plan.add_child("taken", network("10.0.1.0", 24))
+    rows = plan.carve("GCP", prefix=24, count=3, owner="s")
+    assert [r["address"] for r in rows] == ["10.0.0.0", "10.0.2.0", "10.0.3.0"]
+    with pytest.raises(PlanError, match="has room for only"):
+        plan.carve("AWS", prefix=17, count=3)
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from conftest import FakeResponse
+from retry_policy import RetryBudget, RetryPolicy
+
+
+def breaker(tmp_path, **kwargs):
+    return CircuitBreaker("backend", path=str(tmp_path / "breakers.json"), **kwargs)
+
+
+def test_success_resets_the_failure_count(tmp_path):
+    b = breaker(tmp_path, failure_threshold=2)
+    b.record_failure()
+    b.record_success()
+    b.record_failure()
+    assert b.state() == CLOSED
+
+
+def test_only_one_probe_while_half_open(tmp_path):
+    b = breaker(tmp_path, failure_threshold=1, reset_timeout=0.05)
+    b.record_failure()
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    time.sleep(0.06)
+    b.before_call()
+    assert b.state() == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker(tmp_path, failure_threshold=1, reset_timeout=60).before_call()
+
+
+def test_failed_probe_reopens(tmp_path):
+    b = breaker(tmp_path, failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        b.record_failure()
+    b.before_call()
+    b.record_failure()
+    assert b.state() == OPEN
+
+
+def test_retry_policy_stops_calling_an_open_backend(tmp_path):
+    path = str(tmp_path / "breakers.json")
+    retry = RetryPolicy("test", base=0.0, budget=RetryBudget(100), max_attempts=5)
+    retry.gate.stats_path = str(tmp_path / "admission.json")
+    retry.breaker = CircuitBreaker("backend", failure_threshold=2, reset_timeout=60, path=path)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        retry.call(lambda: calls.append(1) or FakeResponse(503))
+    assert len(calls) == 2
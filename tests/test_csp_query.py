@@ -0,0 +1,38 @@
+import pytest
+
+from csp_query import Query, any_of, contains, ends_with, eq, ne, quote, starts_with
+from csp_standin import compile_filter
+
+
+def test_quote_escapes_quotes_and_backslashes():
+    assert quote('a"b\\c') == '"a\\"b\\\\c"'
+    assert eq("name", 7) == 'name=="7"'
+    assert ne("name", "x") == 'name!="x"'
+
+
+def test_regex_helpers_escape_metacharacters_only():
+    assert starts_with("name", "AWS_Demo_Lab-1.") == 'name~"^AWS_Demo_Lab-1\\\\."'
+    assert contains("name", "ab", ignore_case=True) == 'name~"[aA][bB]"'
+
+
+def test_params():
+    q = Query().eq("email", "a@x").any(starts_with("name", "a"), starts_with("name", "b")).fields("id").limit(1)
+    assert q.params() == {
+        "_filter": '(email=="a@x") and ((name~"^a") or (name~"^b"))',
+        "_fields": "id",
+        "_limit": "1",
+    }
+    assert Query().params() == {}
+
+
+@pytest.mark.parametrize("expr,name,expected", [
+    (eq("name", 'with "quotes"'), 'with "quotes"', True),
+    (starts_with("name", "AWS_Demo_Lab_"), "AWS_Demo_Lab_abc", True),
+    (starts_with("name", "AWS_Demo_Lab_"), "AWS_Demo_abc", False),
+    (ends_with("name", ".lab"), "view.lab", True),
+    (ends_with("name", ".lab"), "viewxlab", False),
+    (contains("name", "demo", ignore_case=True), "My_DEMO_view", True),
+    (any_of(eq("name", "a"), eq("name", "b")), "b", True),
+])
+def test_filters_evaluate_as_the_standin_reads_them(expr, name, expected):
+    assert compile_filter(expr)({"name": name}) is expected
@@ -0,0 +1,64 @@
+import os
+import uuid
+
+import pytest
+
+import csp_client
+from deploy_ipam import InfobloxCSPClient
+from lab_state import LabState
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "config.yaml")
+
+
+@pytest.fixture
+def client(workdir):
+    return InfobloxCSPClient(CONFIG)
+
+
+@pytest.fixture
+def sandbox():
+    state = LabState()
+    state.update(sandbox_id="sb-42")
+    yield
+    state.delete("sandbox_id")
+
+
+def test_switch_account_reads_the_sandbox_from_lab_state(client, sandbox, monkeypatch):
+    seen = []
+    monkeypatch.setattr(csp_client, "switch_account",
+                        lambda base_url, jwt, sandbox_id, **kw: seen.append(sandbox_id) or "jwt-2")
+    client.jwt, client.headers = "jwt-1", {"Authorization": "Bearer jwt-1"}
+    client.switch_account()
+    assert seen == ["sb-42"]
+    assert client.headers["Authorization"] == "Bearer jwt-2"
+
+
+def test_plan_creates_everything_for_a_new_account(client):
+    actions = client.plan(None, [])
+    assert [(op, kind, name) for op, kind, name, _, _ in actions] == [
+        ("create", "realm", "ACME Corporation"), ("create", "block", "GCP"), ("create", "block", "On-Prem")]
+
+
+def test_plan_patches_only_changed_fields(client):
+    realm = dict(client._realm_payload(), id="realm/1")
+    blocks = [dict(client._block_payload(b, "realm/1"), id=f"block/{i}") for i, b in enumerate(client.blocks)]
+    assert client.plan(realm, blocks) == []
+
+    blocks[1]["comment"] = "edited in the portal"
+    blocks[0]["tags"] = {"owner": "someone-else"}
+    actions = client.plan(realm, blocks)
+    assert [(op, name, obj_id, sorted(payload)) for op, _, name, obj_id, payload in actions] == [
+        ("update", "GCP", "block/0", ["tags"]), ("update", "On-Prem", "block/1", ["comment"])]
+
+
+def test_reconcile_is_idempotent_against_the_standin(client, csp):
+    standin, url = csp
+    client.base_url = url
+    client.headers = csp_client.bearer_headers(standin.make_jwt(f"acct-{uuid.uuid4().hex[:8]}", "a@example.com"))
+    realm_id = client.reconcile(concurrency=2)
+    assert [b["name"] for b in client.output["blocks"]] == ["GCP", "On-Prem"]
+
+    realm, blocks = client.fetch_existing()
+    assert realm["id"] == realm_id and len(blocks) == 2
+    assert client.plan(realm, blocks) == []
+    assert client.reconcile() == realm_id
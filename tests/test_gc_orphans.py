@@ -0,0 +1,35 @@
+import pytest
+
+from gc_orphans import PROVIDER_PREFIXES, VIEW_PREFIXES, ActiveSetError, load_active, participant_of
+
+
+def test_active_file_ignores_comments_and_blanks(workdir):
+    (workdir / "active.txt").write_text("# exported from the broker\nstudent-1\n\n  student-2  \n")
+    assert load_active("active.txt") == {"student-1", "student-2"}
+
+
+def test_missing_active_file_refuses(workdir):
+    with pytest.raises(ActiveSetError, match="cannot read"):
+        load_active("absent.txt")
+
+
+@pytest.mark.parametrize("content", ["", "\n\n", "# only a comment\n"])
+def test_empty_active_set_refuses(workdir, content):
+    (workdir / "active.txt").write_text(content)
+    with pytest.raises(ActiveSetError, match="is empty"):
+        load_active("active.txt")
+
+
+@pytest.mark.parametrize("name,participant", [
+    ("AWS_Demo_Lab_abc123", "abc123"),
+    ("AWS_Demo_abc123", "abc123"),
+    ("Azure_Demo_Lab_x_y", "x_y"),
+    ("Customer_Provider", None),
+    ("", None),
+])
+def test_participant_of_provider_names(name, participant):
+    assert participant_of(name, PROVIDER_PREFIXES) == participant
+
+
+def test_every_view_prefix_is_a_provider_prefix():
+    assert set(VIEW_PREFIXES) <= set(PROVIDER_PREFIXES)
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import http_metrics
+
+
+@pytest.fixture
+def metrics(workdir, monkeypatch):
+    monkeypatch.setattr(http_metrics, "ENABLED", True)
+    monkeypatch.setattr(http_metrics, "_series", {})
+    monkeypatch.setattr(http_metrics, "_output", (str(workdir / "default.json"), str(workdir / "default.prom")))
+    return workdir
+
+
+def counts(path):
+    with open(path) as f:
+        return {tuple(json.loads(k))[2]: v["count"] for k, v in json.load(f)["series"].items()}
+
+
+def test_output_to_sends_the_block_to_other_files(metrics):
+    http_metrics.observe("csp", "GET", "/before", 200, 0.01)
+    with http_metrics.output_to(str(metrics / "it1.json"), str(metrics / "it1.prom")):
+        http_metrics.observe("csp", "GET", "/inside", 200, 0.01)
+    http_metrics.observe("csp", "GET", "/after", 200, 0.01)
+    http_metrics.export(*http_metrics._output_paths())
+
+    assert counts(metrics / "it1.json") == {"/inside": 1}
+    assert counts(metrics / "default.json") == {"/before": 1, "/after": 1}
+    assert (metrics / "it1.prom").exists()
+
+
+def test_endpoint_template_replaces_ids():
+    assert http_metrics.endpoint_template(
+        "https://csp/api/ddi/v1/dns/view/0f8e7a2c-1b3d-4e5f-9a8b-7c6d5e4f3a2b?_fields=id") == "/api/ddi/v1/dns/view/{id}"
+    assert http_metrics.endpoint_template("https://csp/v2/users/12345/password") == "/v2/users/{id}/password"
+    assert http_metrics.endpoint_template("https://csp/v2/groups") == "/v2/groups"
+
+
+def test_histograms_merge_across_exports(metrics):
+    json_path, prom_path = str(metrics / "m.json"), str(metrics / "m.prom")
+    http_metrics.observe("csp", "get", "/v2/groups", 200, 0.003, bytes_in=10)
+    with http_metrics.attempt(2):
+        http_metrics.observe("csp", "GET", "/v2/groups", 200, 0.2, bytes_in=5)
+    http_metrics.export(json_path, prom_path)
+    http_metrics.observe("csp", "GET", "/v2/groups", 200, 100.0)
+    http_metrics.export(json_path, prom_path)
+
+    with open(json_path) as f:
+        series = json.load(f)["series"][json.dumps(["csp", "GET", "/v2/groups", "200"])]
+    assert series["count"] == 3 and series["bytes_in"] == 15
+    assert series["attempts"] == {"1": 2, "2": 1}
+    assert series["buckets"][0] == 1 and series["buckets"][-1] == 1
+
+    prom = (metrics / "m.prom").read_text()
+    labels = 'service="csp",method="GET",endpoint="/v2/groups",status="200"'
+    assert f'lab_http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in prom
+    assert f'lab_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in prom
+    assert f'lab_http_requests_by_attempt_total{{{labels},attempt="2"}} 1' in prom
+
+
+def test_listeners_get_every_observation(monkeypatch):
+    seen = []
+    monkeypatch.setattr(http_metrics, "_listeners", [seen.append])
+    http_metrics.observe("csp", "POST", "/v2/users", "error", 0.5)
+    assert seen[0]["status"] == "error" and seen[0]["attempt"] == 1
@@ -0,0 +1,98 @@
+import csv
+import threading
+
+from cidr_planner import CIDRPlanner
+from conftest import FakeResponse
+from ipam_import import BulkImporter
+from retry_policy import default_budget
+
+FIELDS = ["name", "address", "cidr", "parent", "type"]
+
+
+class RecordingSession:
+    def __init__(self, status: int = 201, reject=()):
+        self.status = status
+        self.reject = set(reject)
+        self.posts = []
+        self._lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None):
+        with self._lock:
+            self.posts.append((url, json))
+        return FakeResponse(400 if json["name"] in self.reject else self.status, {"result": {}})
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(zip(FIELDS, row)))
+    return str(path)
+
+
+def importer(session, **kwargs):
+    planner = CIDRPlanner([{"name": "GCP", "address": "10.0.0.0", "cidr": 16}])
+    return BulkImporter(session, "http://csp", {}, "realm-1", "space-1", planner, **kwargs)
+
+
+def test_subnets_inside_imported_address_block_are_written(workdir):
+    source = write_csv(workdir / "rows.csv", [
+        ("team", "10.0.16.0", 20, "GCP", "address_block"),
+        ("s1", "10.0.16.0", 24, "team", "subnet"),
+        ("s2", "10.0.17.0", 24, "", ""),
+        ("clash", "10.0.17.0", 25, "", "subnet"),
+    ])
+    session = RecordingSession()
+    imp = importer(session, batch_size=2, concurrency=2)
+    counts = imp.run(source)
+
+    assert counts["created"] == 3
+    assert counts["invalid"] == 1
+    assert imp.errors[0]["name"] == "clash"
+    kinds = sorted(url.rsplit("/", 1)[-1] for url, _ in session.posts)
+    assert kinds == ["address_block", "subnet", "subnet"]
+
+
+def test_resume_skips_checkpointed_rows_but_still_plans_them(workdir):
+    rows = [("team", "10.0.16.0", 20, "", "address_block")] + \
+           [(f"s{i}", f"10.0.{16 + i}.0", 24, "team", "subnet") for i in range(4)]
+    source = write_csv(workdir / "rows.csv", rows)
+    checkpoint = str(workdir / "checkpoint.json")
+    importer(RecordingSession(), batch_size=3, checkpoint_file=checkpoint).run(source)
+
+    write_csv(workdir / "rows.csv", rows + [("s9", "10.0.25.0", 24, "team", "subnet")])
+    session = RecordingSession()
+    counts = importer(session, batch_size=3, checkpoint_file=checkpoint).run(source)
+    assert [body["name"] for _, body in session.posts] == ["s9"]
+    assert counts["created"] == 6
+
+
+def test_resume_writes_rows_that_failed_before_the_checkpoint(workdir):
+    rows = [(f"s{i}", f"10.0.{i}.0", 24, "", "") for i in range(5)]
+    source = write_csv(workdir / "rows.csv", rows)
+    checkpoint = str(workdir / "checkpoint.json")
+    first = importer(RecordingSession(reject={"s1"}), batch_size=3, checkpoint_file=checkpoint)
+    assert first.run(source)["failed"] == 1
+
+    session = RecordingSession()
+    again = importer(session, batch_size=3, checkpoint_file=checkpoint)
+    counts = again.run(source)
+    assert [body["name"] for _, body in session.posts] == ["s1"]
+    assert (counts["created"], counts["failed"], again.errors) == (5, 0, [])
+
+    session = RecordingSession()
+    importer(session, batch_size=3, checkpoint_file=checkpoint).run(source)
+    assert session.posts == []
+
+
+def test_existing_objects_count_as_done(workdir):
+    source = write_csv(workdir / "rows.csv", [("s1", "10.0.1.0", 24, "", "")])
+    counts = importer(RecordingSession(status=409)).run(source)
+    assert counts["exists"] == 1 and counts["failed"] == 0
+
+
+def test_one_policy_per_import_with_its_own_budget():
+    imp = importer(RecordingSession(), retry_budget=7)
+    assert imp.retry.budget is not default_budget
+    assert imp.retry.budget.total == 7
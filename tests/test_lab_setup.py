@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from lab_setup import Step, run_dag
+
+
+def test_steps_run_once_their_deps_are_done():
+    both_started = threading.Barrier(2, timeout=5)
+
+    def parallel(name):
+        def fn(results):
+            both_started.wait()  # deadlocks unless allocate and login overlap
+            return name
+        return fn
+
+    results = run_dag([
+        Step("allocate", parallel("alloc")),
+        Step("login", parallel("jwt")),
+        Step("switch", lambda r: f"{r['allocate']}+{r['login']}", deps=["allocate", "login"]),
+    ])
+    assert results["switch"] == "alloc+jwt"
+
+
+def test_first_failure_stops_scheduling():
+    ran = []
+
+    def fail(results):
+        raise RuntimeError("Could not find required groups")
+
+    with pytest.raises(RuntimeError, match="required groups"):
+        run_dag([Step("user", fail), Step("after", lambda r: ran.append(1), deps=["user"])])
+    assert ran == []
+
+
+def test_exiting_step_is_not_a_step_failure():
+    with pytest.raises(SystemExit):
+        run_dag([Step("user", lambda r: exit(3))])
+
+
+def test_unsatisfiable_dependencies():
+    with pytest.raises(RuntimeError, match="Unsatisfiable"):
+        run_dag([Step("switch", lambda r: None, deps=["missing"])])
@@ -0,0 +1,54 @@
+import pytest
+
+from lab_state import LabState, MissingStateError
+
+
+@pytest.fixture
+def state(workdir):
+    return LabState(str(workdir / "lab_state.json"))
+
+
+def test_updates_land_in_the_document_and_legacy_files(state, workdir):
+    state.update(sandbox_id="sb-1", provider_ids=["p1", "p2"])
+    again = LabState(state.path)
+    assert again.get_str("sandbox_id") == "sb-1"
+    assert again.get_list("provider_ids") == ["p1", "p2"]
+    assert (workdir / "sandbox_id.txt").read_text() == "sb-1"
+    assert (workdir / "provider_ids.txt").read_text() == "p1\np2\n"
+
+
+def test_reads_fall_back_to_legacy_files(state, workdir):
+    (workdir / "user_id.txt").write_text("u-7\n")
+    (workdir / "dns_view_ids.txt").write_text("v1\n\nv2\n")
+    assert state.require("user_id") == "u-7"
+    assert state.get_list("dns_view_ids") == ["v1", "v2"]
+
+
+def test_missing_or_empty_keys(state):
+    state.update(sandbox_name="")
+    assert state.get_str("sandbox_name", "default") == "default"
+    with pytest.raises(MissingStateError, match="sandbox_id.txt"):
+        state.require("sandbox_id")
+
+
+def test_delete_removes_the_key_and_its_legacy_file(state, workdir):
+    state.update(sandbox_id="sb-1", user_id="u-1")
+    state.delete("sandbox_id")
+    assert not (workdir / "sandbox_id.txt").exists()
+    assert LabState(state.path).as_dict() == {"user_id": "u-1"}
+
+
+def test_merge_keeps_other_writers_entries(state):
+    state.merge("steps", {"allocate": {"done": True}})
+    LabState(state.path).merge("steps", {"user": {"done": True}})
+    state.merge("steps", {"allocate": None})
+    assert state.get("steps") == {"user": {"done": True}}
+
+
+def test_shell_exports_skip_unset_keys(state, workdir):
+    state.update(sandbox_name="team-1", external_id="acct-9")
+    state.export_sandbox_env("test")
+    lines = (workdir / "sandbox_env.sh").read_text().splitlines()
+    assert "export STUDENT_TENANT=team-1" in lines
+    assert "export CSP_ACCOUNT_ID=acct-9" in lines
+    assert not any("BROKER_SANDBOX_ID" in line for line in lines)
@@ -0,0 +1,130 @@
+import pytest
+
+from conftest import FakeResponse
+from paginator import paginate, paginate_parallel
+
+
+class OffsetSession:
+    """Serves n items with _limit/_offset, never more than cap per page."""
+
+    def __init__(self, n: int, cap: int = 1000, total: bool = False):
+        self.n = n
+        self.cap = cap
+        self.total = total
+        self.calls = 0
+
+    def get(self, url, headers=None, params=None):
+        self.calls += 1
+        offset, limit = int(params["_offset"]), int(params["_limit"])
+        body = {"results": [{"id": i} for i in range(offset, min(self.n, offset + min(limit, self.cap)))]}
+        if self.total and params.get("_is_total_size_needed") == "true":
+            body["total_size"] = self.n
+        return FakeResponse(200, body)
+
+
+class IgnoresOffsetSession:
+    """A token-style API that ignores _offset and always serves the same page."""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+
+    def get(self, url, headers=None, params=None):
+        self.calls += 1
+        return FakeResponse(200, {"results": list(self.items)})
+
+
+class TokenSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.tokens = []
+
+    def get(self, url, headers=None, params=None):
+        token = params.get("_page_token")
+        self.tokens.append(token)
+        index = int(token) if token else 0
+        body = {"results": self.pages[index]}
+        if index + 1 < len(self.pages):
+            body["next_page_token"] = str(index + 1)
+        return FakeResponse(200, body)
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_offset_reads_every_page(prefetch):
+    session = OffsetSession(250)
+    items = list(paginate(session, "http://csp/x", page_size=100, prefetch=prefetch))
+    assert [i["id"] for i in items] == list(range(250))
+    assert session.calls == 3
+
+
+def test_server_page_cap_does_not_truncate_when_total_is_reported():
+    session = OffsetSession(250, cap=50, total=True)
+    items = list(paginate(session, "http://csp/x", page_size=100))
+    assert [i["id"] for i in items] == list(range(250))
+    assert session.calls == 5
+
+
+@pytest.mark.parametrize("total", [True, False])
+def test_single_page_collection_takes_one_request(total):
+    session = OffsetSession(30, total=total)
+    assert len(list(paginate(session, "http://csp/x", page_size=100))) == 30
+    assert session.calls == 1
+
+
+@pytest.mark.parametrize("page_size,calls", [(100, 1), (3, 2)])
+def test_server_ignoring_offset_is_read_once(page_size, calls):
+    session = IgnoresOffsetSession([{"id": "a"}, {"id": "b"}, {"id": "c"}])
+    items = list(paginate(session, "http://csp/x", page_size=page_size))
+    assert [i["id"] for i in items] == ["a", "b", "c"]
+    assert session.calls == calls
+
+
+def test_empty_collection():
+    session = OffsetSession(0)
+    assert list(paginate(session, "http://csp/x")) == []
+    assert session.calls == 1
+
+
+def test_total_size_stops_without_an_extra_request():
+    session = OffsetSession(200, total=True)
+    items = list(paginate(session, "http://csp/x", page_size=100))
+    assert len(items) == 200
+    assert session.calls == 2
+
+
+def test_page_token():
+    session = TokenSession([[{"id": 1}, {"id": 2}], [{"id": 3}], [{"id": 4}]])
+    assert [i["id"] for i in paginate(session, "http://csp/x")] == [1, 2, 3, 4]
+    assert session.tokens == [None, "1", "2"]
+
+
+def test_parallel_steps_by_capped_page_size():
+    session = OffsetSession(1234, cap=100, total=True)
+    items = list(paginate_parallel(session, "http://csp/x", page_size=500, concurrency=4))
+    assert [i["id"] for i in items] == list(range(1234))
+
+
+def test_parallel_falls_back_without_total():
+    session = OffsetSession(250)
+    items = list(paginate_parallel(session, "http://csp/x", page_size=100))
+    assert [i["id"] for i in items] == list(range(250))
+    assert session.calls == 3
+
+
+def test_parallel_token_fallback_does_not_refetch_the_first_page():
+    session = TokenSession([[{"id": 1}], [{"id": 2}]])
+    assert [i["id"] for i in paginate_parallel(session, "http://csp/x")] == [1, 2]
+    assert session.tokens == [None, "1"]
+
+
+def test_against_the_csp_standin(csp):
+    import csp_client
+    from paginator import collection_url
+    standin, url = csp
+    headers = csp_client.bearer_headers(standin.make_jwt("acct-1", "admin@example.com"))
+    serial = list(paginate(csp_client.get_session(), collection_url(url, "dns_view"), headers=headers,
+                           page_size=40))
+    parallel = list(paginate_parallel(csp_client.get_session(), collection_url(url, "dns_view"),
+                                      headers=headers, page_size=40))
+    assert len(serial) > 0
+    assert [v["id"] for v in parallel] == [v["id"] for v in serial]
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+import requests
+
+import admission
+from admission import Admission, parse_retry_after
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from conftest import FakeResponse
+from retry_policy import POLICIES, RetryBudget, RetryPolicy
+
+
+def responses(*items):
+    """fn for RetryPolicy.call that returns (or raises) items in order."""
+    items = list(items)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        item = items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return FakeResponse(item)
+    fn.calls = calls
+    return fn
+
+
+def fast_policy(tmp_path, **kwargs):
+    retry = RetryPolicy("test", base=0.0, budget=kwargs.pop("budget", RetryBudget(100)), **kwargs)
+    retry.gate.stats_path = str(tmp_path / "admission.json")
+    return retry
+
+
+def test_retries_contention_until_success(tmp_path):
+    fn = responses(503, 429, 200)
+    assert fast_policy(tmp_path).call(fn).status_code == 200
+    assert len(fn.calls) == 3
+
+
+def test_non_retryable_status_returns_at_once(tmp_path):
+    fn = responses(404, 200)
+    assert fast_policy(tmp_path).call(fn).status_code == 404
+    assert len(fn.calls) == 1
+
+
+@pytest.mark.parametrize("name", ["csp.users.create", "csp.users.delete", "csp.sandbox_create", "csp.sandbox_delete"])
+@pytest.mark.parametrize("status", [400, 409])
+def test_lab_script_policies_do_not_retry_client_errors(tmp_path, name, status):
+    settings = {k: v for k, v in POLICIES[name].items() if k not in ("base", "breaker")}
+    fn = responses(status, 201)
+    assert fast_policy(tmp_path, **settings).call(fn).status_code == status
+    assert len(fn.calls) == 1
+
+
+def test_gives_up_after_max_attempts_with_the_last_response(tmp_path):
+    fn = responses(503, 503, 503, 200)
+    assert fast_policy(tmp_path, max_attempts=3).call(fn).status_code == 503
+    assert len(fn.calls) == 3
+
+
+@pytest.mark.parametrize("max_attempts", [0, -1])
+def test_policy_needs_at_least_one_attempt(max_attempts):
+    with pytest.raises(ValueError, match="max_attempts"):
+        RetryPolicy("test", max_attempts=max_attempts)
+
+
+def test_connection_errors_are_reraised_when_out_of_attempts(tmp_path):
+    fn = responses(requests.ConnectionError("down"), requests.Timeout("slow"))
+    with pytest.raises(requests.Timeout):
+        fast_policy(tmp_path, max_attempts=2).call(fn)
+
+
+def test_shared_budget_caps_retries(tmp_path):
+    budget = RetryBudget(1)
+    first = responses(503, 200)
+    assert fast_policy(tmp_path, budget=budget).call(first).status_code == 200
+    second = responses(503, 200)
+    assert fast_policy(tmp_path, budget=budget).call(second).status_code == 503
+    assert budget.remaining == 0
+
+
+def test_open_breaker_fails_fast(tmp_path):
+    breaker = CircuitBreaker("backend", failure_threshold=2, reset_timeout=60, path=str(tmp_path / "breakers.json"))
+    breaker.record_failure()
+    assert breaker.state() == CLOSED
+    breaker.record_failure()
+    assert breaker.state() == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_half_opens_for_one_probe(tmp_path):
+    breaker = CircuitBreaker("backend", failure_threshold=1, reset_timeout=0, path=str(tmp_path / "b.json"))
+    breaker.record_failure()
+    breaker.before_call()
+    assert breaker.state() == HALF_OPEN
+    breaker.record_success()
+    assert breaker.state() == CLOSED
+
+
+def test_breaker_is_shared_through_the_state_file(tmp_path):
+    path = str(tmp_path / "b.json")
+    CircuitBreaker("backend", failure_threshold=1, path=path).record_failure()
+    with pytest.raises(CircuitOpenError):
+        CircuitBreaker("backend", failure_threshold=1, path=path).before_call()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_is_capped():
+    gate = Admission("test", cap=5.0)
+    assert gate.delay(0, FakeResponse(429, headers={"Retry-After": "120"})) == 5.0
+
+
+def test_admission_counts_merge_into_the_stats_file_at_export(tmp_path):
+    path = str(tmp_path / "stats.json")
+    for status in (200, 429, "timeout"):
+        Admission("gate", stats_path=path).observe(status)
+    assert not (tmp_path / "stats.json").exists()
+    assert "all runs: 2/3" in Admission("gate", stats_path=path).summary()
+
+    admission.export()
+    Admission("gate", stats_path=path).observe(503)
+    admission.export()
+    with open(path) as f:
+        entry = json.load(f)["gate"]
+    assert entry == {"attempts": 4, "contended": 3, "statuses": {"429": 1, "503": 1, "timeout": 1}}
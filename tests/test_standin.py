@@ -0,0 +1,64 @@
+import statistics
+import time
+
+import pytest
+import requests
+
+from standin import App, Latency, TokenBucket, serve
+
+
+@pytest.fixture
+def app_url():
+    app = App(seed=1)
+    app.route("GET", r"/ping", lambda req: (200, {"pong": req.arg("n")}))
+    app.route("POST", r"/echo", lambda req: (201, req.body, {"X-Seen": "1"}))
+    server, url = serve(app)
+    yield app, url
+    server.shutdown()
+    server.server_close()
+
+
+def test_routes_bodies_and_stats(app_url):
+    app, url = app_url
+    with requests.Session() as s:
+        assert s.get(f"{url}/ping?n=3").json() == {"pong": "3"}
+        r = s.post(f"{url}/echo", json={"a": 1})
+        assert (r.status_code, r.json(), r.headers["X-Seen"]) == (201, {"a": 1}, "1")
+        assert s.get(f"{url}/nope").status_code == 404
+        stats = s.get(f"{url}/_stats").json()
+    assert stats["GET /ping 200"] == 1 and stats["POST /echo 201"] == 1
+
+
+def test_keep_alive_requests_are_not_delayed(app_url):
+    _, url = app_url
+    timings = []
+    with requests.Session() as s:
+        s.get(f"{url}/ping")
+        for _ in range(20):
+            start = time.perf_counter()
+            s.get(f"{url}/ping")
+            timings.append(time.perf_counter() - start)
+    # Nagle + delayed ACK would put every response at ~40ms
+    assert statistics.median(timings) < 0.02
+
+
+def test_rate_limit_answers_with_retry_after():
+    app = App(rate=1, burst=1, retry_after=2)
+    app.route("GET", r"/x", lambda req: (200, {}))
+    assert app.dispatch("GET", "/x", {}, None)[0] == 200
+    status, _, headers = app.dispatch("GET", "/x", {}, None)
+    assert (status, headers) == (429, {"Retry-After": "2"})
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=100, burst=1)
+    assert bucket.allow() and not bucket.allow()
+    time.sleep(0.02)
+    assert bucket.allow()
+
+
+def test_latency_specs():
+    assert Latency("fixed:50").sample() == 0.05
+    assert 0.02 <= Latency("uniform:20,30").sample() <= 0.03
+    with pytest.raises(ValueError):
+        Latency("pareto:1")
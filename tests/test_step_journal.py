@@ -0,0 +1,41 @@
+import pytest
+
+from lab_state import LabState
+from step_journal import StepJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return StepJournal(LabState(str(tmp_path / "lab_state.json"), emit_legacy=False), disabled=False)
+
+
+def test_completed_step_is_skipped_with_the_same_inputs(journal):
+    calls = []
+    assert journal.run("allocate", {"participant": "p1"}, lambda: calls.append(1) or {"id": "a"}) == {"id": "a"}
+    assert journal.run("allocate", {"participant": "p1"}, lambda: calls.append(1) or {"id": "b"}) == {"id": "a"}
+    assert len(calls) == 1
+
+
+def test_changed_inputs_run_again(journal):
+    journal.run("allocate", {"participant": "p1"}, lambda: 1)
+    assert journal.run("allocate", {"participant": "p2"}, lambda: 2) == 2
+    assert not journal.is_done("allocate", {"participant": "p1"})
+
+
+def test_failed_step_is_not_recorded(journal):
+    def boom():
+        raise RuntimeError("broker down")
+    with pytest.raises(RuntimeError):
+        journal.run("allocate", {}, boom)
+    assert not journal.is_done("allocate", {})
+
+
+def test_journal_survives_a_new_process(journal, tmp_path):
+    journal.record("user", {"email": "a@x"}, {"id": "u1"})
+    again = StepJournal(LabState(str(tmp_path / "lab_state.json"), emit_legacy=False), disabled=False)
+    assert again.get("user", {"email": "a@x"})["output"] == {"id": "u1"}
+    again.invalidate("user")
+    assert not journal.is_done("user", {"email": "a@x"})
+    journal.record("user", {"email": "a@x"})
+    journal.reset()
+    assert not journal.is_done("user", {"email": "a@x"})
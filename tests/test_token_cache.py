@@ -0,0 +1,83 @@
+import base64
+import json
+import time
+import uuid
+
+import pytest
+
+import csp_client
+from token_cache import TokenCache, jwt_expiry
+
+PROD = "https://csp.infoblox.com"
+STANDIN = "http://127.0.0.1:8080"
+
+
+def make_jwt(ttl: int) -> str:
+    claims = {"exp": int(time.time()) + ttl, "jti": uuid.uuid4().hex}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"e30.{payload}.sig"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TokenCache(str(tmp_path / "cache.json"), min_ttl=60)
+
+
+def test_jwt_expiry():
+    assert jwt_expiry(make_jwt(100)) == pytest.approx(time.time() + 100, abs=2)
+    assert jwt_expiry("not-a-jwt") is None
+
+
+def test_tokens_are_kept_apart_per_host(cache):
+    jwt = make_jwt(3600)
+    cache.put(STANDIN, "admin@example.com", None, jwt, password="pw")
+    assert cache.get(STANDIN, "admin@example.com", password="pw") == jwt
+    assert cache.get(PROD, "admin@example.com", password="pw") is None
+    assert cache.get(STANDIN, "admin@example.com", "acct-1") is None
+
+
+def test_home_login_requires_the_same_password(cache):
+    cache.put(PROD, "admin@example.com", None, make_jwt(3600), password="right")
+    assert cache.get(PROD, "admin@example.com", password="wrong") is None
+    assert "right" not in open(cache.path).read()
+
+
+def test_tokens_close_to_expiry_are_not_served(cache):
+    cache.put(PROD, "admin@example.com", "acct-1", make_jwt(30))
+    assert cache.get(PROD, "admin@example.com", "acct-1") is None
+    # Expired entries are pruned on the next write
+    cache.put(PROD, "admin@example.com", "acct-2", make_jwt(-5))
+    cache.put(PROD, "admin@example.com", "acct-3", make_jwt(3600))
+    assert "acct-2" not in open(cache.path).read()
+
+
+def test_discard_drops_every_entry_with_the_token(cache):
+    jwt = make_jwt(3600)
+    cache.put(PROD, "admin@example.com", "acct-1", jwt)
+    cache.put(PROD, "other@example.com", "acct-1", make_jwt(3600))
+    cache.discard(jwt)
+    assert cache.get(PROD, "admin@example.com", "acct-1") is None
+    assert cache.get(PROD, "other@example.com", "acct-1") is not None
+
+
+def test_sign_in_reuses_only_matching_logins(csp, monkeypatch, tmp_path):
+    monkeypatch.setattr(csp_client, "default_cache", TokenCache(str(tmp_path / "cache.json")))
+    standin, url = csp
+    first = csp_client.sign_in(url, "admin@example.com", "pw")
+    assert csp_client.sign_in(url, "admin@example.com", "pw") == first
+    assert csp_client.sign_in(url, "admin@example.com", "changed") != first
+    other_host = url.replace("127.0.0.1", "localhost")
+    assert csp_client.sign_in(other_host, "admin@example.com", "changed") != first
+
+
+def test_rejected_token_is_dropped(csp, monkeypatch, tmp_path):
+    cache = TokenCache(str(tmp_path / "cache.json"), min_ttl=0)
+    monkeypatch.setattr(csp_client, "default_cache", cache)
+    standin, url = csp
+    # Cached as valid, but the stand-in refuses it as expired
+    stale = standin.make_jwt("home", "admin@example.com", ttl=1)
+    cache.put(url, "admin@example.com", None, stale, password="pw")
+    time.sleep(1.1)
+    r = csp_client.get_session().get(f"{url}/v2/current_user", headers=csp_client.bearer_headers(stale))
+    assert r.status_code == 401
+    assert cache.get(url, "admin@example.com", password="pw") is None
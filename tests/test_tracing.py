@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import tracing
+from lab_state import LabState
+
+
+@pytest.fixture
+def traces(workdir, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+    monkeypatch.setattr(tracing, "_finished", [])
+    monkeypatch.setattr(tracing, "_root", None)
+    monkeypatch.setattr(tracing, "_trace_id", None)
+    monkeypatch.setattr(tracing, "_trace_file", str(workdir / "default.jsonl"))
+    return workdir
+
+
+def spans(path):
+    with open(path) as f:
+        return [s for line in f for rs in json.loads(line)["resourceSpans"]
+                for ss in rs["scopeSpans"] for s in ss["spans"]]
+
+
+def test_output_to_sends_the_block_to_another_file(traces):
+    with tracing.span("before"):
+        pass
+    with tracing.output_to(str(traces / "it1.jsonl")):
+        with tracing.span("inside"):
+            pass
+    tracing.flush()
+
+    assert [s["name"] for s in spans(traces / "it1.jsonl")] == ["inside"]
+    assert [s["name"] for s in spans(traces / "default.jsonl")] == ["before"]
+
+
+def test_reset_trace_starts_a_new_trace(traces):
+    first = tracing.trace_id()
+    tracing.reset_trace()
+    assert tracing.trace_id() != first
+
+
+def test_spans_nest_and_record_failures(traces):
+    with pytest.raises(ValueError):
+        with tracing.span("outer", step=1):
+            with tracing.span("inner"):
+                raise ValueError("boom")
+    tracing.export()
+    by_name = {s["name"]: s for s in spans(traces / "default.jsonl")}
+    root = by_name[tracing.SCRIPT]
+    assert by_name["inner"]["parentSpanId"] == by_name["outer"]["spanId"]
+    assert by_name["outer"]["parentSpanId"] == root["spanId"] and "parentSpanId" not in root
+    assert by_name["inner"]["status"] == {"code": tracing.STATUS_ERROR, "message": "ValueError: boom"}
+    assert {s["traceId"] for s in by_name.values()} == {tracing.trace_id()}
+
+
+def test_clean_exit_is_not_an_error(traces):
+    with pytest.raises(SystemExit):
+        with tracing.span("script"):
+            raise SystemExit(0)
+    tracing.flush()
+    assert spans(traces / "default.jsonl")[0]["status"] == {"code": tracing.STATUS_OK}
+
+
+def test_start_trace_adopts_provisional_spans_and_persists_the_id(traces, monkeypatch):
+    state = LabState(str(traces / "state.json"), emit_legacy=False)
+    monkeypatch.setattr(tracing, "LabState", lambda: state)
+    with tracing.span("allocate"):
+        trace = tracing.start_trace()
+    tracing.flush()
+    assert state.get_str("trace_id") == trace
+    assert spans(traces / "default.jsonl")[0]["traceId"] == trace
+    tracing.end_trace()
+    assert state.get_str("trace_id") is None
+
+
+def test_http_requests_become_client_spans(traces):
+    tracing._http_span({"service": "csp", "method": "GET", "endpoint": "/v2/groups", "status": "503",
+                        "seconds": 0.5, "bytes_in": 3, "bytes_out": 0, "attempt": 2, "started": 1000.0})
+    tracing.flush()
+    span = spans(traces / "default.jsonl")[0]
+    attrs = {a["key"]: a["value"] for a in span["attributes"]}
+    assert span["kind"] == tracing.KIND_CLIENT and span["status"]["code"] == tracing.STATUS_ERROR
+    assert attrs["http.request.resend_count"] == {"intValue": "1"}
+    assert (span["startTimeUnixNano"], span["endTimeUnixNano"]) == ("1000000000000", "1000500000000")
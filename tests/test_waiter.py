@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from bulk_delete import DeleteResult
+from conftest import FakeResponse
+from purge_discovery_jobs import wait_for_deletions
+from waiter import Condition, WaitTimeout, wait_all, wait_each, wait_one
+
+
+def polls(*statuses):
+    """request() for a Condition that answers statuses in order, repeating the last."""
+    items = list(statuses)
+
+    def request():
+        return FakeResponse(items.pop(0) if len(items) > 1 else items[0])
+    return request
+
+
+def gone(name, request):
+    return Condition(name, request=request, check=lambda resp: True if resp.status_code == 404 else None,
+                     interval=0.01, max_interval=0.01, check_statuses=(404,), verbose=False)
+
+
+def test_wait_each_reports_every_condition_without_raising():
+    results = wait_each([gone("fast", polls(404)), gone("slow", polls(200, 200, 404)),
+                         gone("stuck", polls(200))], timeout=0.5)
+    assert (results["fast"].done, results["fast"].polls) == (True, 1)
+    assert (results["slow"].done, results["slow"].polls) == (True, 3)
+    assert not results["stuck"].done and results["stuck"].value is None
+
+
+def test_wait_each_shares_one_deadline():
+    start = time.monotonic()
+    results = wait_each([gone(f"p{i}", polls(200)) for i in range(5)], timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert not any(r.done for r in results.values())
+
+
+def test_only_accepted_deletes_are_tracked():
+    class Session:
+        def deletion_condition(self, provider_id, name=None):
+            return gone(f"id={provider_id}", polls(404 if provider_id == "p1" else 200))
+
+    accepted = DeleteResult("p1", 202, True, "Accepted", 1, seconds=5.0)
+    pending = DeleteResult("p2", 202, True, "Accepted", 1, seconds=1.0)
+    deleted = DeleteResult("p3", 204, True, "Deleted", 1, seconds=1.0)
+    assert wait_for_deletions(Session(), [accepted, deleted], {}, timeout=0.5)
+    assert not wait_for_deletions(Session(), [accepted, pending], {}, timeout=0.1)
+
+
+def ready(name, request, value="ok"):
+    return Condition(name, request=request, check=lambda resp: value if resp.status_code == 200 else None,
+                     interval=0.01, max_interval=0.01)
+
+
+def test_wait_all_takes_the_slowest_condition_not_the_sum():
+    def slow(seconds):
+        def request():
+            time.sleep(seconds)
+            return FakeResponse(200)
+        return request
+
+    start = time.monotonic()
+    values = wait_all([ready("a", slow(0.2), "A"), ready("b", slow(0.2), "B"), ready("c", slow(0.2), "C")],
+                      timeout=5)
+    assert values == {"a": "A", "b": "B", "c": "C"}
+    assert time.monotonic() - start < 0.5
+
+
+def test_throttling_and_errors_are_retried():
+    answers = [FakeResponse(429, headers={"Retry-After": "0"}), FakeResponse(500), RuntimeError("reset"),
+               FakeResponse(200)]
+
+    def request():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    assert wait_one(ready("flaky", request), timeout=5) == "ok"
+
+
+def test_wait_all_names_what_is_still_pending():
+    with pytest.raises(WaitTimeout, match="stuck"):
+        wait_all([ready("fine", polls(200)), ready("stuck", polls(404))], timeout=0.1)